@@ -3,11 +3,18 @@ BotCloud Agent SDK
 Create workers that connect to BotCloud and process tasks
 """
 
+import json
 import requests
 import time
 import threading
 import uuid
 from typing import Callable, Dict, Any, Optional, List
+try:
+    import websocket  # websocket-client
+    _HAS_WEBSOCKET = True
+except ImportError:
+    _HAS_WEBSOCKET = False
+    websocket = None
 
 class BotCloudAgent:
     """
@@ -20,13 +27,21 @@ class BotCloudAgent:
         api_url: str = "http://localhost:8000",
         capabilities: Optional[List[str]] = None,
         api_key: Optional[str] = None,
-        poll_interval: int = 5
+        poll_interval: int = 5,
+        claim_wait: int = 30,
+        claim_batch: int = 1,
+        use_websocket: bool = True,
+        heartbeat_interval: int = 30
     ):
         self.name = name
         self.api_url = api_url.rstrip('/')
         self.capabilities = capabilities or []
         self.api_key = api_key
-        self.poll_interval = poll_interval
+        self.poll_interval = poll_interval  # backoff after errors
+        self.claim_wait = claim_wait  # long-poll seconds per claim request
+        self.claim_batch = claim_batch  # tasks claimed (and completed) per round trip
+        self.use_websocket = use_websocket and _HAS_WEBSOCKET  # push delivery, long-poll fallback
+        self.heartbeat_interval = heartbeat_interval
         self.agent_id = None
         self._running = False
         self._task_handlers: Dict[str, Callable] = {}
@@ -73,32 +88,74 @@ class BotCloudAgent:
         return decorator
     
     def _poll_loop(self):
-        """Poll for tasks continuously"""
+        """Receive pushed tasks over a WebSocket, long-polling while it is down"""
         while self._running:
+            if self.use_websocket:
+                try:
+                    self._ws_session()
+                except Exception as e:
+                    print(f"WebSocket unavailable ({e}), using long-poll")
+                    # The poll below waits up to claim_wait before we retry the socket
             try:
-                self._check_for_tasks()
+                if not self._check_for_tasks():
+                    time.sleep(self.poll_interval)
             except Exception as e:
                 print(f"Poll error: {e}")
-            time.sleep(self.poll_interval)
+                time.sleep(self.poll_interval)
     
-    def _check_for_tasks(self):
-        """Check for pending tasks"""
+    def _check_for_tasks(self) -> bool:
+        """Claim pending tasks, waiting server-side until work arrives"""
         if not self.agent_id:
-            return
+            return False
             
-        # Get tasks for this agent
-        response = requests.get(f"{self.api_url}/agents/{self.agent_id}/tasks")
+        # Claimed tasks are leased to us; no other worker will receive them
+        response = requests.get(
+            f"{self.api_url}/agents/{self.agent_id}/tasks/next",
+            params={"wait": self.claim_wait, "max": self.claim_batch},
+            headers={"X-API-Key": self.api_key},
+            timeout=self.claim_wait + 10
+        )
         if response.status_code != 200:
-            return
+            return False
             
         tasks = response.json().get("tasks", [])
-        
-        for task in tasks:
-            if task.get("status") == "pending":
-                self._execute_task(task)
+        if tasks:
+            self.complete_tasks([self._execute_task(task) for task in tasks])
+        return True
+    
+    def _ws_session(self):
+        """Run one push-delivery session until the socket drops or stop() is called"""
+        url = self.api_url.replace("http", "ws", 1)
+        ws = websocket.create_connection(
+            f"{url}/ws/worker/{self.agent_id}?max_inflight={self.claim_batch}",
+            header=[f"X-API-Key: {self.api_key}"],
+            timeout=self.heartbeat_interval
+        )
+        try:
+            while self._running:
+                try:
+                    msg = json.loads(ws.recv())
+                except websocket.WebSocketTimeoutException:
+                    ws.send(json.dumps({"type": "heartbeat"}))  # renews in-flight leases
+                    continue
+                if msg.get("type") == "tasks":
+                    results = [self._execute_task(task) for task in msg.get("tasks", [])]
+                    ws.send(json.dumps({"type": "complete", "results": results}))
+        finally:
+            ws.close()
+    
+    def complete_tasks(self, results: List[Dict[str, Any]]):
+        """Report {"task_id", "output", "status"} results in one request"""
+        response = requests.post(
+            f"{self.api_url}/tasks:complete-batch",
+            headers={"X-API-Key": self.api_key},
+            json={"results": results}
+        )
+        response.raise_for_status()
+        return response.json()
     
-    def _execute_task(self, task: Dict[str, Any]):
-        """Execute a task using the appropriate handler"""
+    def _execute_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a task using the appropriate handler; returns its result entry"""
         task_id = task["id"]
         task_input = task.get("input", "")
         
@@ -119,21 +176,12 @@ class BotCloudAgent:
             else:
                 result = f"Processed: {task_input}"
             
-            # Mark task complete
-            requests.post(
-                f"{self.api_url}/tasks/{task_id}/complete",
-                headers={"X-API-Key": self.api_key},
-                json={"output": str(result)}
-            )
             print(f"✓ Task {task_id} completed: {result}")
+            return {"task_id": task_id, "output": str(result), "status": "completed"}
             
         except Exception as e:
             print(f"✗ Task {task_id} failed: {e}")
-            requests.post(
-                f"{self.api_url}/tasks/{task_id}/complete",
-                headers={"X-API-Key": self.api_key},
-                json={"output": f"Error: {str(e)}", "status": "failed"}
-            )
+            return {"task_id": task_id, "output": f"Error: {str(e)}", "status": "failed"}
     
     def send_message(self, to_agent: str, message: str):
         """Send a message to another agent"""
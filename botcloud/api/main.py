@@ -11,12 +11,21 @@ if _botcloud_root not in sys.path:
 
 import uuid
 import json
+import base64
+import heapq
+import itertools
+import random
 import asyncio
-from datetime import datetime
-from typing import Dict, List, Optional
+import threading
+import time
+import atexit
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
 from enum import Enum
 
-from fastapi import FastAPI, HTTPException, Header, Body, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Header, Body, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
@@ -47,6 +56,37 @@ class Task(BaseModel):
     created_at: datetime = None
     completed_at: Optional[datetime] = None
     callback_url: Optional[str] = None  # Feature 4: callback on completion
+    claimed_at: Optional[datetime] = None
+    lease_expires_at: Optional[datetime] = None
+    priority: int = 0  # higher is served first
+    tenant: str = "default"  # submitter, for fair sharing between equal priorities
+
+class TaskSpec(BaseModel):
+    """One entry of a POST /tasks:batch request"""
+    input_data: str
+    agent_id: Optional[str] = None  # defaults to the batch-level agent_id
+    callback_url: Optional[str] = None
+    priority: int = 0
+    tenant: Optional[str] = None
+
+class RoutedTask(BaseModel):
+    """A POST /tasks request: the server picks the agent"""
+    input_data: str
+    required_capabilities: List[str] = []
+    callback_url: Optional[str] = None
+    priority: int = 0
+    tenant: Optional[str] = None
+
+class TaskResult(BaseModel):
+    """One entry of a POST /tasks:complete-batch request"""
+    task_id: str
+    output: Optional[str] = None
+    status: str = "completed"
+
+class CounterDelta(BaseModel):
+    """One entry of a POST /shared:incr-batch request"""
+    key: str
+    delta: int = 1
 
 class Message(BaseModel):
     id: str
@@ -76,6 +116,7 @@ if DB_TYPE == "postgres":
     from database import PostgresDB as DB
 else:
     from database import SQLiteDB as DB
+from database import SEARCH_LIMIT, MEMORY_IMPORT_CHUNK
 
 # Global database instance
 _db = None
@@ -84,17 +125,294 @@ def get_db() -> DB:
     global _db
     if _db is None:
         _db = DB()
+        _db.start_archiver()  # moves old finished tasks to tasks_archive
     return _db
 
+# ============= Pagination =============
+# List endpoints take limit / after (opaque keyset cursor) / since / until and
+# a comma-separated fields= projection, and return next_cursor when more rows exist.
+
+MAX_PAGE_SIZE = 1000
+
+TASK_FIELDS = ("id", "agent_id", "input", "output", "status", "priority", "tenant", "callback_url",
+               "created_at", "completed_at")
+MESSAGE_FIELDS = ("id", "from", "to", "content", "created_at")
+DB_TASK_FIELDS = ("id", "agent_id", "input", "output", "status", "priority", "tenant", "callback_url",
+                  "created_at", "completed_at")
+DB_MEMORY_FIELDS = ("id", "agent_id", "key", "value", "created_at")
+SHARED_FIELDS = ("key", "value", "updated_at", "counter")
+
+def encode_cursor(sort_value, tiebreak) -> str:
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, tiebreak]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, tiebreak = json.loads(raw)
+        if sort_value is not None:  # a timestamp, or None for rows without one
+            datetime.fromisoformat(sort_value)
+        if not isinstance(tiebreak, (str, int)):
+            raise ValueError(tiebreak)
+        return (sort_value, tiebreak)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_fields(fields: Optional[str], allowed: tuple) -> Optional[List[str]]:
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+def project(row: dict, fields: Optional[List[str]]) -> dict:
+    if fields is None:
+        return row
+    return {k: row[k] for k in fields if k in row}
+
+def page_limit(limit: Optional[int]) -> Optional[int]:
+    if limit is None:
+        return None
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored as naive UTC; normalise aware query params to match"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def iso(value) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def finish_page(rows: list, limit: Optional[int], key) -> Tuple[list, Optional[str]]:
+    """Trim a limit+1 fetch to the page and build the cursor for the next one"""
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(*key(rows[-1]))
+    return rows, None
+
+class KeyIndex:
+    """Record ids kept sorted by (created_at, id), the cursor order. New records
+    append in O(1); a page bisects to its cursor and reads only limit+1 keys."""
+    
+    def __init__(self):
+        self.keys: List[Tuple[datetime, str]] = []
+    
+    @staticmethod
+    def key(created_at: Optional[datetime], record_id: str) -> Tuple[datetime, str]:
+        return (naive_utc(created_at) or datetime.min, record_id)
+    
+    def add(self, created_at: Optional[datetime], record_id: str):
+        key = self.key(created_at, record_id)
+        if not self.keys or key > self.keys[-1]:
+            self.keys.append(key)
+            return
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            self.keys.insert(i, key)
+    
+    def discard(self, created_at: Optional[datetime], record_id: str):
+        key = self.key(created_at, record_id)
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    def __iter__(self):
+        return (record_id for _, record_id in self.keys)
+    
+    def __reversed__(self):
+        return (record_id for _, record_id in reversed(self.keys))
+    
+    def page(self, after: Optional[tuple] = None, since: Optional[datetime] = None,
+             until: Optional[datetime] = None, limit: Optional[int] = None) -> List[str]:
+        """Ids strictly after the `after` key, within [since, until), at most `limit`"""
+        start = bisect_right(self.keys, after) if after else 0
+        if since:
+            start = max(start, bisect_left(self.keys, (since, "")))
+        ids = []
+        for i in range(start, len(self.keys)):
+            created_at, record_id = self.keys[i]
+            if (until and created_at >= until) or (limit and len(ids) >= limit):
+                break
+            ids.append(record_id)
+        return ids
+
+def memory_page(fetch, limit: Optional[int], after: Optional[tuple],
+                since: Optional[datetime], until: Optional[datetime]) -> Tuple[list, Optional[str]]:
+    """Keyset page over in-memory records; fetch(after, since, until, limit)
+    returns them oldest first from a KeyIndex"""
+    if after:
+        try:
+            after = (naive_utc(datetime.fromisoformat(after[0])), after[1])
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    rows = fetch(after=after, since=naive_utc(since), until=naive_utc(until), limit=limit + 1 if limit else None)
+    return finish_page(rows, limit, lambda i: (i.created_at, i.id))
+
+def db_page(rows: List[Dict], limit: Optional[int], sort_column: str, tiebreak: str,
+            fields: Optional[List[str]]) -> Tuple[List[Dict], Optional[str]]:
+    """Finish a page fetched from the database with limit+1 rows"""
+    rows, next_cursor = finish_page(rows, limit, lambda r: (r[sort_column], r[tiebreak]))
+    return [project(r, fields) for r in rows], next_cursor
+
+def claim_row(t) -> dict:
+    """What a worker receives for a task it has claimed"""
+    return {
+        "id": t.id,
+        "input": t.input,
+        "status": t.status,
+        "priority": t.priority,
+        "callback_url": t.callback_url,
+        "created_at": t.created_at.isoformat(),
+        "lease_expires_at": t.lease_expires_at.isoformat()
+    }
+
+def task_row(t) -> dict:
+    return {
+        "id": t.id,
+        "agent_id": t.agent_id,
+        "input": t.input,
+        "output": t.output,
+        "status": t.status,
+        "priority": t.priority,
+        "tenant": t.tenant,
+        "callback_url": t.callback_url,
+        "created_at": t.created_at.isoformat() if t.created_at else None,
+        "completed_at": t.completed_at.isoformat() if t.completed_at else None
+    }
+
+# ============= Task Claiming =============
+
+# Long-poll limits for GET /agents/{id}/tasks/next
+MAX_CLAIM_WAIT = 60
+DEFAULT_LEASE_SECONDS = int(os.environ.get("BOTCLOUD_LEASE_SECONDS", "300"))
+LEASE_SWEEP_INTERVAL = 5  # re-check expired leases while a claim is waiting
+
+class TaskWaiters:
+    """Per-agent wakeup events for long-polling claimers.
+
+    Events live on the event loop that serves the long-poll; notify() may be
+    called from any thread (sync endpoints run in FastAPI's threadpool).
+    """
+    def __init__(self):
+        self._events: Dict[str, asyncio.Event] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def event_for(self, agent_id: str) -> asyncio.Event:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Events are bound to the loop they were first awaited on
+            self._events = {}
+            self._loop = loop
+        if agent_id not in self._events:
+            self._events[agent_id] = asyncio.Event()
+        return self._events[agent_id]
+    
+    def notify(self, agent_id: str):
+        event = self._events.get(agent_id)
+        if event is None or self._loop is None or self._loop.is_closed():
+            return
+        try:
+            if asyncio.get_running_loop() is self._loop:
+                event.set()
+                return
+        except RuntimeError:
+            pass
+        self._loop.call_soon_threadsafe(event.set)
+
+# ============= Retention =============
+
+# Bound on tasks held in memory; terminal tasks beyond it are archived to the DB
+MAX_TASKS_IN_MEMORY = int(os.environ.get("BOTCLOUD_MAX_TASKS", "100000"))
+# Completed/failed tasks older than this (seconds) are archived; 0 disables
+TERMINAL_TASK_TTL = int(os.environ.get("BOTCLOUD_TASK_TTL", "3600"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("BOTCLOUD_ARCHIVE_BATCH", "500"))
+RETENTION_SWEEP_INTERVAL = 10  # seconds between TTL sweeps
+TERMINAL_STATUSES = ("completed", "failed")
+
+# ============= Scheduling =============
+
+def parse_tenant_weights(spec: str) -> Dict[str, float]:
+    """BOTCLOUD_TENANT_WEIGHTS="interactive=4,bulk=1" -> {"interactive": 4.0, "bulk": 1.0}"""
+    weights = {}
+    for item in spec.split(","):
+        if "=" in item:
+            tenant, weight = item.split("=", 1)
+            weights[tenant.strip()] = float(weight)
+    return weights
+
+# ============= Write-Behind Persistence =============
+
+# The store is the hot tier; changes are flushed to the database in batches.
+# Set BOTCLOUD_WRITE_BEHIND=0 to keep the legacy memory-only behaviour.
+WRITE_BEHIND = os.environ.get("BOTCLOUD_WRITE_BEHIND", "1") != "0"
+FLUSH_INTERVAL = int(os.environ.get("BOTCLOUD_FLUSH_INTERVAL_MS", "20")) / 1000  # batching window
+FLUSH_RETRY_INTERVAL = 1.0  # back off after a failed flush
+
 # ============= In-Memory Store (legacy, for compatibility) =============
 
 class BotStore:
-    def __init__(self):
+    def __init__(self, archive=None):
         self.agents: Dict[str, Agent] = {}
         self.tasks: Dict[str, Task] = {}
         self.messages: Dict[str, Message] = {}
-        self.memories: Dict[str, List[Memory]] = {}
+        self.memories: Dict[str, Dict[str, Memory]] = {}  # agent_id -> key -> memory, oldest write first
         self.api_keys: Dict[str, str] = {}  # api_key -> agent_id
+        self.waiters = TaskWaiters()
+        self._capability_agents: Dict[str, Dict[str, None]] = {}  # capability -> agent ids
+        self._lock = threading.RLock()
+        
+        # Secondary indexes, kept in step with self.tasks / self.messages,
+        # each ordered by (created_at, id) so list endpoints can seek to a cursor
+        self._all_tasks = KeyIndex()
+        self._agent_tasks: Dict[str, KeyIndex] = {}  # agent_id -> task ids
+        self._status_tasks: Dict[Tuple[str, str], KeyIndex] = {}  # (agent_id, status) -> task ids
+        self._status_all: Dict[str, KeyIndex] = {}  # status -> task ids across all agents
+        self._status_counts: Dict[str, int] = {}  # status -> count across all agents
+        self._agent_messages: Dict[str, KeyIndex] = {}  # agent_id -> message ids
+        
+        # Claim order: per-agent heap of (-priority, virtual finish, seq, task_id).
+        # Within a priority, tenants share the agent in proportion to their weight
+        # (weighted fair queueing); entries for tasks that stopped being pending
+        # are skipped when popped.
+        self.tenant_weights: Dict[str, float] = parse_tenant_weights(os.environ.get("BOTCLOUD_TENANT_WEIGHTS", ""))
+        self._ready: Dict[str, list] = {}
+        self._vclock: Dict[str, float] = {}  # agent_id -> virtual time of the last claim
+        self._tenant_finish: Dict[Tuple[str, str], float] = {}  # (agent_id, tenant) -> last finish
+        self._finish: Dict[str, Tuple[float, int]] = {}  # task_id -> (finish, seq), kept if it is released
+        self._seq = itertools.count()
+        # Lease expiry: per-agent heap of (lease_expires_at, task_id), pushed on
+        # claim and renewal; entries that no longer match the task are skipped
+        self._leases: Dict[str, list] = {}
+        
+        # Retention: terminal task ids in completion order, and tasks that
+        # have left memory but are still being written to the archive
+        self.archive = archive  # callable returning a Database, or None
+        self._terminal: Dict[str, None] = {}
+        self._spilling: Dict[str, Task] = {}
+        self._last_sweep = 0.0
+        self._archive_lock = threading.Lock()
+        self._last_created = datetime.min
+        
+        # Write-behind: ids changed since the last flush. The flusher reads the
+        # current object for each, so an id missing from memory means a delete.
+        self._agent_keys: Dict[str, str] = {}  # agent_id -> api_key
+        self._dirty_agents: Dict[str, None] = {}
+        self._dirty_tasks: Dict[str, None] = {}
+        self._dirty_memories: Dict[Tuple[str, str], None] = {}  # (agent_id, key)
+        self._dirty_messages: Dict[str, None] = {}
+        self._dirty = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
     
     def create_agent(self, name: str, capabilities: List[str], api_key: str = None) -> Agent:
         agent_id = f"agent_{uuid.uuid4().hex[:8]}"
@@ -110,9 +428,13 @@ class BotStore:
             last_active=datetime.utcnow()
         )
         
-        self.agents[agent_id] = agent
-        self.api_keys[api_key] = agent_id
-        self.memories[agent_id] = []
+        with self._lock:
+            self.agents[agent_id] = agent
+            self.api_keys[api_key] = agent_id
+            self._agent_keys[agent_id] = api_key
+            self.memories[agent_id] = {}
+            self._index_capabilities(agent)
+            self.mark_agent(agent_id)
         
         return agent
     
@@ -125,53 +447,400 @@ class BotStore:
         agent = self.get_agent(agent_id)
         agent.status = AgentStatus.RUNNING
         agent.last_active = datetime.utcnow()
+        self.mark_agent(agent_id)
         return agent
     
     def stop_agent(self, agent_id: str) -> Agent:
         agent = self.get_agent(agent_id)
         agent.status = AgentStatus.STOPPED
+        self.mark_agent(agent_id)
         return agent
     
-    def create_task(self, agent_id: str, input_data: str, callback_url: str = None) -> Task:
-        # Verify agent exists
-        self.get_agent(agent_id)
+    def configure_agent(self, agent_id: str, config: Dict) -> Agent:
+        agent = self.get_agent(agent_id)
+        agent.config.update(config)
+        self.mark_agent(agent_id)
+        return agent
+    
+    def _index_capabilities(self, agent: Agent):
+        for capability in agent.capabilities:
+            self._capability_agents.setdefault(capability, {})[agent.id] = None
+    
+    def agents_with(self, capabilities: List[str]) -> List[str]:
+        """Ids of agents that have every capability, via the inverted index"""
+        with self._lock:
+            if not capabilities:
+                return list(self.agents)
+            postings = sorted((self._capability_agents.get(c, {}) for c in capabilities), key=len)
+            return [a for a in postings[0] if all(a in p for p in postings[1:])]
+    
+    def in_flight(self, agent_id: str) -> int:
+        """Tasks queued or running on an agent"""
+        return self.count_tasks(agent_id, "pending") + self.count_tasks(agent_id, "claimed")
+    
+    def pick_agent(self, capabilities: List[str]) -> str:
+        """Choose a running agent with the capabilities by power of two choices:
+        sample two and take the less loaded, which keeps load even without
+        scanning every candidate's queue"""
+        candidates = [a for a in self.agents_with(capabilities)
+                      if self.agents[a].status == AgentStatus.RUNNING]
+        if not candidates:
+            raise HTTPException(status_code=404, detail=f"No running agent with capabilities {capabilities}")
+        if len(candidates) == 1:
+            return candidates[0]
+        return min(random.sample(candidates, 2), key=self.in_flight)
+    
+    def touch_agent(self, agent_id: str) -> Agent:
+        agent = self.get_agent(agent_id)
+        agent.last_active = datetime.utcnow()
+        self.mark_agent(agent_id)
+        return agent
+    
+    def create_task(self, agent_id: str, input_data: str, callback_url: str = None,
+                    priority: int = 0, tenant: str = None) -> Task:
+        return self.create_tasks([(agent_id, input_data, callback_url, priority, tenant)])[0]
+    
+    def create_tasks(self, specs: List[Tuple[str, str, Optional[str], int, Optional[str]]]) -> List[Task]:
+        """Create (agent_id, input, callback_url, priority, tenant) tasks all-or-nothing under one lock"""
+        # Verify agents exist before anything is created
+        for agent_id in {spec[0] for spec in specs}:
+            self.get_agent(agent_id)
         
-        task_id = f"task_{uuid.uuid4().hex[:8]}"
-        task = Task(
-            id=task_id,
-            agent_id=agent_id,
-            input=input_data,
-            status="pending",
-            callback_url=callback_url,
-            created_at=datetime.utcnow()
-        )
-        self.tasks[task_id] = task
+        with self._lock:
+            tasks = [
+                Task(
+                    id=f"task_{uuid.uuid4().hex[:8]}",
+                    agent_id=agent_id,
+                    input=input_data,
+                    status="pending",
+                    callback_url=callback_url,
+                    priority=priority,
+                    tenant=tenant or "default",
+                    created_at=self._created_at()
+                )
+                for agent_id, input_data, callback_url, priority, tenant in specs
+            ]
+            for task in tasks:
+                self.tasks[task.id] = task
+                self._index_task(task)
+                self.mark_task(task.id)
+        for agent_id in {t.agent_id for t in tasks}:
+            self.waiters.notify(agent_id)
+        self.enforce_retention()
+        return tasks
+    
+    def _created_at(self) -> datetime:
+        """Strictly increasing creation time (call under self._lock), so that
+        (created_at, id) cursor order matches insertion order"""
+        now = max(datetime.utcnow(), self._last_created + timedelta(microseconds=1))
+        self._last_created = now
+        return now
+    
+    # ----- task indexes -----
+    
+    def _index_task(self, task: Task):
+        self._all_tasks.add(task.created_at, task.id)
+        self._agent_tasks.setdefault(task.agent_id, KeyIndex()).add(task.created_at, task.id)
+        self._index_status(task)
+    
+    def _unindex_task(self, task: Task):
+        self._all_tasks.discard(task.created_at, task.id)
+        if task.agent_id in self._agent_tasks:
+            self._agent_tasks[task.agent_id].discard(task.created_at, task.id)
+        self._finish.pop(task.id, None)
+        self._unindex_status(task)
+    
+    def _index_status(self, task: Task):
+        self._status_tasks.setdefault((task.agent_id, task.status), KeyIndex()).add(task.created_at, task.id)
+        self._status_all.setdefault(task.status, KeyIndex()).add(task.created_at, task.id)
+        self._status_counts[task.status] = self._status_counts.get(task.status, 0) + 1
+        if task.status in TERMINAL_STATUSES:
+            self._terminal[task.id] = None
+            self._finish.pop(task.id, None)
+        elif task.status == "pending":
+            self._enqueue(task)
+    
+    # ----- scheduling -----
+    
+    def _enqueue(self, task: Task):
+        """Push a pending task; new tasks are stamped with their WFQ finish time,
+        released ones keep theirs so they return to the front of their tenant"""
+        stamp = self._finish.get(task.id)
+        if stamp is None:
+            key = (task.agent_id, task.tenant)
+            start = max(self._vclock.get(task.agent_id, 0.0), self._tenant_finish.get(key, 0.0))
+            finish = start + 1.0 / self.tenant_weights.get(task.tenant, 1.0)
+            self._tenant_finish[key] = finish
+            stamp = self._finish[task.id] = (finish, next(self._seq))
+        heapq.heappush(self._ready.setdefault(task.agent_id, []), (-task.priority, *stamp, task.id))
+    
+    def _next_pending(self, agent_id: str, limit: int) -> List[Task]:
+        """Pop up to `limit` pending tasks: highest priority, then fairest tenant"""
+        heap = self._ready.get(agent_id)
+        picked: Dict[str, Task] = {}
+        while heap and len(picked) < limit:
+            _, finish, _, task_id = heapq.heappop(heap)
+            task = self.tasks.get(task_id)
+            if task is None or task.status != "pending" or task_id in picked:
+                continue
+            self._vclock[agent_id] = max(self._vclock.get(agent_id, 0.0), finish)
+            picked[task_id] = task
+        return list(picked.values())
+    
+    def set_tenant_weight(self, tenant: str, weight: float):
+        """Share of an agent's capacity `tenant` gets relative to others (default 1)"""
+        if weight <= 0:
+            raise HTTPException(status_code=422, detail="Weight must be positive")
+        with self._lock:
+            self.tenant_weights[tenant] = weight
+    
+    def _unindex_status(self, task: Task):
+        for index in (self._status_tasks.get((task.agent_id, task.status)), self._status_all.get(task.status)):
+            if index is not None:
+                index.discard(task.created_at, task.id)
+        self._status_counts[task.status] = self._status_counts.get(task.status, 1) - 1
+        self._terminal.pop(task.id, None)
+    
+    def set_task_status(self, task: Task, status: str) -> Task:
+        """Change a task's status, keeping the indexes in step"""
+        with self._lock:
+            if task.status != status:
+                self._unindex_status(task)
+                task.status = status
+                self._index_status(task)
+                self.mark_task(task.id)
         return task
     
-    def get_task(self, task_id: str) -> Task:
+    def complete_task(self, task_id: str, output: str = None, status: str = "completed",
+                      agent_id: str = None) -> Task:
+        return self.complete_tasks([(task_id, output, status)], agent_id)[0]
+    
+    def complete_tasks(self, results: List[Tuple[str, Optional[str], str]], agent_id: str = None) -> List[Task]:
+        """Apply (task_id, output, status) results all-or-nothing under one lock.
+        
+        With `agent_id` (a worker reporting), every task must still be claimed
+        by that agent: a result for a task whose claim was lost (released,
+        completed, or never claimed) is refused with 409 rather than recorded twice.
+        """
+        with self._lock:
+            tasks = [self._live_task(task_id) for task_id, _, _ in results]
+            if agent_id is not None:
+                lost = [t.id for t in tasks if t.status != "claimed" or t.agent_id != agent_id]
+                if lost:
+                    raise HTTPException(status_code=409, detail=f"Not claimed by this agent: {', '.join(lost)}")
+            now = datetime.utcnow()
+            for task, (_, output, status) in zip(tasks, results):
+                self.set_task_status(task, status)
+                if output:
+                    task.output = output
+                task.completed_at = now
+                task.lease_expires_at = None
+                self.mark_task(task.id)
+        return tasks
+    
+    def delete_task(self, task_id: str) -> Task:
+        with self._lock:
+            task = self._live_task(task_id)
+            self._unindex_task(task)
+            del self.tasks[task_id]
+            self.mark_task(task_id)
+        return task
+    
+    def agent_tasks(self, agent_id: str, status: str = None, newest_first: bool = False,
+                    limit: int = None) -> List[Task]:
+        """Tasks for one agent, optionally by status; costs O(result) not O(all tasks)"""
+        with self._lock:
+            if status:
+                ids = self._status_tasks.get((agent_id, status), ())
+            else:
+                ids = self._agent_tasks.get(agent_id, ())
+            ordered = reversed(ids) if newest_first else iter(ids)
+            return [self.tasks[i] for i in islice(ordered, limit)]
+    
+    def page_tasks(self, agent_id: str = None, status: str = None, **window) -> List[Task]:
+        """One keyset page (see KeyIndex.page) of tasks, for one agent or all"""
+        with self._lock:
+            if agent_id is None:
+                index = self._status_all.get(status) if status else self._all_tasks
+            elif status:
+                index = self._status_tasks.get((agent_id, status))
+            else:
+                index = self._agent_tasks.get(agent_id)
+            return [self.tasks[i] for i in index.page(**window)] if index else []
+    
+    def count_tasks(self, agent_id: str = None, status: str = None) -> int:
+        if agent_id is None:
+            return self._status_counts.get(status, 0) if status else len(self.tasks)
+        if status:
+            return len(self._status_tasks.get((agent_id, status), {}))
+        return len(self._agent_tasks.get(agent_id, {}))
+    
+    def _live_task(self, task_id: str) -> Task:
         if task_id not in self.tasks:
             raise HTTPException(status_code=404, detail="Task not found")
         return self.tasks[task_id]
     
+    def get_task(self, task_id: str) -> Task:
+        """Look up a task in memory, falling back to the archive"""
+        task = self.tasks.get(task_id) or self._spilling.get(task_id)
+        if task:
+            return task
+        if self.archive:
+            row = self.archive().get_task(task_id)
+            if row:
+                return Task(**{k: v for k, v in row.items() if k in Task.model_fields and v is not None})
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    # ----- retention -----
+    
+    def enforce_retention(self, force: bool = False):
+        """Archive terminal tasks past the TTL or beyond the in-memory cap.
+        
+        Cheap to call on every write: it does nothing unless the store is
+        over its cap or a TTL sweep is due.
+        """
+        if not self.archive:
+            return
+        now = time.monotonic()
+        over_cap = len(self.tasks) > MAX_TASKS_IN_MEMORY
+        sweep_due = TERMINAL_TASK_TTL > 0 and now - self._last_sweep >= RETENTION_SWEEP_INTERVAL
+        if not (force or over_cap or sweep_due):
+            return
+        if not self._archive_lock.acquire(blocking=False):
+            return  # another thread is already archiving
+        try:
+            self._last_sweep = now
+            while True:
+                batch = self._take_evictable(ARCHIVE_BATCH_SIZE)
+                if not batch or not self._spill(batch):
+                    break
+        finally:
+            self._archive_lock.release()
+    
+    def _take_evictable(self, limit: int) -> List[Task]:
+        """Remove up to `limit` evictable tasks from memory, oldest completion first"""
+        cutoff = datetime.utcnow() - timedelta(seconds=TERMINAL_TASK_TTL) if TERMINAL_TASK_TTL > 0 else None
+        batch = []
+        with self._lock:
+            excess = len(self.tasks) - MAX_TASKS_IN_MEMORY
+            for task_id in islice(self._terminal, limit):
+                task = self.tasks[task_id]
+                expired = cutoff is not None and task.completed_at and task.completed_at <= cutoff
+                if not expired and len(batch) >= excess:
+                    break
+                batch.append(task)
+            for task in batch:
+                self._unindex_task(task)
+                del self.tasks[task.id]
+                self._spilling[task.id] = task
+                self._dirty_tasks.pop(task.id, None)  # the spill writes it
+        return batch
+    
+    def _spill(self, batch: List[Task]) -> bool:
+        try:
+            self.archive().upsert_tasks([task_row(t) for t in batch])
+            return True
+        except Exception as e:
+            # Put the batch back rather than lose it; the next sweep retries
+            print(f"Task archive error: {e}")
+            with self._lock:
+                for task in batch:
+                    self.tasks[task.id] = task
+                    self._index_task(task)
+                    self.mark_task(task.id)
+            return False
+        finally:
+            for task in batch:
+                self._spilling.pop(task.id, None)
+    
+    def claim_tasks(self, agent_id: str, max_tasks: int = 1,
+                    lease_seconds: int = DEFAULT_LEASE_SECONDS) -> List[Task]:
+        """Atomically move up to max_tasks pending tasks to 'claimed'.
+        
+        Claimed tasks whose lease has expired are handed out again, so a
+        crashed worker never strands work.
+        """
+        now = datetime.utcnow()
+        with self._lock:
+            expired = self._expired_leases(agent_id, now, max_tasks)
+            candidates = expired + self._next_pending(agent_id, max_tasks - len(expired))
+            for task in candidates:
+                self.set_task_status(task, "claimed")
+                task.claimed_at = now
+                self._set_lease(task, now + timedelta(seconds=lease_seconds))
+        return candidates
+    
+    def _set_lease(self, task: Task, expires: datetime):
+        task.lease_expires_at = expires
+        heap = self._leases.setdefault(task.agent_id, [])
+        heapq.heappush(heap, (expires, task.id))
+        if len(heap) > 64 and len(heap) > 4 * self.count_tasks(task.agent_id, "claimed"):
+            # mostly superseded renewals: rebuild from the live claims
+            claimed = self.agent_tasks(task.agent_id, "claimed")
+            heap[:] = [(t.lease_expires_at, t.id) for t in claimed if t.lease_expires_at]
+            heapq.heapify(heap)
+    
+    def _expired_leases(self, agent_id: str, now: datetime, limit: int) -> List[Task]:
+        """Pop up to `limit` claimed tasks whose lease ran out, soonest expiry first"""
+        heap = self._leases.get(agent_id)
+        picked: Dict[str, Task] = {}
+        while heap and heap[0][0] <= now and len(picked) < limit:
+            expires, task_id = heapq.heappop(heap)
+            task = self.tasks.get(task_id)
+            if task is None or task.status != "claimed" or task.lease_expires_at != expires:
+                continue  # finished, released or renewed since this entry was pushed
+            picked[task_id] = task
+        return list(picked.values())
+    
+    def release_tasks(self, task_ids: List[str]) -> List[Task]:
+        """Return still-claimed tasks to 'pending' (e.g. their worker disconnected)"""
+        released = []
+        with self._lock:
+            for task_id in task_ids:
+                task = self.tasks.get(task_id)
+                if task and task.status == "claimed":
+                    self.set_task_status(task, "pending")
+                    task.claimed_at = None
+                    task.lease_expires_at = None
+                    released.append(task)
+        for agent_id in {t.agent_id for t in released}:
+            self.waiters.notify(agent_id)
+        return released
+    
+    def renew_lease(self, task_id: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> Task:
+        task = self.get_task(task_id)
+        with self._lock:
+            if task.status != "claimed":
+                raise HTTPException(status_code=409, detail=f"Task is {task.status}, not claimed")
+            self._set_lease(task, datetime.utcnow() + timedelta(seconds=lease_seconds))
+        return task
+    
     def send_message(self, from_agent_id: str, to_agent_id: str, content: str) -> Message:
         # Verify both agents exist
         self.get_agent(from_agent_id)
         self.get_agent(to_agent_id)
         
         msg_id = f"msg_{uuid.uuid4().hex[:8]}"
-        message = Message(
-            id=msg_id,
-            from_agent_id=from_agent_id,
-            to_agent_id=to_agent_id,
-            content=content,
-            created_at=datetime.utcnow()
-        )
-        self.messages[msg_id] = message
+        with self._lock:
+            message = Message(
+                id=msg_id,
+                from_agent_id=from_agent_id,
+                to_agent_id=to_agent_id,
+                content=content,
+                created_at=self._created_at()
+            )
+            self.messages[msg_id] = message
+            self._agent_messages.setdefault(from_agent_id, KeyIndex()).add(message.created_at, msg_id)
+            self._agent_messages.setdefault(to_agent_id, KeyIndex()).add(message.created_at, msg_id)
+            self._dirty_messages[msg_id] = None
+            self._dirty.set()
         return message
     
-    def get_messages(self, agent_id: str) -> List[Message]:
-        return [m for m in self.messages.values() 
-                if m.from_agent_id == agent_id or m.to_agent_id == agent_id]
+    def page_messages(self, agent_id: str, **window) -> List[Message]:
+        """One keyset page (see KeyIndex.page) of an agent's messages"""
+        with self._lock:
+            index = self._agent_messages.get(agent_id)
+            return [self.messages[i] for i in index.page(**window)] if index else []
     
     def store_memory(self, agent_id: str, key: str, value: str) -> Memory:
         self.get_agent(agent_id)
@@ -183,28 +852,196 @@ class BotStore:
             created_at=datetime.utcnow()
         )
         
-        # Remove existing key if present
-        self.memories[agent_id] = [m for m in self.memories[agent_id] if m.key != key]
-        self.memories[agent_id].append(memory)
+        with self._lock:
+            memories = self.memories[agent_id]
+            memories.pop(key, None)  # re-insert so the latest write lists last
+            memories[key] = memory
+            self.mark_memory(agent_id, key)
         
         return memory
     
+    def delete_memory(self, agent_id: str, key: str):
+        self.get_agent(agent_id)
+        with self._lock:
+            self.memories[agent_id].pop(key, None)
+            self.mark_memory(agent_id, key)
+    
     def get_memories(self, agent_id: str) -> List[Memory]:
         self.get_agent(agent_id)
-        return self.memories.get(agent_id, [])
+        return list(self.memories.get(agent_id, {}).values())
+    
+    # ----- write-behind -----
+    
+    def mark_agent(self, agent_id: str):
+        with self._lock:
+            self._dirty_agents[agent_id] = None
+        self._dirty.set()
+    
+    def mark_task(self, task_id: str):
+        with self._lock:
+            self._dirty_tasks[task_id] = None
+        self._dirty.set()
+    
+    def mark_memory(self, agent_id: str, key: str):
+        with self._lock:
+            self._dirty_memories[(agent_id, key)] = None
+        self._dirty.set()
+    
+    def flush(self) -> bool:
+        """Write everything changed since the last flush in one transaction"""
+        if not self.archive:
+            return True
+        with self._flush_lock:
+            with self._lock:
+                dirty = (self._dirty_agents, self._dirty_tasks, self._dirty_memories, self._dirty_messages)
+                if not any(dirty):
+                    return True
+                self._dirty_agents, self._dirty_tasks = {}, {}
+                self._dirty_memories, self._dirty_messages = {}, {}
+                self._dirty.clear()
+                batch = self._snapshot(*dirty)
+            try:
+                self.archive().write_batch(**batch)
+                return True
+            except Exception as e:
+                # Keep the ids dirty; the next flush retries with fresher rows
+                print(f"Write-behind flush error: {e}")
+                with self._lock:
+                    for pending, ids in zip(
+                        (self._dirty_agents, self._dirty_tasks, self._dirty_memories, self._dirty_messages), dirty
+                    ):
+                        pending.update(ids)
+                    self._dirty.set()
+                return False
+    
+    def _snapshot(self, agent_ids, task_ids, memory_keys, message_ids) -> Dict[str, list]:
+        """Rows for a flush (call under self._lock so they are consistent)"""
+        agents = [
+            {
+                "id": a.id,
+                "name": a.name,
+                "capabilities": a.capabilities,
+                "status": a.status.value,
+                "config": a.config,
+                "api_key": self._agent_keys.get(a.id),
+                "created_at": iso(a.created_at),
+                "last_active": iso(a.last_active)
+            }
+            for a in (self.agents.get(i) for i in agent_ids) if a
+        ]
+        tasks, deleted_tasks = [], []
+        for task_id in task_ids:
+            t = self.tasks.get(task_id)
+            if t is None:
+                deleted_tasks.append(task_id)
+                continue
+            tasks.append(task_row(t))
+        memories, deleted_memories = [], []
+        for agent_id, key in memory_keys:
+            m = self.memories.get(agent_id, {}).get(key)
+            if m is None:
+                deleted_memories.append((agent_id, key))
+                continue
+            memories.append({"agent_id": agent_id, "key": key, "value": m.value, "created_at": iso(m.created_at)})
+        messages = [
+            {
+                "id": m.id,
+                "from_agent_id": m.from_agent_id,
+                "to_agent_id": m.to_agent_id,
+                "content": m.content,
+                "created_at": iso(m.created_at)
+            }
+            for m in (self.messages.get(i) for i in message_ids) if m
+        ]
+        return {
+            "agents": agents, "tasks": tasks, "deleted_tasks": deleted_tasks,
+            "memories": memories, "deleted_memories": deleted_memories, "messages": messages
+        }
+    
+    def _flush_loop(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(FLUSH_INTERVAL)  # let more writes join this batch
+            if not self.flush():
+                time.sleep(FLUSH_RETRY_INTERVAL)
+    
+    def start_flusher(self):
+        """Start the background write-behind thread (flushes once more at exit)"""
+        if self._flusher or not self.archive:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name="botstore-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+    
+    def rehydrate(self):
+        """Load agents, memories, messages and unfinished tasks from the database.
+        
+        Completed and failed tasks stay in the database and are read through
+        get_task's archive fallback. Leases are not persisted, so tasks that
+        were claimed when the server stopped go back to pending.
+        """
+        if not self.archive:
+            return
+        state = self.archive().load_state()
+        with self._lock:
+            for row in state["agents"]:
+                agent = Agent(
+                    id=row["id"],
+                    name=row["name"],
+                    capabilities=row.get("capabilities") or [],
+                    status=row.get("status") or AgentStatus.STOPPED,
+                    config=row.get("config") or {},
+                    created_at=row.get("created_at"),
+                    last_active=row.get("last_active")
+                )
+                self.agents[agent.id] = agent
+                self.memories.setdefault(agent.id, {})
+                self._index_capabilities(agent)
+                if row.get("api_key"):
+                    self.api_keys[row["api_key"]] = agent.id
+                    self._agent_keys[agent.id] = row["api_key"]
+            for row in state["tasks"]:
+                if row["agent_id"] not in self.agents:
+                    continue
+                task = Task(**{k: v for k, v in row.items() if k in Task.model_fields and v is not None})
+                if task.status == "claimed":
+                    task.status = "pending"
+                self.tasks[task.id] = task
+                self._index_task(task)
+                if task.created_at:
+                    self._last_created = max(self._last_created, naive_utc(task.created_at))
+            for row in state["memories"]:
+                if row["agent_id"] in self.memories:
+                    self.memories[row["agent_id"]][row["key"]] = Memory(
+                        agent_id=row["agent_id"], key=row["key"], value=row["value"] or "",
+                        created_at=row.get("created_at")
+                    )
+            for row in state["messages"]:
+                message = Message(**row)
+                self.messages[message.id] = message
+                self._agent_messages.setdefault(message.from_agent_id, KeyIndex()).add(message.created_at, message.id)
+                self._agent_messages.setdefault(message.to_agent_id, KeyIndex()).add(message.created_at, message.id)
+                if message.created_at:
+                    self._last_created = max(self._last_created, naive_utc(message.created_at))
+        print(f"Rehydrated {len(self.agents)} agents, {len(self.tasks)} open tasks from the database")
 
 # ============= Initialize =============
 
-store = BotStore()
+store = BotStore(archive=get_db)
+if WRITE_BEHIND:
+    store.rehydrate()
+    store.start_flusher()
 
-# Create a demo agent
-demo_agent = store.create_agent(
-    name="DemoBot", 
-    capabilities=["chat", "search", "compute"],
-    api_key="demo_key_123"
-)
-demo_agent.status = AgentStatus.RUNNING
-store.agents[demo_agent.id] = demo_agent
+# Create a demo agent (reused when it was rehydrated)
+if "demo_key_123" in store.api_keys:
+    demo_agent = store.get_agent(store.api_keys["demo_key_123"])
+else:
+    demo_agent = store.create_agent(
+        name="DemoBot", 
+        capabilities=["chat", "search", "compute"],
+        api_key="demo_key_123"
+    )
+store.start_agent(demo_agent.id)
 
 # ============= API =============
 
@@ -243,6 +1080,8 @@ def health():
         "status": "healthy",
         "agents": len(store.agents),
         "tasks": len(store.tasks),
+        "pending_tasks": store.count_tasks(status="pending"),
+        "completed_tasks": store.count_tasks(status="completed"),
         "messages": len(store.messages)
     }
 
@@ -255,22 +1094,9 @@ def register_agent(
     api_key: str = Body(default=None)
 ):
     """Register a new agent"""
-    agent_id = f"agent_{uuid.uuid4().hex[:8]}"
     if not api_key:
         api_key = f"bc_{uuid.uuid4().hex}"
-    
-    agent = Agent(
-        id=agent_id,
-        name=name,
-        capabilities=capabilities,
-        status=AgentStatus.STOPPED,
-        created_at=datetime.utcnow(),
-        last_active=datetime.utcnow()
-    )
-    
-    store.agents[agent_id] = agent
-    store.api_keys[api_key] = agent_id
-    store.memories[agent_id] = []
+    agent = store.create_agent(name, capabilities, api_key)
     
     return {
         "id": agent.id,
@@ -329,8 +1155,7 @@ def stop_agent(agent_id: str, api_key: str = Header(None, alias="X-API-Key")):
 def configure_agent(agent_id: str, config: Dict = Body(...), api_key: str = Header(None, alias="X-API-Key")):
     """Update agent configuration"""
     verify_api_key(api_key)
-    agent = store.get_agent(agent_id)
-    agent.config.update(config)
+    agent = store.configure_agent(agent_id, config)
     return {"status": "success", "config": agent.config}
 
 # ============= Tasks =============
@@ -338,10 +1163,12 @@ def configure_agent(agent_id: str, config: Dict = Body(...), api_key: str = Head
 @app.post("/agents/{agent_id}/tasks")
 def create_task(agent_id: str, input_data: str = Body(..., embed=True), 
                 callback_url: str = Body(default=None, embed=True),
+                priority: int = Body(default=0, embed=True),
+                tenant: str = Body(default=None, embed=True),
                 api_key: str = Header(None, alias="X-API-Key")):
     """Send a task to an agent"""
     verify_api_key(api_key)
-    task = store.create_task(agent_id, input_data, callback_url=callback_url)
+    task = store.create_task(agent_id, input_data, callback_url=callback_url, priority=priority, tenant=tenant)
     
     return {
         "id": task.id,
@@ -349,11 +1176,57 @@ def create_task(agent_id: str, input_data: str = Body(..., embed=True),
         "input": task.input,
         "output": task.output,
         "status": task.status,
+        "priority": task.priority,
         "callback_url": task.callback_url,
         "created_at": task.created_at.isoformat(),
         "completed_at": task.completed_at.isoformat() if task.completed_at else None
     }
 
+@app.post("/tasks")
+def create_routed_task(task: RoutedTask, api_key: str = Header(None, alias="X-API-Key")):
+    """Create a task on the least-loaded running agent with the required capabilities"""
+    verify_api_key(api_key)
+    agent_id = store.pick_agent(task.required_capabilities)
+    created = store.create_task(agent_id, task.input_data, callback_url=task.callback_url,
+                                priority=task.priority, tenant=task.tenant)
+    return task_row(created)
+
+@app.post("/tasks:batch")
+def create_tasks_batch(
+    tasks: List[TaskSpec] = Body(...),
+    agent_id: str = Body(default=None),
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """Create many tasks, optionally for many agents, in one call"""
+    verify_api_key(api_key)
+    specs = []
+    for spec in tasks:
+        target = spec.agent_id or agent_id
+        if not target:
+            raise HTTPException(status_code=422, detail="Each task needs an agent_id (or set one for the batch)")
+        specs.append((target, spec.input_data, spec.callback_url, spec.priority, spec.tenant))
+    created = store.create_tasks(specs)
+    return {"tasks": [task_row(t) for t in created]}
+
+@app.post("/tasks:complete-batch")
+def complete_tasks_batch(
+    results: List[TaskResult] = Body(..., embed=True),
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """Complete many tasks in one call (each must be claimed by the caller's agent)"""
+    agent_id = verify_api_key(api_key)
+    completed = store.complete_tasks([(r.task_id, r.output, r.status) for r in results], agent_id)
+    return {
+        "tasks": [
+            {
+                "id": t.id,
+                "status": t.status,
+                "completed_at": t.completed_at.isoformat()
+            }
+            for t in completed
+        ]
+    }
+
 @app.get("/tasks/{task_id}")
 def get_task(task_id: str):
     """Get task result"""
@@ -375,13 +1248,9 @@ def complete_task(
     status: str = Body(default="completed"),
     api_key: str = Header(None, alias="X-API-Key")
 ):
-    """Mark a task as complete"""
-    verify_api_key(api_key)
-    task = store.get_task(task_id)
-    task.status = status
-    if output:
-        task.output = output
-    task.completed_at = datetime.utcnow()
+    """Mark a task as complete (it must be claimed by the caller's agent)"""
+    agent_id = verify_api_key(api_key)
+    task = store.complete_task(task_id, output, status, agent_id)
     return {
         "id": task.id,
         "status": task.status,
@@ -389,22 +1258,85 @@ def complete_task(
         "completed_at": task.completed_at.isoformat()
     }
 
+@app.delete("/tasks/{task_id}")
+def delete_task(task_id: str, api_key: str = Header(None, alias="X-API-Key")):
+    """Delete a task"""
+    verify_api_key(api_key)
+    store.delete_task(task_id)
+    return {"status": "deleted", "task_id": task_id}
+
+@app.get("/agents/{agent_id}/tasks/next")
+async def claim_next_tasks(
+    agent_id: str,
+    wait: float = 30,
+    max_tasks: int = Query(default=1, alias="max"),
+    lease: int = DEFAULT_LEASE_SECONDS,
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """Claim pending tasks, holding the request open up to `wait` seconds until work arrives"""
+    verify_api_key(api_key)
+    store.get_agent(agent_id)
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(max(wait, 0), MAX_CLAIM_WAIT)
+    max_tasks = min(max(max_tasks, 1), 100)
+    
+    while True:
+        event = store.waiters.event_for(agent_id)
+        event.clear()
+        tasks = store.claim_tasks(agent_id, max_tasks, lease)
+        remaining = deadline - loop.time()
+        if tasks or remaining <= 0:
+            break
+        try:
+            await asyncio.wait_for(event.wait(), timeout=min(remaining, LEASE_SWEEP_INTERVAL))
+        except asyncio.TimeoutError:
+            pass
+    
+    return {"tasks": [claim_row(t) for t in tasks]}
+
+@app.post("/tasks/{task_id}/lease")
+def renew_task_lease(
+    task_id: str,
+    lease: int = Body(default=DEFAULT_LEASE_SECONDS, embed=True),
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """Extend the lease on a claimed task"""
+    verify_api_key(api_key)
+    task = store.renew_lease(task_id, lease)
+    return {"id": task.id, "status": task.status, "lease_expires_at": task.lease_expires_at.isoformat()}
+
+@app.put("/tenants/{tenant}/weight")
+def set_tenant_weight(
+    tenant: str,
+    weight: float = Body(..., embed=True),
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """Set a tenant's fair share among equal-priority tasks (default 1)"""
+    verify_api_key(api_key)
+    store.set_tenant_weight(tenant, weight)
+    return {"tenant": tenant, "weight": weight}
+
 @app.get("/agents/{agent_id}/tasks")
-def list_agent_tasks(agent_id: str):
-    """List all tasks for an agent"""
+def list_agent_tasks(
+    agent_id: str,
+    status: str = None,
+    since: datetime = None,
+    until: datetime = None,
+    limit: int = None,
+    after: str = None,
+    fields: str = None
+):
+    """List tasks for an agent, oldest first"""
     store.get_agent(agent_id)
-    tasks = [t for t in store.tasks.values() if t.agent_id == agent_id]
+    projection = parse_fields(fields, TASK_FIELDS)
+    limit = page_limit(limit)
+    tasks, next_cursor = memory_page(
+        lambda **window: store.page_tasks(agent_id, status, **window), limit, decode_cursor(after), since, until
+    )
     return {
-        "tasks": [
-            {
-                "id": t.id,
-                "input": t.input,
-                "output": t.output,
-                "status": t.status,
-                "created_at": t.created_at.isoformat()
-            }
-            for t in tasks
-        ]
+        "tasks": [project(task_row(t), projection) for t in tasks],
+        "next_cursor": next_cursor
     }
 
 # ============= Collaboration =============
@@ -424,9 +1356,7 @@ def delegate_task(
     
     # Create task for target agent
     new_task = store.create_task(to_agent, f"[Delegated from {agent_id}]: {task}")
-    new_task.status = "completed"
-    new_task.output = f"Delegated task processed by {to_agent}"
-    new_task.completed_at = datetime.utcnow()
+    store.complete_task(new_task.id, f"Delegated task processed by {to_agent}")
     
     return {
         "status": "delegated",
@@ -455,21 +1385,33 @@ def send_message(
     }
 
 @app.get("/agents/{agent_id}/messages")
-def get_messages(agent_id: str):
-    """Get messages for an agent"""
+def get_messages(
+    agent_id: str,
+    since: datetime = None,
+    until: datetime = None,
+    limit: int = None,
+    after: str = None,
+    fields: str = None
+):
+    """Get messages for an agent, oldest first"""
     store.get_agent(agent_id)
-    messages = store.get_messages(agent_id)
+    projection = parse_fields(fields, MESSAGE_FIELDS)
+    limit = page_limit(limit)
+    messages, next_cursor = memory_page(
+        lambda **window: store.page_messages(agent_id, **window), limit, decode_cursor(after), since, until
+    )
     return {
         "messages": [
-            {
+            project({
                 "id": m.id,
                 "from": m.from_agent_id,
                 "to": m.to_agent_id,
                 "content": m.content,
                 "created_at": m.created_at.isoformat()
-            }
+            }, projection)
             for m in messages
-        ]
+        ],
+        "next_cursor": next_cursor
     }
 
 # ============= Memory =============
@@ -510,8 +1452,7 @@ def get_memories(agent_id: str):
 def delete_memory(agent_id: str, key: str, api_key: str = Header(None, alias="X-API-Key")):
     """Delete a memory"""
     verify_api_key(api_key)
-    store.get_agent(agent_id)
-    store.memories[agent_id] = [m for m in store.memories[agent_id] if m.key != key]
+    store.delete_memory(agent_id, key)
     return {"status": "deleted", "key": key}
 
 # ============= Logs & Metrics =============
@@ -522,29 +1463,26 @@ def get_logs(agent_id: str, limit: int = 100):
     store.get_agent(agent_id)
     # Return recent activity as logs
     logs = []
-    for task in list(store.tasks.values())[-limit:]:
-        if task.agent_id == agent_id:
-            logs.append({
-                "type": "task",
-                "id": task.id,
-                "input": task.input,
-                "status": task.status,
-                "timestamp": task.created_at.isoformat()
-            })
+    for task in reversed(store.agent_tasks(agent_id, newest_first=True, limit=limit)):
+        logs.append({
+            "type": "task",
+            "id": task.id,
+            "input": task.input,
+            "status": task.status,
+            "timestamp": task.created_at.isoformat()
+        })
     return {"logs": logs}
 
 @app.get("/metrics/{agent_id}")
 def get_metrics(agent_id: str):
     """Get metrics for an agent"""
     agent = store.get_agent(agent_id)
-    tasks = [t for t in store.tasks.values() if t.agent_id == agent_id]
-    completed = len([t for t in tasks if t.status == "completed"])
     
     return {
         "agent_id": agent_id,
         "status": agent.status,
-        "total_tasks": len(tasks),
-        "completed_tasks": completed,
+        "total_tasks": store.count_tasks(agent_id),
+        "completed_tasks": store.count_tasks(agent_id, "completed"),
         "uptime_seconds": (datetime.utcnow() - agent.created_at).total_seconds()
     }
 
@@ -554,6 +1492,7 @@ class WSConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
         self.task_connections: Dict[str, set] = {}  # task_id -> set of websockets
+        self.worker_connections: Dict[str, set] = {}  # agent_id -> set of worker websockets
     
     async def connect(self, websocket: WebSocket, client_id: str):
         await websocket.accept()
@@ -589,6 +1528,16 @@ class WSConnectionManager:
     def unsubscribe_task(self, websocket: WebSocket, task_id: str):
         if task_id in self.task_connections:
             self.task_connections[task_id].discard(websocket)
+    
+    # Push delivery to workers
+    def add_worker(self, websocket: WebSocket, agent_id: str):
+        self.worker_connections.setdefault(agent_id, set()).add(websocket)
+    
+    def remove_worker(self, websocket: WebSocket, agent_id: str):
+        if agent_id in self.worker_connections:
+            self.worker_connections[agent_id].discard(websocket)
+            if not self.worker_connections[agent_id]:
+                del self.worker_connections[agent_id]
 
 ws_manager = WSConnectionManager()
 
@@ -636,9 +1585,93 @@ async def websocket_task_stream(websocket: WebSocket, task_id: str):
     except WebSocketDisconnect:
         ws_manager.unsubscribe_task(websocket, task_id)
 
+@app.websocket("/ws/worker/{agent_id}")
+async def websocket_worker(websocket: WebSocket, agent_id: str, max_inflight: int = 1,
+                           lease: int = DEFAULT_LEASE_SECONDS):
+    """Push task assignments to a worker the moment they are created.
+    
+    Server -> worker: {"type": "tasks", "tasks": [...]} (already claimed under a lease)
+    Worker -> server: {"type": "complete", "results": [{"task_id", "output", "status"}]},
+                      {"type": "heartbeat"} (renews leases of in-flight tasks)
+    At most `max_inflight` tasks are outstanding. Tasks still in flight when the
+    socket drops stay claimed: the worker keeps running them, renews their
+    leases and reports over HTTP, and a worker that died loses them when the
+    lease expires.
+    """
+    api_key = websocket.headers.get("x-api-key") or websocket.query_params.get("api_key")
+    if api_key not in store.api_keys or agent_id not in store.agents:
+        await websocket.close(code=1008)
+        return
+    
+    await websocket.accept()
+    ws_manager.add_worker(websocket, agent_id)
+    inflight: set = set()
+    send_lock = asyncio.Lock()
+    max_inflight = min(max(max_inflight, 1), 100)
+    
+    async def send(message: dict):
+        async with send_lock:
+            await websocket.send_json(message)
+    
+    async def dispatch():
+        while True:
+            event = store.waiters.event_for(agent_id)
+            event.clear()
+            free = max_inflight - len(inflight)
+            if free > 0:
+                tasks = store.claim_tasks(agent_id, free, lease)
+                if tasks:
+                    inflight.update(t.id for t in tasks)
+                    await send({"type": "tasks", "tasks": [claim_row(t) for t in tasks]})
+                    continue
+            try:
+                await asyncio.wait_for(event.wait(), timeout=LEASE_SWEEP_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def receive():
+        while True:
+            msg = await websocket.receive_json()
+            msg_type = msg.get("type")
+            
+            if msg_type == "complete":
+                results = msg.get("results", [])
+                try:
+                    done = store.complete_tasks(
+                        [(r["task_id"], r.get("output"), r.get("status", "completed")) for r in results], agent_id
+                    )
+                except HTTPException as e:
+                    await send({"type": "error", "detail": e.detail})
+                    continue
+                inflight.difference_update(t.id for t in done)
+                await send({"type": "completed", "task_ids": [t.id for t in done]})
+                store.waiters.notify(agent_id)  # free slots: let dispatch push more
+            
+            elif msg_type == "heartbeat":
+                store.touch_agent(agent_id)
+                for task_id in list(inflight):
+                    try:
+                        store.renew_lease(task_id, lease)
+                    except HTTPException:
+                        inflight.discard(task_id)
+                await send({"type": "heartbeat_ack", "inflight": len(inflight)})
+    
+    dispatcher = asyncio.create_task(dispatch())
+    receiver = asyncio.create_task(receive())
+    try:
+        await asyncio.wait([dispatcher, receiver], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        dispatcher.cancel()
+        receiver.cancel()
+        ws_manager.remove_worker(websocket, agent_id)
+
 @app.get("/ws/health")
 async def ws_health():
-    return {"status": "ws_healthy", "connections": len(ws_manager.active_connections)}
+    return {
+        "status": "ws_healthy",
+        "connections": len(ws_manager.active_connections),
+        "workers": sum(len(conns) for conns in ws_manager.worker_connections.values())
+    }
 
 # Feature 3: Task streaming endpoint for workers
 @app.post("/tasks/{task_id}/stream")
@@ -653,9 +1686,10 @@ def list_active_streams():
     return {"streams": list(ws_manager.task_connections.keys())}
 
 # ============= Database-Backed Endpoints (Optional) =============
+# Async handlers: DB calls run in worker threads via db.aio, off the event loop
 
 @app.post("/db/agents")
-def db_register_agent(
+async def db_register_agent(
     name: str = Body(...),
     capabilities: List[str] = Body(default=[]),
     api_key: str = Body(default=None)
@@ -666,133 +1700,252 @@ def db_register_agent(
         api_key = f"bc_{uuid.uuid4().hex}"
     
     db = get_db()
-    agent = db.create_agent(name, capabilities, api_key)
+    agent = await db.aio.create_agent(name, capabilities, api_key)
     return agent
 
 @app.get("/db/agents")
-def db_list_agents():
+async def db_list_agents():
     """List all agents from database"""
     db = get_db()
-    return {"agents": db.list_agents()}
+    return {"agents": await db.aio.list_agents()}
 
 @app.get("/db/agents/{agent_id}")
-def db_get_agent(agent_id: str):
+async def db_get_agent(agent_id: str):
     """Get agent from database"""
     db = get_db()
-    agent = db.get_agent(agent_id)
+    agent = await db.aio.get_agent(agent_id)
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     return agent
 
 @app.post("/db/agents/{agent_id}/tasks")
-def db_create_task(agent_id: str, input_data: str = Body(..., embed=True)):
+async def db_create_task(agent_id: str, input_data: str = Body(..., embed=True),
+                         priority: int = Body(default=0, embed=True)):
     """Create task in database"""
     db = get_db()
-    task = db.create_task(agent_id, input_data)
+    task = await db.aio.create_task(agent_id, input_data, priority)
     return task
 
+@app.post("/db/tasks:batch")
+async def db_create_tasks_batch(tasks: List[TaskSpec] = Body(...), agent_id: str = Body(default=None)):
+    """Create many tasks in the database in one transaction"""
+    specs = []
+    for spec in tasks:
+        target = spec.agent_id or agent_id
+        if not target:
+            raise HTTPException(status_code=422, detail="Each task needs an agent_id (or set one for the batch)")
+        specs.append((target, spec.input_data, spec.priority))
+    db = get_db()
+    return {"tasks": await db.aio.create_tasks(specs)}
+
+@app.post("/db/tasks:complete-batch")
+async def db_complete_tasks_batch(results: List[TaskResult] = Body(..., embed=True)):
+    """Complete many tasks in the database in one transaction"""
+    db = get_db()
+    await db.aio.complete_tasks([(r.task_id, r.output or "", r.status) for r in results])
+    return {"status": "completed", "task_ids": [r.task_id for r in results]}
+
 @app.get("/db/tasks/{task_id}")
-def db_get_task(task_id: str):
+async def db_get_task(task_id: str):
     """Get task from database"""
     db = get_db()
-    task = db.get_task(task_id)
+    task = await db.aio.get_task(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
 
 @app.post("/db/tasks/{task_id}/complete")
-def db_complete_task(
+async def db_complete_task(
     task_id: str,
     output: str = Body(default=None),
     status: str = Body(default="completed")
 ):
     """Complete task in database"""
     db = get_db()
-    db.complete_task(task_id, output or "", status)
+    await db.aio.complete_task(task_id, output or "", status)
     return {"status": "completed", "task_id": task_id}
 
 @app.get("/db/agents/{agent_id}/tasks")
-def db_list_tasks(agent_id: str):
-    """List tasks for agent from database"""
+async def db_list_tasks(
+    agent_id: str,
+    status: str = None,
+    since: datetime = None,
+    until: datetime = None,
+    limit: int = None,
+    after: str = None,
+    fields: str = None
+):
+    """List tasks for agent from database, newest first"""
+    db = get_db()
+    projection = parse_fields(fields, DB_TASK_FIELDS)
+    limit = page_limit(limit)
+    rows = await db.aio.list_tasks(
+        agent_id, status=status, since=iso(naive_utc(since)), until=iso(naive_utc(until)),
+        after=decode_cursor(after), limit=limit + 1 if limit else None, fields=projection
+    )
+    tasks, next_cursor = db_page(rows, limit, "created_at", "id", projection)
+    return {"tasks": tasks, "next_cursor": next_cursor}
+
+# Declared before POST /db/memory/{agent_id}, whose path parameter would match "x:import"
+@app.post("/db/memory/{agent_id}:import")
+async def db_import_memories(agent_id: str, request: Request):
+    """Bulk-load memories from an NDJSON body of {"key": ..., "value": ...} lines.
+    
+    The body is parsed as it streams in and written in chunks, each in its own
+    transaction; a malformed line stops the import after the chunks before it.
+    """
     db = get_db()
-    return {"tasks": db.list_tasks(agent_id)}
+    imported, line_no = 0, 0
+    batch: List[Tuple[str, str]] = []
+    buffer = b""
+    
+    async def write(rows):
+        nonlocal imported
+        imported += await db.aio.import_memories(agent_id, rows)
+    
+    def parse(line: bytes):
+        nonlocal line_no
+        line_no += 1
+        if not line.strip():
+            return
+        try:
+            item = json.loads(line)
+            batch.append((str(item["key"]), "" if item.get("value") is None else str(item["value"])))
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(
+                status_code=400,
+                detail=f"line {line_no}: expected a JSON object with a key (imported {imported} before it)"
+            )
+    
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            parse(line)
+            if len(batch) >= MEMORY_IMPORT_CHUNK:
+                await write(batch)
+                batch = []
+    parse(buffer)
+    if batch:
+        await write(batch)
+    return {"imported": imported}
 
 @app.post("/db/memory/{agent_id}")
-def db_store_memory(
+async def db_store_memory(
     agent_id: str,
     key: str = Body(...),
     value: str = Body(...)
 ):
     """Store memory in database"""
     db = get_db()
-    return db.store_memory(agent_id, key, value)
+    return await db.aio.store_memory(agent_id, key, value)
 
 @app.get("/db/memory/{agent_id}")
-def db_get_memories(agent_id: str):
-    """Get memories from database"""
+async def db_get_memories(
+    agent_id: str,
+    since: datetime = None,
+    until: datetime = None,
+    limit: int = None,
+    after: str = None,
+    fields: str = None
+):
+    """Get memories from database, newest first"""
     db = get_db()
-    return {"memories": db.get_memories(agent_id)}
+    projection = parse_fields(fields, DB_MEMORY_FIELDS)
+    limit = page_limit(limit)
+    rows = await db.aio.get_memories(
+        agent_id, since=iso(naive_utc(since)), until=iso(naive_utc(until)),
+        after=decode_cursor(after), limit=limit + 1 if limit else None, fields=projection
+    )
+    memories, next_cursor = db_page(rows, limit, "created_at", "id", projection)
+    return {"memories": memories, "next_cursor": next_cursor}
 
 @app.get("/db/memory/{agent_id}/search")
-def db_search_memories(agent_id: str, q: str = None):
-    """Search memories in database"""
+async def db_search_memories(agent_id: str, q: str = None, limit: int = SEARCH_LIMIT):
+    """Search memories in database, best match first"""
     db = get_db()
-    return {"memories": db.search_memories(agent_id, q or "")}
+    return {"memories": await db.aio.search_memories(agent_id, q or "", limit=page_limit(limit))}
 
 # ============= Shared Memory (Global) =============
 
 @app.get("/shared")
-def shared_list():
-    """List all shared memory keys"""
+async def shared_list(
+    since: datetime = None,
+    until: datetime = None,
+    limit: int = None,
+    after: str = None,
+    fields: str = None
+):
+    """List shared memory keys, most recently updated first"""
     db = get_db()
-    return {"shared": db.shared_list()}
+    projection = parse_fields(fields, SHARED_FIELDS)
+    limit = page_limit(limit)
+    rows = await db.aio.shared_list(
+        since=iso(naive_utc(since)), until=iso(naive_utc(until)),
+        after=decode_cursor(after), limit=limit + 1 if limit else None, fields=projection
+    )
+    shared, next_cursor = db_page(rows, limit, "updated_at", "key", projection)
+    return {"shared": shared, "next_cursor": next_cursor}
 
 @app.get("/shared/{key}")
-def shared_get(key: str):
+async def shared_get(key: str):
     """Get a shared value"""
     db = get_db()
-    result = db.shared_get(key)
+    result = await db.aio.shared_get(key)
     if not result:
         raise HTTPException(status_code=404, detail="Key not found")
     return result
 
 @app.put("/shared/{key}")
-def shared_set(key: str, value: str = Body(..., embed=True)):
+async def shared_set(key: str, value: str = Body(..., embed=True)):
     """Set a shared value"""
     db = get_db()
-    return db.shared_set(key, value)
+    return await db.aio.shared_set(key, value)
 
 @app.post("/shared/{key}/incr")
-def shared_incr(key: str, delta: int = Body(default=1, embed=True)):
+async def shared_incr(key: str, delta: int = Body(default=1, embed=True)):
     """Increment a shared counter"""
     db = get_db()
-    new_value = db.shared_incr(key, delta)
+    new_value = await db.aio.shared_incr(key, delta)
     return {"key": key, "counter": new_value}
 
+@app.post("/shared:incr-batch")
+async def shared_incr_batch(increments: List[CounterDelta] = Body(..., embed=True)):
+    """Apply many counter increments in one transaction"""
+    deltas: Dict[str, int] = {}
+    for inc in increments:
+        deltas[inc.key] = deltas.get(inc.key, 0) + inc.delta
+    db = get_db()
+    return {"counters": await db.aio.shared_incr_many(deltas)}
+
 @app.delete("/shared/{key}")
-def shared_delete(key: str):
+async def shared_delete(key: str):
     """Delete a shared key"""
     db = get_db()
-    db.shared_delete(key)
+    await db.aio.shared_delete(key)
     return {"deleted": key}
 
 # ============= Global Tasks (for dashboard) =============
 
 @app.get("/tasks")
-def list_all_tasks():
-    """List all tasks across all agents"""
-    all_tasks = []
-    for task in store.tasks.values():
-        all_tasks.append({
-            "id": task.id,
-            "agent_id": task.agent_id,
-            "input": task.input,
-            "output": task.output,
-            "status": task.status,
-            "created_at": task.created_at.isoformat() if task.created_at else None,
-            "completed_at": task.completed_at.isoformat() if task.completed_at else None
-        })
-    return {"tasks": all_tasks}
+def list_all_tasks(
+    status: str = None,
+    since: datetime = None,
+    until: datetime = None,
+    limit: int = None,
+    after: str = None,
+    fields: str = None
+):
+    """List tasks across all agents, oldest first"""
+    projection = parse_fields(fields, TASK_FIELDS)
+    limit = page_limit(limit)
+    page, next_cursor = memory_page(
+        lambda **window: store.page_tasks(None, status, **window), limit, decode_cursor(after), since, until
+    )
+    return {
+        "tasks": [project(task_row(t), projection) for t in page],
+        "next_cursor": next_cursor
+    }
 
 # ============= Run =============
 
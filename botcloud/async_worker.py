@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+BotCloud asyncio worker runtime
+Same commands as worker.py; shell and HTTP tools run natively on the event
+loop, so one process can hold hundreds of I/O-bound tasks in flight.
+
+Usage: python3 async_worker.py   (or BOTCLOUD_WORKER_RUNTIME=async via the manager)
+"""
+
+import asyncio
+import os
+import signal
+from contextvars import ContextVar
+from typing import Dict, Optional
+try:
+    import httpx
+    _HAS_HTTPX = True
+except ImportError:
+    _HAS_HTTPX = False
+    httpx = None
+
+import tools
+from tools.common import (
+    API_URL, AGENT_ID, API_KEY, COMPOSIO_API_KEY, STREAM_OUTPUT, STREAM_INTERVAL, STREAM_CHUNK,
+    WORKSPACE, OutputBuffer, StreamChunker, _current
+)
+from worker import (
+    POLL_INTERVAL, CLAIM_WAIT, LEASE_SECONDS, PROCESS_WORKERS, CPU_COMMANDS, SERIAL_COMMANDS, command_name
+)
+
+ASYNC_CONCURRENCY = int(os.environ.get("BOTCLOUD_ASYNC_CONCURRENCY", "256"))  # tasks in flight
+HTTP_MAX_CONNECTIONS = int(os.environ.get("BOTCLOUD_HTTP_MAX_CONNECTIONS", "100"))
+CLAIM_BATCH_MAX = 100  # the API caps max= per claim
+EXEC_TIMEOUT = 60
+
+# Pooled clients, created in main(): `api` carries the API key, `web` talks to
+# third parties (fetch, callbacks, Pushover, Composio) and never sees it
+api: Optional["httpx.AsyncClient"] = None
+web: Optional["httpx.AsyncClient"] = None
+
+_current_task: ContextVar[Optional[str]] = ContextVar("current_task", default=None)
+
+
+# ============ SHELL ============
+
+async def post_stream(task_id: str, message: dict) -> bool:
+    """Send one stream message; False if the API could not take it"""
+    try:
+        return (await api.post(f"/tasks/{task_id}/stream", json=message, timeout=2)).status_code == 200
+    except Exception as e:
+        print(f"Stream error for {task_id}: {e}")
+        return False
+
+
+async def exec_shell(cmd: str) -> str:
+    """Execute a shell command, streaming its output like tools.common.run_command"""
+    task_id = _current_task.get()
+    chunker = StreamChunker() if STREAM_OUTPUT and task_id else None
+    buffers = {"stdout": OutputBuffer(), "stderr": OutputBuffer()}
+    ready = asyncio.Event()  # output is pending (or the command finished)
+    finished = False
+    try:
+        proc = await asyncio.create_subprocess_shell(
+            cmd, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE, start_new_session=True
+        )
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+    async def pump(name: str, reader: asyncio.StreamReader):
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                return
+            buffers[name].write(chunk)
+            if chunker:
+                first = chunker.since is None
+                if chunker.write(name, chunk) or first:
+                    ready.set()
+
+    async def publish():
+        nonlocal chunker
+        while chunker and not finished:
+            due = chunker.due()
+            try:
+                await asyncio.wait_for(ready.wait(), due)
+            except asyncio.TimeoutError:
+                pass
+            ready.clear()
+            if chunker.due() == 0 or chunker.size >= STREAM_CHUNK:
+                message = chunker.take()
+                if message and not await post_stream(task_id, message):
+                    chunker = None
+
+    publisher = asyncio.create_task(publish()) if chunker else None
+    timed_out = False
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(pump("stdout", proc.stdout), pump("stderr", proc.stderr), proc.wait()), EXEC_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        timed_out = True
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)  # the shell and everything it started
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+    finally:
+        finished = True
+        ready.set()
+        if publisher:
+            await publisher
+    if chunker:
+        await post_stream(task_id, chunker.take(exit=None if timed_out else proc.returncode))
+
+    if timed_out:
+        return "Error: Command timed out"
+    if proc.returncode == 0:
+        return buffers["stdout"].text() or "OK"
+    return f"Error: {buffers['stderr'].text()}"
+
+
+# ============ SHARED MEMORY (Global) ============
+
+async def shared_set(key: str, value: str) -> str:
+    try:
+        resp = await api.put(f"/shared/{key}", json={"value": value}, timeout=5)
+        if resp.status_code == 200:
+            return f"Shared set: {key} = {value}"
+        return f"Error: {resp.status_code}"
+    except Exception as e:
+        return f"Shared memory error: {str(e)}"
+
+
+async def shared_get(key: str) -> str:
+    try:
+        resp = await api.get(f"/shared/{key}", timeout=5)
+        if resp.status_code == 404:
+            return f"Not found: {key}"
+        if resp.status_code == 200:
+            data = resp.json()
+            return f"{key} = {data.get('value', data.get('counter', 'N/A'))}"
+        return f"Error: {resp.status_code}"
+    except Exception as e:
+        return f"Shared memory error: {str(e)}"
+
+
+async def shared_incr(key: str, delta: int = 1) -> str:
+    try:
+        resp = await api.post(f"/shared/{key}/incr", json={"delta": delta}, timeout=5)
+        if resp.status_code == 200:
+            return f"{key} incremented: {resp.json().get('counter', 0)}"
+        return f"Error: {resp.status_code}"
+    except Exception as e:
+        return f"Shared memory error: {str(e)}"
+
+
+async def shared_list() -> str:
+    try:
+        resp = await api.get("/shared", timeout=5)
+        if resp.status_code == 200:
+            data = resp.json().get("shared", [])
+            if not data:
+                return "No shared keys"
+            return "\n".join(f"- {k['key']}: {k.get('value', k.get('counter', ''))}" for k in data)
+        return f"Error: {resp.status_code}"
+    except Exception as e:
+        return f"Shared memory error: {str(e)}"
+
+
+# ============ HTTP ============
+
+async def http_request(request_def: str) -> str:
+    parts = request_def.split(None, 2)
+    if len(parts) < 2:
+        return "Usage: http <METHOD> <URL> [body]"
+
+    method, url = parts[0].upper(), parts[1]
+    body = parts[2] if len(parts) > 2 else None
+    if method not in ("GET", "POST", "PUT", "DELETE"):
+        return f"Unsupported: {method}"
+
+    try:
+        kwargs = {"timeout": 15, "headers": {"User-Agent": "BotCloud/1.0"}}
+        if method in ("POST", "PUT"):
+            kwargs["json"] = {"body": body} if body else {}
+        resp = await web.request(method, url, **kwargs)
+        return f"HTTP {resp.status_code}\n\n{resp.text[:1500]}"
+    except Exception as e:
+        return f"HTTP error: {str(e)}"
+
+
+async def fetch_url(url: str) -> str:
+    if not url:
+        return "Usage: fetch <url>"
+    if not url.startswith(("http://", "https://")):
+        url = "https://" + url
+
+    try:
+        resp = await web.get(url, timeout=15)
+        if resp.status_code == 200:
+            return f"=== {url} ===\n\n{resp.text[:2000]}"
+        return f"Fetch failed: HTTP {resp.status_code}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+async def send_pushover(message: str, title: str = "BotCloud") -> str:
+    token = os.environ.get("PUSHOVER_TOKEN", "")
+    user = os.environ.get("PUSHOVER_USER", "")
+    if not token or not user:
+        return "Pushover not configured. Set PUSHOVER_TOKEN and PUSHOVER_USER"
+
+    try:
+        resp = await web.post(
+            "https://api.pushover.net/1/messages.json",
+            data={"token": token, "user": user, "message": message, "title": title},
+            timeout=10
+        )
+        if resp.status_code == 200:
+            return f"Notification sent: {message[:50]}"
+        return f"Failed: {resp.status_code}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+async def composio_action(action: str, params: str = "") -> str:
+    if not COMPOSIO_API_KEY:
+        return "Composio not enabled. Set COMPOSIO_API_KEY to enable."
+
+    param_dict = dict(p.split("=", 1) for p in (params.split() if params else []) if "=" in p)
+    try:
+        resp = await web.post(
+            "https://api.composio.dev/v1/actions/execute",
+            headers={"x-api-key": COMPOSIO_API_KEY},
+            json={"action": action, "params": param_dict},
+            timeout=30
+        )
+        if resp.status_code == 200:
+            return f"Action executed: {action}\n{resp.json()}"
+        return f"Failed: {resp.status_code} - {resp.text}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+# ============ MAIN PROCESSOR ============
+
+async def push_command(arg: str) -> str:
+    sub = arg.split(None, 1)
+    if len(sub) == 2:
+        return await send_pushover(sub[1], sub[0] if sub[0] else "BotCloud")
+    return await send_pushover(arg)
+
+
+async def composio_command(arg: str) -> str:
+    sub = arg.split(None, 1)
+    return await composio_action(sub[0] if sub else "", sub[1] if len(sub) > 1 else "")
+
+
+async def shared_command(arg: str) -> str:
+    sub = arg.split(None, 1)
+    if not sub:
+        return await shared_list()
+    if sub[0] == "set" and len(sub) > 1:
+        parts = sub[1].split(None, 1)
+        if len(parts) == 2:
+            return await shared_set(parts[0], parts[1])
+    if sub[0] == "get":
+        return await shared_get(sub[1] if len(sub) > 1 else "")
+    if sub[0] == "incr" and len(sub) > 1:
+        parts = sub[1].split()
+        return await shared_incr(parts[0], int(parts[1]) if len(parts) > 1 else 1)
+    return "Usage: shared [set <key> <val>|get <key>|incr <key> [delta]|list]"
+
+
+# Commands with a native asyncio implementation; the rest of tools.COMMANDS
+# runs the synchronous handler on a thread (or the process pool)
+ASYNC_COMMANDS = {
+    "exec": exec_shell, "run": exec_shell, "sh": exec_shell,
+    "http": http_request,
+    "curl": fetch_url, "fetch": fetch_url, "wget": fetch_url,
+    "push": push_command,
+    "composio": composio_command, "action": composio_command,
+    "shared": shared_command,
+}
+
+
+async def process_single_task(task_input: str, executor=None) -> str:
+    """Async counterpart of tools.process_single_task.
+
+    I/O tools are awaited here; every other command runs its tools/ handler
+    on a thread (or `executor`), so behaviour stays identical.
+    """
+    task = task_input.strip()
+    parts = task.split(None, 1)
+    cmd = parts[0].lower() if parts else ""
+    arg = parts[1] if len(parts) > 1 else ""
+
+    handler = ASYNC_COMMANDS.get(cmd)
+    if handler:
+        return await handler(arg)
+    handler = tools.get_handler(cmd)
+    if handler:
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, run_sync_tool, _current_task.get(), handler, arg
+        )
+    if cmd in ("info", "help"):
+        return tools.process_single_task(task)
+    return await exec_shell(task)  # default: shell, as in tools/
+
+
+def run_sync_tool(task_id: Optional[str], handler, arg: str) -> str:
+    """A tools/ handler on an executor thread, tagged with the task so
+    tools.common.run_command can stream its output (git, etc.)"""
+    _current.task_id = task_id
+    try:
+        return handler(arg)
+    finally:
+        _current.task_id = None
+
+
+# ============ RUNTIME ============
+
+class AsyncWorker:
+    """Long-polls for tasks and runs each as its own asyncio task"""
+
+    def __init__(self, concurrency: int = ASYNC_CONCURRENCY):
+        self.concurrency = max(concurrency, 1)
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self._slot_freed = asyncio.Event()
+        self._serial = {name: asyncio.Lock() for name in set(SERIAL_COMMANDS.values())}
+        self._processes = None
+        if PROCESS_WORKERS > 0:
+            from concurrent.futures import ProcessPoolExecutor
+            self._processes = ProcessPoolExecutor(max_workers=PROCESS_WORKERS)
+
+    def free(self) -> int:
+        return self.concurrency - len(self.inflight)
+
+    async def run_task(self, task: dict):
+        task_id = task["id"]
+        task_input = task.get("input", "")
+        cmd = command_name(task_input)
+        print(f"→ Task {task_id}: {task_input[:50]}...")
+        _current_task.set(task_id)  # this asyncio task's context only
+        try:
+            lock = self._serial.get(SERIAL_COMMANDS.get(cmd))
+            executor = self._processes if cmd in CPU_COMMANDS else None
+            if lock:
+                async with lock:
+                    output = await process_single_task(task_input, executor)
+            else:
+                output = await process_single_task(task_input, executor)
+            result = {"task_id": task_id, "output": output, "status": "completed"}
+        except Exception as e:
+            result = {"task_id": task_id, "output": f"Error: {e}", "status": "failed"}
+        try:
+            await self.complete(task, result)
+        except Exception as e:
+            print(f"Completion error for {task_id}: {e}")
+        finally:
+            self.inflight.pop(task_id, None)
+            self._slot_freed.set()
+
+    async def complete(self, task: dict, result: dict):
+        resp = await api.post(
+            f"/tasks/{task['id']}/complete",
+            json={"output": result["output"], "status": result["status"]},
+            timeout=30
+        )
+        if resp.status_code != 200:
+            print(f"Complete error for {task['id']}: HTTP {resp.status_code}")
+        callback_url = task.get("callback_url")
+        if callback_url:
+            try:
+                await web.post(callback_url, json=result, timeout=10)
+                print(f"✓ Callback sent to {callback_url}")
+            except Exception as cb_err:
+                print(f"Callback error: {cb_err}")
+        print(f"✓ Task {task['id']} completed")
+
+    async def renew_leases(self):
+        """Keep renewing the lease of every task still executing"""
+        while True:
+            await asyncio.sleep(LEASE_SECONDS / 3)
+            renewals = [
+                api.post(f"/tasks/{task_id}/lease", json={"lease": LEASE_SECONDS}, timeout=10)
+                for task_id in list(self.inflight)
+            ]
+            for task_id, outcome in zip(list(self.inflight), await asyncio.gather(*renewals, return_exceptions=True)):
+                if isinstance(outcome, Exception):
+                    print(f"Lease renewal error for {task_id}: {outcome}")
+
+    async def poll_once(self) -> bool:
+        """One long-poll round for the free slots; returns False on a server error"""
+        while self.free() <= 0:
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+        resp = await api.get(
+            f"/agents/{AGENT_ID}/tasks/next",
+            params={"wait": CLAIM_WAIT, "max": min(self.free(), CLAIM_BATCH_MAX), "lease": LEASE_SECONDS},
+            timeout=CLAIM_WAIT + 10
+        )
+        if resp.status_code != 200:
+            print(f"Claim error: HTTP {resp.status_code}")
+            return False
+        for task in resp.json().get("tasks", []):
+            self.inflight[task["id"]] = asyncio.create_task(self.run_task(task))
+        return True
+
+    async def run(self):
+        renewer = asyncio.create_task(self.renew_leases())
+        try:
+            while True:
+                try:
+                    if not await self.poll_once():
+                        await asyncio.sleep(POLL_INTERVAL)
+                except Exception as e:
+                    print(f"Error: {e}")
+                    await asyncio.sleep(POLL_INTERVAL)
+        finally:
+            renewer.cancel()
+
+
+async def main():
+    global api, web
+    if not _HAS_HTTPX:
+        raise SystemExit("The async worker needs httpx: pip install httpx")
+
+    print(f"Async worker {AGENT_ID} starting...")
+    print(f"Workspace: {WORKSPACE}")
+    print(f"Concurrency: {ASYNC_CONCURRENCY} tasks in flight")
+    os.makedirs(WORKSPACE, exist_ok=True)
+
+    limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+    async with httpx.AsyncClient(base_url=API_URL, headers={"X-API-Key": API_KEY}, limits=limits) as api_client, \
+            httpx.AsyncClient(limits=limits, follow_redirects=True) as web_client:
+        api, web = api_client, web_client
+        await AsyncWorker().run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -11,9 +11,12 @@ from typing import List, Dict, Optional, Any
 class BotCloudClient:
     """Client for OpenClaw to interact with BotCloud"""
     
-    def __init__(self, api_url: str = "http://localhost:8000"):
+    def __init__(self, api_url: str = "http://localhost:8000", api_key: Optional[str] = None):
         self.api_url = api_url.rstrip('/')
+        self.api_key = api_key
         self.session = requests.Session()
+        if api_key:
+            self.session.headers["X-API-Key"] = api_key
         
     def health_check(self) -> Dict:
         """Check if BotCloud is running"""
@@ -56,13 +59,53 @@ class BotCloudClient:
         """
         Assign a task to an agent.
         
-        Priority: agent_id > agent_name > capabilities
+        Priority: agent_id > agent_name > capabilities. With capabilities the
+        server picks the least-loaded running agent in the same request.
         """
+        if not agent_id and not agent_name and capabilities:
+            r = self.session.post(
+                f"{self.api_url}/tasks",
+                json={"input_data": task_input, "required_capabilities": capabilities}
+            )
+            return r.json() if r.status_code == 200 else {"error": r.text}
+        
         # Find agent
+        if not agent_id and agent_name:
+            for a in self.list_agents():
+                if a.get("name") == agent_name:
+                    agent_id = a["id"]
+                    break
+        
+        if not agent_id:
+            return {"error": "No suitable agent found"}
+        
+        # Assign task
+        r = self.session.post(
+            f"{self.api_url}/agents/{agent_id}/tasks",
+            headers={"X-API-Key": self.api_key or self.get_agent(agent_id).get("api_key", "")},
+            json={"input_data": task_input}
+        )
+        
+        if r.status_code == 200:
+            return r.json()
+        else:
+            return {"error": r.text}
+    
+    def assign_tasks(
+        self,
+        task_inputs: List[str],
+        agent_id: str = None,
+        agent_name: str = None,
+        capabilities: List[str] = None
+    ) -> Dict:
+        """
+        Assign several tasks to one agent in a single batch request.
+        
+        Agent selection works as in assign_task. Returns {"tasks": [...]}.
+        """
         if not agent_id:
             if agent_name:
-                agents = self.list_agents()
-                for a in agents:
+                for a in self.list_agents():
                     if a.get("name") == agent_name:
                         agent_id = a["id"]
                         break
@@ -74,18 +117,12 @@ class BotCloudClient:
         if not agent_id:
             return {"error": "No suitable agent found"}
         
-        # Get agent details including API key
-        agent_info = self.get_agent(agent_id)
-        api_key = agent_info.get("api_key", "")
+        api_key = self.api_key or self.get_agent(agent_id).get("api_key", "")
         
-        # Assign task
         r = self.session.post(
-            f"{self.api_url}/agents/{agent_id}/tasks",
-            headers={
-                "Content-Type": "application/json",
-                "X-API-Key": api_key
-            },
-            json={"input": task_input}
+            f"{self.api_url}/tasks:batch",
+            headers={"X-API-Key": api_key},
+            json={"agent_id": agent_id, "tasks": [{"input_data": t} for t in task_inputs]}
         )
         
         if r.status_code == 200:
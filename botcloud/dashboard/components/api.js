@@ -23,9 +23,10 @@ class BotCloudAPI {
         return this.post('/agents', { name, capabilities });
     }
     
-    // Tasks
-    async listTasks() {
-        return this.get('/tasks');
+    // Tasks - params: { status, since, until, limit, after, fields }
+    async listTasks(params = {}) {
+        const query = new URLSearchParams(params).toString();
+        return this.get(query ? `/tasks?${query}` : '/tasks');
     }
     
     async createTask(agentId, inputData, callbackUrl = null) {
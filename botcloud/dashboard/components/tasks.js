@@ -12,8 +12,13 @@ class TasksPanel {
     
     async load() {
         try {
-            const data = await api.listTasks();
+            // One page without the extra columns; counts come from /health
+            const [data, health] = await Promise.all([
+                api.listTasks({ limit: 20, fields: 'id,agent_id,input,output,status' }),
+                api.health()
+            ]);
             this.tasks = data.tasks || [];
+            this.counts = health;
             this.render();
         } catch (e) {
             console.error('Failed to load tasks:', e);
@@ -21,13 +26,15 @@ class TasksPanel {
     }
     
     render() {
-        const pending = this.tasks.filter(t => t.status === 'pending').length;
-        const completed = this.tasks.filter(t => t.status === 'completed').length;
+        const counts = this.counts || {};
+        const total = counts.tasks ?? this.tasks.length;
+        const pending = counts.pending_tasks ?? this.tasks.filter(t => t.status === 'pending').length;
+        const completed = counts.completed_tasks ?? this.tasks.filter(t => t.status === 'completed').length;
         
         this.container.innerHTML = `
             <div class="card">
                 <div class="card-header">
-                    <span class="card-title">Task Queue (${this.tasks.length})</span>
+                    <span class="card-title">Task Queue (${total})</span>
                     <button class="btn btn-secondary btn-small" id="refresh-tasks">
                         ⟳ Refresh
                     </button>
@@ -66,7 +73,7 @@ class TasksPanel {
                                         ${t.output ? t.output.substring(0, 50) + '...' : '-'}
                                     </td>
                                     <td>
-                                        <span class="badge ${t.status === 'completed' ? 'badge-success' : t.status === 'pending' ? 'badge-warning' : 'badge-error'}">
+                                        <span class="badge ${t.status === 'completed' ? 'badge-success' : (t.status === 'pending' || t.status === 'claimed') ? 'badge-warning' : 'badge-error'}">
                                             ${t.status}
                                         </span>
                                     </td>
@@ -74,7 +81,7 @@ class TasksPanel {
                             `).join('')}
                         </tbody>
                     </table>
-                    ${this.tasks.length > 20 ? `<div style="text-align: center; padding: 10px; color: var(--text-muted);">Showing 20 of ${this.tasks.length} tasks</div>` : ''}
+                    ${total > 20 ? `<div style="text-align: center; padding: 10px; color: var(--text-muted);">Showing 20 of ${total} tasks</div>` : ''}
                 `}
             </div>
         `;
@@ -5,16 +5,146 @@ Supports SQLite (local) and PostgreSQL (production)
 """
 
 import os
+import re
 import json
+import zlib
+import atexit
 import sqlite3
-from datetime import datetime
-from typing import Dict, List, Optional, Any
+import asyncio
+import threading
+import queue
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Tuple, Callable
 from abc import ABC, abstractmethod
 
+from vectors import MemoryVectors
+
+
+# Columns callers may project on list queries. Keyset cursors need the sort
+# columns, so those are always selected (see _select_columns).
+TASK_COLUMNS = ("id", "agent_id", "input", "output", "status", "priority", "tenant", "callback_url",
+                "created_at", "completed_at")
+MEMORY_COLUMNS = ("id", "agent_id", "key", "value", "created_at")
+SHARED_COLUMNS = ("key", "value", "updated_at", "counter")
+
+# Upper bound on concurrent PostgreSQL connections (SQLite opens one per thread)
+DB_POOL_SIZE = int(os.environ.get("BOTCLOUD_DB_POOL_SIZE", "10"))
+
+# SQLite durability/throughput settings. With group commit on, writes from all
+# threads are applied by one writer thread, many per transaction (one fsync).
+SQLITE_JOURNAL_MODE = os.environ.get("BOTCLOUD_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("BOTCLOUD_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_GROUP_COMMIT = os.environ.get("BOTCLOUD_SQLITE_GROUP_COMMIT", "0") == "1"
+# Extra time to wait for more writes before committing a group. 0 commits whatever
+# queued up during the previous commit, which already batches under load.
+GROUP_COMMIT_WINDOW_MS = float(os.environ.get("BOTCLOUD_GROUP_COMMIT_WINDOW_MS", "0"))
+GROUP_COMMIT_MAX_OPS = int(os.environ.get("BOTCLOUD_GROUP_COMMIT_MAX_OPS", "256"))
+_JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+_SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+SEARCH_LIMIT = 20
+# Semantic half of hybrid memory search (see vectors.py)
+VECTOR_SEARCH = os.environ.get("BOTCLOUD_VECTOR_SEARCH", "1") == "1"
+VECTOR_DIR = os.environ.get("BOTCLOUD_VECTOR_DIR")
+SEMANTIC_WEIGHT = float(os.environ.get("BOTCLOUD_SEMANTIC_WEIGHT", "0.5"))  # 0 = keyword only
+MEMORY_IMPORT_CHUNK = 5000  # rows per transaction in import_memories
+
+# Cold tier: terminal tasks this long (seconds) after completion move to the
+# compressed tasks_archive table; 0 disables the background archiver
+TASK_ARCHIVE_AGE = int(os.environ.get("BOTCLOUD_TASK_ARCHIVE_AGE", str(7 * 24 * 3600)))
+TASK_ARCHIVE_BATCH = 1000  # rows moved per transaction
+TASK_ARCHIVE_INTERVAL = 60  # seconds between archiver passes
+ARCHIVED_STATUSES = ("completed", "failed")
+_FTS_TOKEN = re.compile(r"\w+\*?")
+
+
+def _fts_query(query: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 query: every word must match, `word*` is a prefix"""
+    terms = []
+    for token in _FTS_TOKEN.findall(query):
+        if token.endswith("*"):
+            terms.append(f'"{token[:-1]}"*')
+        else:
+            terms.append(f'"{token}"')
+    return " ".join(terms) or None
+
+
+def _tsquery(query: str) -> Optional[str]:
+    """The PostgreSQL to_tsquery() equivalent of _fts_query"""
+    terms = []
+    for token in _FTS_TOKEN.findall(query):
+        terms.append(f"{token[:-1]}:*" if token.endswith("*") else token)
+    return " & ".join(terms) or None
+
+
+def _select_columns(fields: Optional[List[str]], allowed: tuple, required: tuple) -> List[str]:
+    """Columns to select for a projection; unknown names are ignored"""
+    if not fields:
+        return list(allowed)
+    wanted = set(fields) | set(required)
+    return [c for c in allowed if c in wanted]
+
+
+def _keyset_where(where: List[str], params: list, placeholder: str, sort_column: str, tiebreak: str,
+                  since: str = None, until: str = None, after: tuple = None, nullable: bool = False):
+    """Append since/until/after conditions for a (sort_column DESC, tiebreak DESC) listing.
+    A `nullable` sort column lists its NULL rows last (ORDER BY ... DESC NULLS LAST)."""
+    if since:
+        where.append(f"{sort_column} >= {placeholder}")
+        params.append(since)
+    if until:
+        where.append(f"{sort_column} < {placeholder}")
+        params.append(until)
+    if after and after[0] is None:
+        where.append(f"{sort_column} IS NULL AND {tiebreak} < {placeholder}")
+        params.append(after[1])
+    elif after:
+        row = f"({sort_column}, {tiebreak}) < ({placeholder}, {placeholder})"
+        where.append(f"({row} OR {sort_column} IS NULL)" if nullable else row)
+        params.extend(after)
+
+
+def _pack_text(text: Optional[str]) -> Optional[bytes]:
+    return zlib.compress(text.encode()) if text is not None else None
+
+
+def _task_row(t: Dict) -> tuple:
+    """Parameters for inserting a full task row (write-behind / upsert_tasks)"""
+    return (t["id"], t["agent_id"], t.get("input"), t.get("output"), t.get("status", "pending"),
+            t.get("priority", 0), t.get("tenant") or "default", t.get("callback_url"),
+            t.get("created_at"), t.get("completed_at"))
+
+
+def _unpack_task(row: Dict) -> Dict:
+    """Decompress the input/output of a tasks_archive row (when selected)"""
+    for column in ("input", "output"):
+        if row.get(column) is not None:
+            row[column] = zlib.decompress(row[column]).decode()
+    return row
+
+
+def _merge_tiers(hot: List[Dict], cold: List[Dict], limit: Optional[int]) -> List[Dict]:
+    """Combine hot and archived rows of a (created_at DESC, id DESC) listing.
+    Each side is already limited, so the merged head is exact."""
+    if not cold:
+        return hot
+    ids = {r["id"] for r in hot}  # a re-written task may briefly be in both
+    rows = hot + [_unpack_task(r) for r in cold if r["id"] not in ids]
+    rows.sort(key=lambda r: (r["created_at"], r["id"]), reverse=True)
+    return rows[:limit] if limit else rows
+
 
 class Database(ABC):
     """Abstract database interface"""
     
+    @property
+    def aio(self) -> "AsyncDatabase":
+        """Awaitable versions of every method: `await db.aio.get_task(task_id)`"""
+        return AsyncDatabase(self)
+    
     @abstractmethod
     def init_schema(self):
         pass
@@ -32,7 +162,7 @@ class Database(ABC):
         pass
     
     @abstractmethod
-    def create_task(self, agent_id: str, input_data: str) -> Dict:
+    def create_task(self, agent_id: str, input_data: str, priority: int = 0) -> Dict:
         pass
     
     @abstractmethod
@@ -40,24 +170,170 @@ class Database(ABC):
         pass
     
     @abstractmethod
-    def list_tasks(self, agent_id: str = None) -> List[Dict]:
+    def list_tasks(self, agent_id: str = None, status: str = None, since: str = None, until: str = None,
+                   after: tuple = None, limit: int = None, fields: List[str] = None) -> List[Dict]:
+        """Tasks newest first, archived ones included. `after` is a (created_at, id) keyset cursor;
+        `fields` limits the selected columns (id and created_at are always included)."""
         pass
     
     @abstractmethod
     def complete_task(self, task_id: str, output: str, status: str = "completed"):
         pass
     
+    @abstractmethod
+    def create_tasks(self, specs: List[Tuple[str, str, int]]) -> List[Dict]:
+        """Create (agent_id, input_data, priority) tasks in one transaction"""
+        pass
+    
+    @abstractmethod
+    def complete_tasks(self, results: List[Tuple[str, str, str]]) -> int:
+        """Apply (task_id, output, status) results in one transaction"""
+        pass
+    
+    @abstractmethod
+    def upsert_tasks(self, tasks: List[Dict]) -> int:
+        """Insert or replace full task rows in one transaction"""
+        pass
+    
+    @abstractmethod
+    def archive_tasks(self, before: str, limit: int = TASK_ARCHIVE_BATCH) -> int:
+        """Move up to `limit` completed/failed tasks finished before `before`
+        to tasks_archive; returns how many moved"""
+        pass
+    
+    def start_archiver(self, age: int = None, interval: float = TASK_ARCHIVE_INTERVAL):
+        """Archive tasks older than `age` seconds (default TASK_ARCHIVE_AGE)
+        from a background thread; get_task and list_tasks read both tiers"""
+        age = TASK_ARCHIVE_AGE if age is None else age
+        if age <= 0 or getattr(self, "_archiver", None):
+            return
+        
+        def run():
+            while True:
+                try:
+                    before = (datetime.utcnow() - timedelta(seconds=age)).isoformat()
+                    while self.archive_tasks(before) == TASK_ARCHIVE_BATCH:
+                        pass
+                except Exception as e:
+                    print(f"Task archiver error: {e}")
+                time.sleep(interval)
+        
+        self._archiver = threading.Thread(target=run, name="task-archiver", daemon=True)
+        self._archiver.start()
+    
+    @abstractmethod
+    def write_batch(self, agents: List[Dict] = (), tasks: List[Dict] = (), deleted_tasks: List[str] = (),
+                    memories: List[Dict] = (), deleted_memories: List[Tuple[str, str]] = (),
+                    messages: List[Dict] = ()):
+        """Persist a write-behind batch (full rows, upserted) in one transaction"""
+        pass
+    
+    @abstractmethod
+    def load_state(self) -> Dict[str, List[Dict]]:
+        """Rows to rehydrate the in-memory store from: all agents, memories and
+        messages, and tasks (TASK_COLUMNS) that are not yet completed or failed"""
+        pass
+    
     @abstractmethod
     def store_memory(self, agent_id: str, key: str, value: str) -> Dict:
+        """Insert or overwrite the agent's memory under key"""
+        pass
+    
+    @abstractmethod
+    def import_memories(self, agent_id: str, items: List[Tuple[str, str]]) -> int:
+        """Upsert (key, value) pairs, MEMORY_IMPORT_CHUNK rows per transaction"""
+        pass
+    
+    @abstractmethod
+    def get_memories(self, agent_id: str, since: str = None, until: str = None,
+                     after: tuple = None, limit: int = None, fields: List[str] = None) -> List[Dict]:
+        """Memories newest first. `after` is a (created_at, id) keyset cursor."""
+        pass
+    
+    def search_memories(self, agent_id: str, query: str, limit: int = SEARCH_LIMIT) -> List[Dict]:
+        """Hybrid search - keyword + semantic.
+        
+        Best matches first (highest `score`), each with a `snippet` of the value.
+        Keyword and vector scores are each scaled to [0, 1] by the best hit and
+        mixed by SEMANTIC_WEIGHT; both parts are returned too.
+        """
+        semantic = bool(self.vectors and SEMANTIC_WEIGHT and (query or "").strip())
+        keyword = self._keyword_search(agent_id, query, limit * 2 if semantic else limit)
+        if not semantic:
+            return keyword[:limit]
+        similar = [(key, score) for key, score in self.vectors.search(agent_id, query, limit * 2) if score > 0]
+        if not similar:
+            return keyword[:limit]
+        
+        rows = {r["key"]: r for r in keyword}
+        keyword_best = max((r["score"] for r in keyword), default=0) or 1
+        keyword_scores = {r["key"]: max(r["score"], 0) / keyword_best for r in keyword}
+        vector_best = similar[0][1]
+        vector_scores = {key: score / vector_best for key, score in similar}
+        for r in self._memories_by_keys(agent_id, [k for k in vector_scores if k not in rows]):
+            r["snippet"] = (r["value"] or "")[:200]
+            rows[r["key"]] = r
+        for key, r in rows.items():
+            r["keyword_score"] = keyword_scores.get(key, 0.0)
+            r["vector_score"] = vector_scores.get(key, 0.0)
+            r["score"] = (1 - SEMANTIC_WEIGHT) * r["keyword_score"] + SEMANTIC_WEIGHT * r["vector_score"]
+        return sorted(rows.values(), key=lambda r: r["score"], reverse=True)[:limit]
+    
+    @abstractmethod
+    def _keyword_search(self, agent_id: str, query: str, limit: int) -> List[Dict]:
+        """Full-text hits, best first, each with `score` (higher is better) and `snippet`"""
+        pass
+    
+    @abstractmethod
+    def _memories_by_keys(self, agent_id: str, keys: List[str]) -> List[Dict]:
+        pass
+    
+    # ----- vector index upkeep (see vectors.MemoryVectors) -----
+    
+    vectors: Optional[MemoryVectors] = None
+    
+    def _init_vectors(self, directory: str):
+        if VECTOR_SEARCH:
+            self.vectors = MemoryVectors(
+                directory, self._embedding_rows, self._memory_fingerprint, self._store_embeddings
+            )
+            atexit.register(self.vectors.close)
+    
+    def _embeddings(self, memories: List[Tuple[str, str, str]],
+                    deleted: List[Tuple[str, str]] = ()) -> List[Optional[bytes]]:
+        """Embedding blobs for (agent_id, key, value) rows about to be written"""
+        if not self.vectors:
+            return [None] * len(memories)
+        self.vectors.prepare([a for a, _, _ in memories] + [a for a, _ in deleted])
+        return [self.vectors.embed(key, value) for _, key, value in memories]
+    
+    def _index_memories(self, written: List[Tuple[str, str, bytes]] = (), deleted: List[Tuple[str, str]] = ()):
+        """Apply committed (agent_id, key, blob) writes and (agent_id, key) deletes to the vector index"""
+        if not self.vectors:
+            return
+        upserts: Dict[str, list] = {}
+        for agent_id, key, blob in written:
+            upserts.setdefault(agent_id, []).append((key, blob))
+        for agent_id, items in upserts.items():
+            self.vectors.upsert(agent_id, items)
+        removals: Dict[str, list] = {}
+        for agent_id, key in deleted:
+            removals.setdefault(agent_id, []).append(key)
+        for agent_id, keys in removals.items():
+            self.vectors.remove(agent_id, keys)
+    
+    @abstractmethod
+    def _embedding_rows(self, agent_id: str) -> List[Tuple[str, str, Optional[bytes]]]:
+        """(key, value, embedding) for every memory of the agent"""
         pass
     
     @abstractmethod
-    def get_memories(self, agent_id: str) -> List[Dict]:
+    def _memory_fingerprint(self, agent_id: str) -> tuple:
+        """Changes whenever the agent's memories do: (row count, latest created_at)"""
         pass
     
     @abstractmethod
-    def search_memories(self, agent_id: str, query: str) -> List[Dict]:
-        """Hybrid search - keyword + semantic"""
+    def _store_embeddings(self, agent_id: str, items: List[Tuple[str, bytes]]):
         pass
     
     @abstractmethod
@@ -75,99 +351,390 @@ class Database(ABC):
         """Atomically increment a counter"""
         pass
     
+    @abstractmethod
+    def shared_incr_many(self, deltas: Dict[str, int]) -> Dict[str, int]:
+        """Apply {key: delta} increments in one transaction; returns the new counters"""
+        pass
+    
     @abstractmethod
     def shared_delete(self, key: str) -> bool:
         """Delete a shared key"""
         pass
     
     @abstractmethod
-    def shared_list(self) -> List[Dict]:
-        """List all shared keys"""
+    def shared_list(self, since: str = None, until: str = None, after: tuple = None,
+                    limit: int = None, fields: List[str] = None) -> List[Dict]:
+        """List shared keys, most recently updated first. `after` is an (updated_at, key) cursor."""
         pass
 
 
+class AsyncDatabase:
+    """Async view of a Database for `async def` endpoints.
+    
+    Each call runs in a worker thread, which uses its own connection, so a
+    slow query never blocks the event loop.
+    """
+    
+    def __init__(self, db: Database):
+        self._db = db
+    
+    def __getattr__(self, name: str):
+        method = getattr(self._db, name)
+        
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+        
+        call.__name__ = name
+        return call
+
+
+class _GroupCommitter:
+    """Single writer thread that commits queued SQLite writes together.
+    
+    It takes everything that arrives within `window` seconds (up to `max_ops`),
+    applies each write under its own savepoint in one transaction, commits once,
+    then resolves the callers' futures. A failing write only fails its caller.
+    """
+    
+    def __init__(self, connect, window: float, max_ops: int):
+        self.window = window
+        self.max_ops = max_ops
+        self._queue: "queue.Queue" = queue.Queue()
+        self._connect = connect
+        self._thread = threading.Thread(target=self._run, name="sqlite-group-commit", daemon=True)
+        self._thread.start()
+    
+    def submit(self, op) -> Future:
+        future = Future()
+        self._queue.put((op, future))
+        return future
+    
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+    
+    def _run(self):
+        conn = self._connect()
+        conn.isolation_level = None  # explicit BEGIN / COMMIT / savepoints
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            group = [item]
+            deadline = time.monotonic() + self.window
+            while len(group) < self.max_ops:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                group.append(item)
+            self._commit(conn, group)
+        conn.close()
+    
+    def _commit(self, conn: sqlite3.Connection, group: list):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op, future in group:
+                conn.execute("SAVEPOINT op")
+                try:
+                    outcomes.append((future, op(conn), None))
+                    conn.execute("RELEASE op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    outcomes.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future in group:
+                future.set_exception(e)
+            return
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+def _migration(registry: list, version: int, description: str):
+    """Register a schema migration; versions must be added in increasing order"""
+    def register(apply: Callable):
+        assert not registry or registry[-1][0] < version
+        registry.append((version, description, apply))
+        return apply
+    return register
+
+
+# Ordered (version, description, apply(conn)). Each runs once, in its own
+# transaction, and is recorded in schema_version. Databases created before
+# versioning start at 0, so every step must tolerate already being applied.
+SQLITE_MIGRATIONS: List[Tuple[int, str, Callable]] = []
+
+
+@_migration(SQLITE_MIGRATIONS, 1, "base tables")
+def _sqlite_base_tables(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS agents (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            capabilities TEXT,
+            status TEXT DEFAULT 'stopped',
+            config TEXT,
+            api_key TEXT,
+            created_at TEXT,
+            last_active TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tasks (
+            id TEXT PRIMARY KEY,
+            agent_id TEXT NOT NULL,
+            input TEXT,
+            output TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at TEXT,
+            completed_at TEXT,
+            FOREIGN KEY (agent_id) REFERENCES agents(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS memories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_id TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT,
+            created_at TEXT,
+            FOREIGN KEY (agent_id) REFERENCES agents(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS shared_memory (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TEXT,
+            counter INTEGER DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS messages (
+            id TEXT PRIMARY KEY,
+            from_agent_id TEXT,
+            to_agent_id TEXT,
+            content TEXT,
+            created_at TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_agent ON tasks(agent_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_memories_agent ON memories(agent_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_memories_key ON memories(key)")
+
+
+def _sqlite_has_column(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(r["name"] == column for r in conn.execute(f"PRAGMA table_info({table})"))
+
+
+@_migration(SQLITE_MIGRATIONS, 2, "task priority")
+def _sqlite_task_priority(conn: sqlite3.Connection):
+    if not _sqlite_has_column(conn, "tasks", "priority"):
+        conn.execute("ALTER TABLE tasks ADD COLUMN priority INTEGER DEFAULT 0")
+
+
+@_migration(SQLITE_MIGRATIONS, 3, "keyset listing indexes")
+def _sqlite_listing_indexes(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_agent_status_created ON tasks(agent_id, status, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_agent_created ON tasks(agent_id, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks(created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_memories_agent_created ON memories(agent_id, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_shared_updated ON shared_memory(updated_at, key)")
+
+
+@_migration(SQLITE_MIGRATIONS, 4, "memory full-text index")
+def _sqlite_memory_fts(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
+            agent_id, key, value, content='memories', content_rowid='id'
+        )
+    """)
+    # Keep the external-content index in step with memories
+    for name in ("memories_fts_insert", "memories_fts_delete", "memories_fts_update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("""
+        CREATE TRIGGER memories_fts_insert AFTER INSERT ON memories BEGIN
+            INSERT INTO memories_fts (rowid, agent_id, key, value)
+            VALUES (new.id, new.agent_id, new.key, new.value);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER memories_fts_delete AFTER DELETE ON memories BEGIN
+            INSERT INTO memories_fts (memories_fts, rowid, agent_id, key, value)
+            VALUES ('delete', old.id, old.agent_id, old.key, old.value);
+        END
+    """)
+    # Only the indexed columns; embedding backfills leave the index alone
+    conn.execute("""
+        CREATE TRIGGER memories_fts_update AFTER UPDATE OF agent_id, key, value ON memories BEGIN
+            INSERT INTO memories_fts (memories_fts, rowid, agent_id, key, value)
+            VALUES ('delete', old.id, old.agent_id, old.key, old.value);
+            INSERT INTO memories_fts (rowid, agent_id, key, value)
+            VALUES (new.id, new.agent_id, new.key, new.value);
+        END
+    """)
+    # Rows written before the triggers existed were never indexed
+    conn.execute("INSERT INTO memories_fts (memories_fts) VALUES ('rebuild')")
+
+
+@_migration(SQLITE_MIGRATIONS, 5, "unique memory keys")
+def _sqlite_unique_memory_keys(conn: sqlite3.Connection):
+    # One row per (agent_id, key); older databases may hold duplicates
+    conn.execute("DELETE FROM memories WHERE id NOT IN (SELECT max(id) FROM memories GROUP BY agent_id, key)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_memories_agent_key ON memories(agent_id, key)")
+    conn.execute("DROP INDEX IF EXISTS idx_memories_agent")  # covered by the unique index
+
+
+@_migration(SQLITE_MIGRATIONS, 6, "memory embeddings")
+def _sqlite_memory_embeddings(conn: sqlite3.Connection):
+    if not _sqlite_has_column(conn, "memories", "embedding"):
+        conn.execute("ALTER TABLE memories ADD COLUMN embedding BLOB")
+
+
+@_migration(SQLITE_MIGRATIONS, 7, "task archive")
+def _sqlite_task_archive(conn: sqlite3.Connection):
+    # Cold tier for old terminal tasks; input/output are zlib-compressed
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tasks_archive (
+            id TEXT PRIMARY KEY,
+            agent_id TEXT NOT NULL,
+            input BLOB,
+            output BLOB,
+            status TEXT,
+            priority INTEGER DEFAULT 0,
+            created_at TEXT,
+            completed_at TEXT,
+            archived_at TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_archive_agent_created ON tasks_archive(agent_id, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_archive_created ON tasks_archive(created_at, id)")
+
+
+@_migration(SQLITE_MIGRATIONS, 8, "task tenant and callback")
+def _sqlite_task_tenant_callback(conn: sqlite3.Connection):
+    # Both survive a restart now, so rehydrated tasks keep their fair share and callback
+    for table in ("tasks", "tasks_archive"):
+        if not _sqlite_has_column(conn, table, "tenant"):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN tenant TEXT DEFAULT 'default'")
+        if not _sqlite_has_column(conn, table, "callback_url"):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN callback_url TEXT")
+
+
 class SQLiteDB(Database):
     """SQLite implementation for local storage"""
     
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, journal_mode: str = None, synchronous: str = None,
+                 group_commit: bool = None, commit_window_ms: float = None, commit_max_ops: int = None):
         if db_path is None:
             db_path = os.path.expanduser("~/botcloud/data/botcloud.db")
         
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+        self.journal_mode = (journal_mode or SQLITE_JOURNAL_MODE).upper()
+        self.synchronous = (synchronous or SQLITE_SYNCHRONOUS).upper()
+        if self.journal_mode not in _JOURNAL_MODES:
+            raise ValueError(f"journal_mode must be one of {_JOURNAL_MODES}")
+        if self.synchronous not in _SYNCHRONOUS_LEVELS:
+            raise ValueError(f"synchronous must be one of {_SYNCHRONOUS_LEVELS}")
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
         self.init_schema()
+        self._init_vectors(VECTOR_DIR or os.path.splitext(db_path)[0] + "-vectors")
+        
+        if SQLITE_GROUP_COMMIT if group_commit is None else group_commit:
+            window = GROUP_COMMIT_WINDOW_MS if commit_window_ms is None else commit_window_ms
+            self._committer = _GroupCommitter(
+                self._connect, window / 1000, commit_max_ops or GROUP_COMMIT_MAX_OPS
+            )
+        else:
+            self._committer = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        return conn
+    
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use.
+        
+        WAL mode lets readers run alongside the single writer, so threads no
+        longer share (and race on) one connection.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def _write(self, op):
+        """Run op(conn) in a transaction and return its result: through the
+        group committer when enabled, else committed on this thread's connection"""
+        if self._committer:
+            return self._committer.submit(op).result()
+        conn = self.conn
+        with conn:
+            return op(conn)
     
     def init_schema(self):
-        """Initialize database schema"""
-        self.conn.executescript("""
-            CREATE TABLE IF NOT EXISTS agents (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                capabilities TEXT,
-                status TEXT DEFAULT 'stopped',
-                config TEXT,
-                api_key TEXT,
-                created_at TEXT,
-                last_active TEXT
-            );
-            
-            CREATE TABLE IF NOT EXISTS tasks (
-                id TEXT PRIMARY KEY,
-                agent_id TEXT NOT NULL,
-                input TEXT,
-                output TEXT,
-                status TEXT DEFAULT 'pending',
-                created_at TEXT,
-                completed_at TEXT,
-                FOREIGN KEY (agent_id) REFERENCES agents(id)
-            );
-            
-            CREATE TABLE IF NOT EXISTS memories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                agent_id TEXT NOT NULL,
-                key TEXT NOT NULL,
-                value TEXT,
-                created_at TEXT,
-                FOREIGN KEY (agent_id) REFERENCES agents(id)
-            );
-            
-            CREATE TABLE IF NOT EXISTS shared_memory (
-                key TEXT PRIMARY KEY,
-                value TEXT,
-                updated_at TEXT,
-                counter INTEGER DEFAULT 0
-            );
-            
-            CREATE TABLE IF NOT EXISTS messages (
-                id TEXT PRIMARY KEY,
-                from_agent_id TEXT,
-                to_agent_id TEXT,
-                content TEXT,
-                created_at TEXT
-            );
-            
-            CREATE INDEX IF NOT EXISTS idx_tasks_agent ON tasks(agent_id);
-            CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
-            CREATE INDEX IF NOT EXISTS idx_memories_agent ON memories(agent_id);
-            CREATE INDEX IF NOT EXISTS idx_memories_key ON memories(key);
-            CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
-                agent_id, key, value, content='memories', content_rowid='id'
-            );
+        """Apply pending migrations. An up-to-date database costs one query,
+        so short-lived processes don't pay for DDL on every start."""
+        if self._schema_version() >= SQLITE_MIGRATIONS[-1][0]:
+            return
+        conn = self.conn
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TEXT
+            )
         """)
-        self.conn.commit()
+        for version, description, apply in SQLITE_MIGRATIONS:
+            with conn:
+                # The write lock makes concurrent starters apply each step once
+                conn.execute("BEGIN IMMEDIATE")
+                if self._schema_version() < version:
+                    print(f"Applying schema migration {version}: {description}")
+                    apply(conn)
+                    conn.execute(
+                        "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                        (version, description, datetime.now().isoformat())
+                    )
+    
+    def _schema_version(self) -> int:
+        try:
+            return self.conn.execute("SELECT max(version) FROM schema_version").fetchone()[0] or 0
+        except sqlite3.OperationalError:  # no such table: created before versioning
+            return 0
     
     def create_agent(self, name: str, capabilities: List[str], api_key: str) -> Dict:
         import uuid
         agent_id = f"agent_{uuid.uuid4().hex[:8]}"
         now = datetime.utcnow().isoformat()
         
-        self.conn.execute("""
+        self._write(lambda conn: conn.execute("""
             INSERT INTO agents (id, name, capabilities, status, api_key, created_at, last_active)
             VALUES (?, ?, ?, 'stopped', ?, ?, ?)
-        """, (agent_id, name, json.dumps(capabilities), api_key, now, now))
-        self.conn.commit()
+        """, (agent_id, name, json.dumps(capabilities), api_key, now, now)))
         
         return {
             "id": agent_id,
@@ -190,22 +757,22 @@ class SQLiteDB(Database):
         rows = self.conn.execute("SELECT * FROM agents").fetchall()
         return [dict(r) for r in rows]
     
-    def create_task(self, agent_id: str, input_data: str) -> Dict:
+    def create_task(self, agent_id: str, input_data: str, priority: int = 0) -> Dict:
         import uuid
         task_id = f"task_{uuid.uuid4().hex[:8]}"
         now = datetime.utcnow().isoformat()
         
-        self.conn.execute("""
-            INSERT INTO tasks (id, agent_id, input, status, created_at)
-            VALUES (?, ?, ?, 'pending', ?)
-        """, (task_id, agent_id, input_data, now))
-        self.conn.commit()
+        self._write(lambda conn: conn.execute("""
+            INSERT INTO tasks (id, agent_id, input, status, priority, created_at)
+            VALUES (?, ?, ?, 'pending', ?, ?)
+        """, (task_id, agent_id, input_data, priority, now)))
         
         return {
             "id": task_id,
             "agent_id": agent_id,
             "input": input_data,
             "status": "pending",
+            "priority": priority,
             "created_at": now
         }
     
@@ -216,91 +783,254 @@ class SQLiteDB(Database):
         
         if row:
             return dict(row)
+        row = self.conn.execute(
+            f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks_archive WHERE id = ?", (task_id,)
+        ).fetchone()
+        if row:
+            return _unpack_task(dict(row))
         return None
     
-    def list_tasks(self, agent_id: str = None) -> List[Dict]:
+    def list_tasks(self, agent_id: str = None, status: str = None, since: str = None, until: str = None,
+                   after: tuple = None, limit: int = None, fields: List[str] = None) -> List[Dict]:
+        columns = _select_columns(fields, TASK_COLUMNS, ("id", "created_at"))
+        where, params = [], []
         if agent_id:
-            rows = self.conn.execute(
-                "SELECT * FROM tasks WHERE agent_id = ? ORDER BY created_at DESC", 
-                (agent_id,)
-            ).fetchall()
-        else:
-            rows = self.conn.execute(
-                "SELECT * FROM tasks ORDER BY created_at DESC"
-            ).fetchall()
+            where.append("agent_id = ?")
+            params.append(agent_id)
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        _keyset_where(where, params, "?", "created_at", "id", since, until, after)
         
-        return [dict(r) for r in rows]
+        sql = f"SELECT {', '.join(columns)} FROM {{table}}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        
+        rows = [dict(r) for r in self.conn.execute(sql.format(table="tasks"), params)]
+        if status is None or status in ARCHIVED_STATUSES:
+            cold = [dict(r) for r in self.conn.execute(sql.format(table="tasks_archive"), params)]
+            rows = _merge_tiers(rows, cold, limit)
+        return rows
     
     def complete_task(self, task_id: str, output: str, status: str = "completed"):
         now = datetime.utcnow().isoformat()
-        self.conn.execute("""
+        self._write(lambda conn: conn.execute("""
             UPDATE tasks SET output = ?, status = ?, completed_at = ?
             WHERE id = ?
-        """, (output, status, now, task_id))
-        self.conn.commit()
+        """, (output, status, now, task_id)))
     
-    def store_memory(self, agent_id: str, key: str, value: str) -> Dict:
+    def create_tasks(self, specs: List[Tuple[str, str, int]]) -> List[Dict]:
+        """Create (agent_id, input_data, priority) tasks in one transaction"""
+        import uuid
+        now = datetime.utcnow().isoformat()
+        tasks = [
+            {"id": f"task_{uuid.uuid4().hex[:8]}", "agent_id": agent_id, "input": input_data,
+             "status": "pending", "priority": priority, "created_at": now}
+            for agent_id, input_data, priority in specs
+        ]
+        self._write(lambda conn: conn.executemany("""
+            INSERT INTO tasks (id, agent_id, input, status, priority, created_at)
+            VALUES (?, ?, ?, 'pending', ?, ?)
+        """, [(t["id"], t["agent_id"], t["input"], t["priority"], now) for t in tasks]))
+        return tasks
+    
+    def complete_tasks(self, results: List[Tuple[str, str, str]]) -> int:
+        """Apply (task_id, output, status) results in one transaction"""
+        now = datetime.utcnow().isoformat()
+        self._write(lambda conn: conn.executemany("""
+            UPDATE tasks SET output = ?, status = ?, completed_at = ?
+            WHERE id = ?
+        """, [(output, status, now, task_id) for task_id, output, status in results]))
+        return len(results)
+    
+    def upsert_tasks(self, tasks: List[Dict]) -> int:
+        """Insert or replace full task rows in one transaction"""
+        if not tasks:
+            return 0
+        self._write(lambda conn: conn.executemany("""
+            INSERT OR REPLACE INTO tasks
+                (id, agent_id, input, output, status, priority, tenant, callback_url, created_at, completed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [_task_row(t) for t in tasks]))
+        return len(tasks)
+    
+    def archive_tasks(self, before: str, limit: int = TASK_ARCHIVE_BATCH) -> int:
+        """Move up to `limit` completed/failed tasks finished before `before`
+        to tasks_archive; returns how many moved"""
         now = datetime.utcnow().isoformat()
         
-        # Delete existing key
-        self.conn.execute(
-            "DELETE FROM memories WHERE agent_id = ? AND key = ?",
-            (agent_id, key)
-        )
+        def apply(conn):
+            rows = conn.execute(f"""
+                SELECT {', '.join(TASK_COLUMNS)} FROM tasks
+                WHERE status IN ({', '.join('?' * len(ARCHIVED_STATUSES))}) AND completed_at < ?
+                LIMIT ?
+            """, (*ARCHIVED_STATUSES, before, limit)).fetchall()
+            conn.executemany("""
+                INSERT OR REPLACE INTO tasks_archive
+                    (id, agent_id, input, output, status, priority, tenant, callback_url, created_at, completed_at,
+                     archived_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (r["id"], r["agent_id"], _pack_text(r["input"]), _pack_text(r["output"]), r["status"],
+                 r["priority"], r["tenant"], r["callback_url"], r["created_at"], r["completed_at"], now)
+                for r in rows
+            ])
+            conn.executemany("DELETE FROM tasks WHERE id = ?", [(r["id"],) for r in rows])
+            return len(rows)
         
-        self.conn.execute("""
-            INSERT INTO memories (agent_id, key, value, created_at)
-            VALUES (?, ?, ?, ?)
-        """, (agent_id, key, value, now))
-        self.conn.commit()
+        return self._write(apply)
+    
+    def write_batch(self, agents: List[Dict] = (), tasks: List[Dict] = (), deleted_tasks: List[str] = (),
+                    memories: List[Dict] = (), deleted_memories: List[Tuple[str, str]] = (),
+                    messages: List[Dict] = ()):
+        """Persist a write-behind batch (full rows, upserted) in one transaction"""
+        blobs = self._embeddings([(m["agent_id"], m["key"], m.get("value")) for m in memories], deleted_memories)
+        
+        def apply(conn):
+            conn.executemany("""
+                INSERT OR REPLACE INTO agents (id, name, capabilities, status, config, api_key, created_at, last_active)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (a["id"], a["name"], json.dumps(a.get("capabilities", [])), a.get("status"),
+                 json.dumps(a.get("config", {})), a.get("api_key"), a.get("created_at"), a.get("last_active"))
+                for a in agents
+            ])
+            conn.executemany("""
+                INSERT OR REPLACE INTO tasks
+                    (id, agent_id, input, output, status, priority, tenant, callback_url, created_at, completed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [_task_row(t) for t in tasks])
+            conn.executemany("DELETE FROM tasks WHERE id = ?", [(i,) for i in deleted_tasks])
+            conn.executemany("DELETE FROM tasks_archive WHERE id = ?", [(i,) for i in deleted_tasks])
+            conn.executemany("DELETE FROM memories WHERE agent_id = ? AND key = ?", list(deleted_memories))
+            conn.executemany(self._UPSERT_MEMORY_SQL, [
+                (m["agent_id"], m["key"], m.get("value"), m.get("created_at"), blob)
+                for m, blob in zip(memories, blobs)
+            ])
+            conn.executemany("""
+                INSERT OR IGNORE INTO messages (id, from_agent_id, to_agent_id, content, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, [
+                (m["id"], m["from_agent_id"], m["to_agent_id"], m.get("content"), m.get("created_at"))
+                for m in messages
+            ])
         
+        self._write(apply)
+        self._index_memories([(m["agent_id"], m["key"], b) for m, b in zip(memories, blobs)], deleted_memories)
+    
+    def load_state(self) -> Dict[str, List[Dict]]:
+        agents = [dict(r) for r in self.conn.execute("SELECT * FROM agents")]
+        for a in agents:
+            a["capabilities"] = json.loads(a["capabilities"]) if a["capabilities"] else []
+            a["config"] = json.loads(a["config"]) if a["config"] else {}
+        return {
+            "agents": agents,
+            "tasks": [dict(r) for r in self.conn.execute(
+                f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks WHERE status NOT IN ('completed', 'failed') "
+                "ORDER BY created_at, id"
+            )],
+            "memories": [dict(r) for r in self.conn.execute(
+                f"SELECT {', '.join(MEMORY_COLUMNS)} FROM memories ORDER BY created_at, id"
+            )],
+            "messages": [dict(r) for r in self.conn.execute("SELECT * FROM messages ORDER BY created_at, id")]
+        }
+    
+    _UPSERT_MEMORY_SQL = """
+        INSERT INTO memories (agent_id, key, value, created_at, embedding) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (agent_id, key) DO UPDATE
+        SET value = excluded.value, created_at = excluded.created_at, embedding = excluded.embedding
+    """
+    
+    def store_memory(self, agent_id: str, key: str, value: str) -> Dict:
+        now = datetime.utcnow().isoformat()
+        blob, = self._embeddings([(agent_id, key, value)])
+        self._write(lambda conn: conn.execute(self._UPSERT_MEMORY_SQL, (agent_id, key, value, now, blob)))
+        self._index_memories([(agent_id, key, blob)])
         return {"key": key, "value": value, "created_at": now}
     
-    def get_memories(self, agent_id: str) -> List[Dict]:
-        rows = self.conn.execute(
-            "SELECT * FROM memories WHERE agent_id = ? ORDER BY created_at DESC",
-            (agent_id,)
-        ).fetchall()
-        return [dict(r) for r in rows]
+    def import_memories(self, agent_id: str, items: List[Tuple[str, str]]) -> int:
+        now = datetime.utcnow().isoformat()
+        items = list(items)
+        for start in range(0, len(items), MEMORY_IMPORT_CHUNK):
+            chunk = items[start:start + MEMORY_IMPORT_CHUNK]
+            blobs = self._embeddings([(agent_id, k, v) for k, v in chunk])
+            rows = [(agent_id, k, v, now, blob) for (k, v), blob in zip(chunk, blobs)]
+            self._write(lambda conn: conn.executemany(self._UPSERT_MEMORY_SQL, rows))
+            self._index_memories([(agent_id, k, blob) for (k, _), blob in zip(chunk, blobs)])
+        return len(items)
     
-    def search_memories(self, agent_id: str, query: str) -> List[Dict]:
-        """Hybrid search: keyword match + FTS"""
-        if not query:
-            return self.get_memories(agent_id)
+    def get_memories(self, agent_id: str, since: str = None, until: str = None,
+                     after: tuple = None, limit: int = None, fields: List[str] = None) -> List[Dict]:
+        columns = _select_columns(fields, MEMORY_COLUMNS, ("id", "created_at"))
+        where, params = ["agent_id = ?"], [agent_id]
+        _keyset_where(where, params, "?", "created_at", "id", since, until, after)
         
-        # Try FTS first
-        try:
-            rows = self.conn.execute("""
-                SELECT m.* FROM memories m
-                JOIN memories_fts fts ON m.id = fts.rowid
-                WHERE memories_fts MATCH ? AND m.agent_id = ?
-                ORDER BY rank
-            """, (query, agent_id)).fetchall()
-            
-            if rows:
-                return [dict(r) for r in rows]
-        except:
-            pass
+        sql = f"SELECT {', '.join(columns)} FROM memories WHERE {' AND '.join(where)} ORDER BY created_at DESC, id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
         
-        # Fallback: LIKE search
+        rows = self.conn.execute(sql, params).fetchall()
+        return [dict(r) for r in rows]
+    
+    def _keyword_search(self, agent_id: str, query: str, limit: int) -> List[Dict]:
+        """BM25-ranked FTS5 search (key hits weigh double) with highlighted snippets"""
+        terms = _fts_query(query or "")
+        if not terms:
+            return self.get_memories(agent_id, limit=limit)
+        
+        # Restricting the MATCH to the agent's rows lets FTS5 skip everyone else's
         rows = self.conn.execute("""
-            SELECT * FROM memories 
-            WHERE agent_id = ? AND (key LIKE ? OR value LIKE ?)
-            ORDER BY created_at DESC
-        """, (agent_id, f"%{query}%", f"%{query}%")).fetchall()
+            SELECT m.id, m.agent_id, m.key, m.value, m.created_at,
+                   snippet(memories_fts, 2, '<mark>', '</mark>', '…', 16) AS snippet,
+                   -bm25(memories_fts, 0.0, 2.0, 1.0) AS score
+            FROM memories_fts fts
+            JOIN memories m ON m.id = fts.rowid
+            WHERE memories_fts MATCH ? AND m.agent_id = ?
+            ORDER BY score DESC
+            LIMIT ?
+        """, (f'agent_id : "{agent_id.replace(chr(34), chr(34) * 2)}" AND ({terms})', agent_id, limit)).fetchall()
         
         return [dict(r) for r in rows]
     
+    def _memories_by_keys(self, agent_id: str, keys: List[str]) -> List[Dict]:
+        if not keys:
+            return []
+        rows = self.conn.execute(
+            f"SELECT {', '.join(MEMORY_COLUMNS)} FROM memories WHERE agent_id = ? AND key IN ({', '.join('?' * len(keys))})",
+            [agent_id, *keys]
+        ).fetchall()
+        return [dict(r) for r in rows]
+    
+    def _embedding_rows(self, agent_id: str) -> List[Tuple[str, str, Optional[bytes]]]:
+        return [tuple(r) for r in self.conn.execute(
+            "SELECT key, value, embedding FROM memories WHERE agent_id = ?", (agent_id,)
+        )]
+    
+    def _memory_fingerprint(self, agent_id: str) -> tuple:
+        return tuple(self.conn.execute(
+            "SELECT count(*), max(created_at) FROM memories WHERE agent_id = ?", (agent_id,)
+        ).fetchone())
+    
+    def _store_embeddings(self, agent_id: str, items: List[Tuple[str, bytes]]):
+        self._write(lambda conn: conn.executemany(
+            "UPDATE memories SET embedding = ? WHERE agent_id = ? AND key = ?",
+            [(blob, agent_id, key) for key, blob in items]
+        ))
+    
     # ============ Shared Memory (Global) ============
     
     def shared_set(self, key: str, value: str) -> Dict:
         """Set a shared value (global, not per-agent)"""
         now = datetime.utcnow().isoformat()
-        self.conn.execute("""
+        self._write(lambda conn: conn.execute("""
             INSERT OR REPLACE INTO shared_memory (key, value, updated_at)
             VALUES (?, ?, ?)
-        """, (key, value, now))
-        self.conn.commit()
+        """, (key, value, now)))
         return {"key": key, "value": value, "updated_at": now}
     
     def shared_get(self, key: str) -> Optional[Dict]:
@@ -310,38 +1040,215 @@ class SQLiteDB(Database):
         ).fetchone()
         return dict(row) if row else None
     
+    _INCR_SQL = """
+        INSERT INTO shared_memory (key, counter, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT (key) DO UPDATE
+        SET counter = coalesce(counter, 0) + excluded.counter, updated_at = excluded.updated_at
+        RETURNING counter
+    """
+    
     def shared_incr(self, key: str, delta: int = 1) -> int:
         """Atomically increment a counter"""
-        # First ensure the key exists
-        self.conn.execute("""
-            INSERT OR IGNORE INTO shared_memory (key, counter, updated_at)
-            VALUES (?, 0, ?)
-        """, (key, datetime.utcnow().isoformat()))
-        
-        # Now increment
-        self.conn.execute("""
-            UPDATE shared_memory SET counter = counter + ?, updated_at = ?
-            WHERE key = ?
-        """, (delta, datetime.utcnow().isoformat(), key))
-        self.conn.commit()
-        
-        # Get new value
-        row = self.conn.execute("SELECT counter FROM shared_memory WHERE key = ?", (key,)).fetchone()
-        return row[0] if row else 0
+        now = datetime.utcnow().isoformat()
+        return self._write(lambda conn: conn.execute(self._INCR_SQL, (key, delta, now)).fetchone()[0])
+    
+    def shared_incr_many(self, deltas: Dict[str, int]) -> Dict[str, int]:
+        """Apply {key: delta} increments in one transaction; returns the new counters"""
+        now = datetime.utcnow().isoformat()
+        
+        def apply(conn):
+            return {
+                key: conn.execute(self._INCR_SQL, (key, delta, now)).fetchone()[0]
+                for key, delta in sorted(deltas.items())
+            }
+        
+        return self._write(apply) if deltas else {}
     
     def shared_delete(self, key: str) -> bool:
         """Delete a shared key"""
-        self.conn.execute("DELETE FROM shared_memory WHERE key = ?", (key,))
-        self.conn.commit()
+        self._write(lambda conn: conn.execute("DELETE FROM shared_memory WHERE key = ?", (key,)))
         return True
     
-    def shared_list(self) -> List[Dict]:
-        """List all shared keys"""
-        rows = self.conn.execute("SELECT * FROM shared_memory ORDER BY updated_at DESC").fetchall()
+    def shared_list(self, since: str = None, until: str = None, after: tuple = None,
+                    limit: int = None, fields: List[str] = None) -> List[Dict]:
+        """List shared keys, most recently updated first"""
+        columns = _select_columns(fields, SHARED_COLUMNS, ("key", "updated_at"))
+        where, params = [], []
+        _keyset_where(where, params, "?", "updated_at", "key", since, until, after, nullable=True)
+        
+        sql = f"SELECT {', '.join(columns)} FROM shared_memory"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY updated_at DESC, key DESC"  # SQLite sorts NULLs last in DESC
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        
+        rows = self.conn.execute(sql, params).fetchall()
         return [dict(r) for r in rows]
     
     def close(self):
-        self.conn.close()
+        if self.vectors:
+            self.vectors.close()
+        if self._committer:
+            self._committer.close()
+            self._committer = None
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+# PostgreSQL counterparts of SQLITE_MIGRATIONS, apply(cur) on an autocommit
+# cursor so indexes can be built CONCURRENTLY without blocking writers.
+PG_MIGRATIONS: List[Tuple[int, str, Callable]] = []
+_PG_MIGRATION_LOCK = 0x626f74  # pg_advisory_lock key held while migrating
+
+
+def _pg_create_index(cur, name: str, definition: str, unique: bool = False):
+    """CREATE INDEX CONCURRENTLY, replacing an invalid leftover from an
+    interrupted build (IF NOT EXISTS alone would keep it)"""
+    cur.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,))
+    row = cur.fetchone()
+    if row and row[0]:
+        return
+    if row:
+        cur.execute(f"DROP INDEX CONCURRENTLY {name}")
+    cur.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY {name} ON {definition}")
+
+
+@_migration(PG_MIGRATIONS, 1, "base tables")
+def _pg_base_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS agents (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            capabilities JSONB,
+            status TEXT DEFAULT 'stopped',
+            config JSONB,
+            api_key TEXT,
+            created_at TIMESTAMP DEFAULT NOW(),
+            last_active TIMESTAMP
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS tasks (
+            id TEXT PRIMARY KEY,
+            agent_id TEXT REFERENCES agents(id),
+            input TEXT,
+            output TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT NOW(),
+            completed_at TIMESTAMP
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS memories (
+            id SERIAL PRIMARY KEY,
+            agent_id TEXT REFERENCES agents(id),
+            key TEXT NOT NULL,
+            value TEXT,
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    # Shared memory table (global, not per-agent)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS shared_memory (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            counter INTEGER DEFAULT 0
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS messages (
+            id TEXT PRIMARY KEY,
+            from_agent_id TEXT,
+            to_agent_id TEXT,
+            content TEXT,
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+
+
+@_migration(PG_MIGRATIONS, 2, "task priority")
+def _pg_task_priority(cur):
+    cur.execute("ALTER TABLE tasks ADD COLUMN IF NOT EXISTS priority INTEGER DEFAULT 0")
+
+
+@_migration(PG_MIGRATIONS, 3, "keyset listing indexes")
+def _pg_listing_indexes(cur):
+    # Composite indexes so keyset-paginated listings are range scans
+    _pg_create_index(cur, "idx_tasks_agent_status_created", "tasks(agent_id, status, created_at, id)")
+    _pg_create_index(cur, "idx_tasks_agent_created", "tasks(agent_id, created_at, id)")
+    _pg_create_index(cur, "idx_tasks_created", "tasks(created_at, id)")
+    _pg_create_index(cur, "idx_memories_agent_created", "memories(agent_id, created_at, id)")
+    _pg_create_index(cur, "idx_shared_updated", "shared_memory(updated_at, key)")
+
+
+@_migration(PG_MIGRATIONS, 4, "memory full-text index")
+def _pg_memory_search(cur):
+    # Stored tsvector (key weighted above value) so search never re-parses rows
+    cur.execute("""
+        ALTER TABLE memories ADD COLUMN IF NOT EXISTS search tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(key, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(value, '')), 'B')
+        ) STORED
+    """)
+    cur.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_memories_fts")
+    _pg_create_index(cur, "idx_memories_search", "memories USING GIN(search)")
+    # Trigram indexes serve fuzzy and substring search when the extension is allowed
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except Exception as e:
+        print(f"pg_trgm unavailable, fuzzy memory search disabled: {e}")
+        return
+    _pg_create_index(cur, "idx_memories_key_trgm", "memories USING GIN(key gin_trgm_ops)")
+    _pg_create_index(cur, "idx_memories_value_trgm", "memories USING GIN(value gin_trgm_ops)")
+
+
+@_migration(PG_MIGRATIONS, 5, "unique memory keys")
+def _pg_unique_memory_keys(cur):
+    # One row per (agent_id, key); older databases may hold duplicates
+    cur.execute("""
+        DELETE FROM memories m USING memories newer
+        WHERE m.agent_id = newer.agent_id AND m.key = newer.key AND m.id < newer.id
+    """)
+    _pg_create_index(cur, "idx_memories_agent_key", "memories(agent_id, key)", unique=True)
+
+
+@_migration(PG_MIGRATIONS, 6, "memory embeddings")
+def _pg_memory_embeddings(cur):
+    cur.execute("ALTER TABLE memories ADD COLUMN IF NOT EXISTS embedding BYTEA")
+
+
+@_migration(PG_MIGRATIONS, 7, "task archive")
+def _pg_task_archive(cur):
+    # Cold tier for old terminal tasks; input/output are zlib-compressed
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS tasks_archive (
+            id TEXT PRIMARY KEY,
+            agent_id TEXT NOT NULL,
+            input BYTEA,
+            output BYTEA,
+            status TEXT,
+            priority INTEGER DEFAULT 0,
+            created_at TIMESTAMP,
+            completed_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    _pg_create_index(cur, "idx_tasks_archive_agent_created", "tasks_archive(agent_id, created_at, id)")
+    _pg_create_index(cur, "idx_tasks_archive_created", "tasks_archive(created_at, id)")
+
+
+@_migration(PG_MIGRATIONS, 8, "task tenant and callback")
+def _pg_task_tenant_callback(cur):
+    for table in ("tasks", "tasks_archive"):
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS tenant TEXT DEFAULT 'default'")
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS callback_url TEXT")
 
 
 class PostgresDB(Database):
@@ -354,70 +1261,75 @@ class PostgresDB(Database):
                 "postgresql://localhost/botcloud"
             )
         
-        import psycopg2
-        self.conn = psycopg2.connect(connection_string)
-        self.conn.autocommit = True
+        from psycopg2.pool import ThreadedConnectionPool
+        self.pool = ThreadedConnectionPool(1, DB_POOL_SIZE, connection_string)
+        # The pool raises when exhausted; the semaphore makes callers wait instead
+        self._slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+        self.trigram = False  # set by init_schema when the trigram indexes exist
         self.init_schema()
+        self._init_vectors(VECTOR_DIR or os.path.expanduser("~/botcloud/data/vectors"))
+    
+    @contextmanager
+    def _cursor(self):
+        """Borrow a pooled connection for the duration of one operation"""
+        with self._slots:
+            conn = self.pool.getconn()
+            try:
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    yield cur
+            finally:
+                self.pool.putconn(conn, close=bool(conn.closed))
     
     def init_schema(self):
-        with self.conn.cursor() as cur:
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS agents (
-                    id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    capabilities JSONB,
-                    status TEXT DEFAULT 'stopped',
-                    config JSONB,
-                    api_key TEXT,
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    last_active TIMESTAMP
-                )
-            """)
-            
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS tasks (
-                    id TEXT PRIMARY KEY,
-                    agent_id TEXT REFERENCES agents(id),
-                    input TEXT,
-                    output TEXT,
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    completed_at TIMESTAMP
-                )
-            """)
-            
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS memories (
-                    id SERIAL PRIMARY KEY,
-                    agent_id TEXT REFERENCES agents(id),
-                    key TEXT NOT NULL,
-                    value TEXT,
-                    created_at TIMESTAMP DEFAULT NOW()
-                )
-            """)
-            
-            # Create GIN index for full-text search
-            cur.execute("""
-                CREATE INDEX IF NOT EXISTS idx_memories_fts 
-                ON memories USING GIN(to_tsvector('english', key || ' ' || value))
-            """)
-            
-            # Shared memory table (global, not per-agent)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS shared_memory (
-                    key TEXT PRIMARY KEY,
-                    value TEXT,
-                    updated_at TIMESTAMP DEFAULT NOW(),
-                    counter INTEGER DEFAULT 0
-                )
-            """)
+        """Apply pending migrations. An up-to-date database costs one query."""
+        if self._schema_state() >= PG_MIGRATIONS[-1][0]:
+            return
+        with self._cursor() as cur:
+            # Session lock: concurrent starters wait, then find nothing left to do
+            cur.execute("SELECT pg_advisory_lock(%s)", (_PG_MIGRATION_LOCK,))
+            try:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT,
+                        applied_at TIMESTAMP DEFAULT NOW()
+                    )
+                """)
+                cur.execute("SELECT coalesce(max(version), 0) FROM schema_version")
+                current = cur.fetchone()[0]
+                for version, description, apply in PG_MIGRATIONS:
+                    if version > current:
+                        print(f"Applying schema migration {version}: {description}")
+                        apply(cur)
+                        cur.execute(
+                            "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                            (version, description)
+                        )
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (_PG_MIGRATION_LOCK,))
+        self._schema_state()
+    
+    def _schema_state(self) -> int:
+        """Schema version (0 before versioning); also refreshes self.trigram"""
+        from psycopg2.errors import UndefinedTable
+        with self._cursor() as cur:
+            try:
+                cur.execute("""
+                    SELECT (SELECT max(version) FROM schema_version),
+                           to_regclass('idx_memories_value_trgm') IS NOT NULL
+                """)
+            except UndefinedTable:
+                return 0
+            version, self.trigram = cur.fetchone()
+        return version or 0
     
     def create_agent(self, name: str, capabilities: List[str], api_key: str) -> Dict:
         import uuid
         import json
         agent_id = f"agent_{uuid.uuid4().hex[:8]}"
         
-        with self.conn.cursor() as cur:
+        with self._cursor() as cur:
             cur.execute("""
                 INSERT INTO agents (id, name, capabilities, api_key)
                 VALUES (%s, %s, %s, %s)
@@ -433,7 +1345,7 @@ class PostgresDB(Database):
             }
     
     def get_agent(self, agent_id: str) -> Optional[Dict]:
-        with self.conn.cursor() as cur:
+        with self._cursor() as cur:
             cur.execute("SELECT * FROM agents WHERE id = %s", (agent_id,))
             row = cur.fetchone()
             if row:
@@ -441,84 +1353,354 @@ class PostgresDB(Database):
             return None
     
     def list_agents(self) -> List[Dict]:
-        with self.conn.cursor() as cur:
+        with self._cursor() as cur:
             cur.execute("SELECT id, name, capabilities, status FROM agents")
             return [{"id": r[0], "name": r[1], "capabilities": r[2], "status": r[3]} for r in cur.fetchall()]
     
-    def create_task(self, agent_id: str, input_data: str) -> Dict:
+    def create_task(self, agent_id: str, input_data: str, priority: int = 0) -> Dict:
         import uuid
         task_id = f"task_{uuid.uuid4().hex[:8]}"
         
-        with self.conn.cursor() as cur:
+        with self._cursor() as cur:
             cur.execute("""
-                INSERT INTO tasks (id, agent_id, input)
-                VALUES (%s, %s, %s)
+                INSERT INTO tasks (id, agent_id, input, priority)
+                VALUES (%s, %s, %s, %s)
                 RETURNING *
-            """, (task_id, agent_id, input_data))
+            """, (task_id, agent_id, input_data, priority))
             
-            return {"id": task_id, "agent_id": agent_id, "input": input_data, "status": "pending"}
+            return {"id": task_id, "agent_id": agent_id, "input": input_data, "status": "pending",
+                    "priority": priority}
     
     def get_task(self, task_id: str) -> Optional[Dict]:
-        with self.conn.cursor() as cur:
-            cur.execute("SELECT * FROM tasks WHERE id = %s", (task_id,))
+        with self._cursor() as cur:
+            cur.execute(f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks WHERE id = %s", (task_id,))
+            row = cur.fetchone()
+            if row:
+                return dict(zip(TASK_COLUMNS, row))
+            cur.execute(f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks_archive WHERE id = %s", (task_id,))
             row = cur.fetchone()
             if row:
-                return {"id": row[0], "agent_id": row[1], "input": row[2], "output": row[3], "status": row[4]}
+                return _unpack_task(dict(zip(TASK_COLUMNS, row)))
             return None
     
-    def list_tasks(self, agent_id: str = None) -> List[Dict]:
-        with self.conn.cursor() as cur:
-            if agent_id:
-                cur.execute("SELECT * FROM tasks WHERE agent_id = %s ORDER BY created_at DESC", (agent_id,))
-            else:
-                cur.execute("SELECT * FROM tasks ORDER BY created_at DESC")
-            
-            return [{"id": r[0], "agent_id": r[1], "input": r[2], "output": r[3], "status": r[4]} for r in cur.fetchall()]
+    def list_tasks(self, agent_id: str = None, status: str = None, since: str = None, until: str = None,
+                   after: tuple = None, limit: int = None, fields: List[str] = None) -> List[Dict]:
+        columns = _select_columns(fields, TASK_COLUMNS, ("id", "created_at"))
+        where, params = [], []
+        if agent_id:
+            where.append("agent_id = %s")
+            params.append(agent_id)
+        if status:
+            where.append("status = %s")
+            params.append(status)
+        _keyset_where(where, params, "%s", "created_at", "id", since, until, after)
+        
+        sql = f"SELECT {', '.join(columns)} FROM {{table}}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+        
+        with self._cursor() as cur:
+            cur.execute(sql.format(table="tasks"), params)
+            rows = [dict(zip(columns, r)) for r in cur.fetchall()]
+            if status is None or status in ARCHIVED_STATUSES:
+                cur.execute(sql.format(table="tasks_archive"), params)
+                rows = _merge_tiers(rows, [dict(zip(columns, r)) for r in cur.fetchall()], limit)
+            return rows
     
     def complete_task(self, task_id: str, output: str, status: str = "completed"):
-        with self.conn.cursor() as cur:
+        with self._cursor() as cur:
             cur.execute("""
                 UPDATE tasks SET output = %s, status = %s, completed_at = NOW()
                 WHERE id = %s
             """, (output, status, task_id))
     
+    def create_tasks(self, specs: List[Tuple[str, str, int]]) -> List[Dict]:
+        """Create (agent_id, input_data, priority) tasks in one transaction"""
+        import uuid
+        tasks = [
+            {"id": f"task_{uuid.uuid4().hex[:8]}", "agent_id": agent_id, "input": input_data, "status": "pending",
+             "priority": priority}
+            for agent_id, input_data, priority in specs
+        ]
+        with self._cursor() as cur:
+            cur.execute("BEGIN")
+            try:
+                cur.executemany(
+                    "INSERT INTO tasks (id, agent_id, input, priority) VALUES (%s, %s, %s, %s)",
+                    [(t["id"], t["agent_id"], t["input"], t["priority"]) for t in tasks]
+                )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return tasks
+    
+    def complete_tasks(self, results: List[Tuple[str, str, str]]) -> int:
+        """Apply (task_id, output, status) results in one transaction"""
+        with self._cursor() as cur:
+            cur.execute("BEGIN")
+            try:
+                cur.executemany("""
+                    UPDATE tasks SET output = %s, status = %s, completed_at = NOW()
+                    WHERE id = %s
+                """, [(output, status, task_id) for task_id, output, status in results])
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return len(results)
+    
+    def upsert_tasks(self, tasks: List[Dict]) -> int:
+        """Insert or replace full task rows in one transaction"""
+        if not tasks:
+            return 0
+        with self._cursor() as cur:
+            cur.execute("BEGIN")
+            try:
+                # tasks.agent_id is a foreign key; agents that only ever lived
+                # in the in-memory store get a placeholder row
+                cur.executemany(
+                    "INSERT INTO agents (id, name) VALUES (%s, %s) ON CONFLICT (id) DO NOTHING",
+                    [(a, a) for a in {t["agent_id"] for t in tasks}]
+                )
+                cur.executemany("""
+                    INSERT INTO tasks
+                        (id, agent_id, input, output, status, priority, tenant, callback_url, created_at, completed_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (id) DO UPDATE SET output = EXCLUDED.output, status = EXCLUDED.status,
+                        completed_at = EXCLUDED.completed_at
+                """, [_task_row(t) for t in tasks])
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return len(tasks)
+    
+    def archive_tasks(self, before: str, limit: int = TASK_ARCHIVE_BATCH) -> int:
+        """Move up to `limit` completed/failed tasks finished before `before`
+        to tasks_archive; returns how many moved"""
+        from psycopg2.extras import execute_values
+        with self._cursor() as cur:
+            cur.execute("BEGIN")
+            try:
+                # SKIP LOCKED: never wait on (or block) a task being written
+                cur.execute(f"""
+                    SELECT {', '.join(TASK_COLUMNS)} FROM tasks
+                    WHERE status = ANY(%s) AND completed_at < %s
+                    LIMIT %s FOR UPDATE SKIP LOCKED
+                """, (list(ARCHIVED_STATUSES), before, limit))
+                rows = [dict(zip(TASK_COLUMNS, r)) for r in cur.fetchall()]
+                if rows:
+                    execute_values(cur, """
+                        INSERT INTO tasks_archive
+                            (id, agent_id, input, output, status, priority, tenant, callback_url, created_at,
+                             completed_at)
+                        VALUES %s
+                        ON CONFLICT (id) DO UPDATE SET input = EXCLUDED.input, output = EXCLUDED.output,
+                            status = EXCLUDED.status, completed_at = EXCLUDED.completed_at, archived_at = NOW()
+                    """, [
+                        (r["id"], r["agent_id"], _pack_text(r["input"]), _pack_text(r["output"]), r["status"],
+                         r["priority"], r["tenant"], r["callback_url"], r["created_at"], r["completed_at"])
+                        for r in rows
+                    ])
+                    cur.execute("DELETE FROM tasks WHERE id = ANY(%s)", ([r["id"] for r in rows],))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return len(rows)
+    
+    def write_batch(self, agents: List[Dict] = (), tasks: List[Dict] = (), deleted_tasks: List[str] = (),
+                    memories: List[Dict] = (), deleted_memories: List[Tuple[str, str]] = (),
+                    messages: List[Dict] = ()):
+        """Persist a write-behind batch (full rows, upserted) in one transaction"""
+        blobs = self._embeddings([(m["agent_id"], m["key"], m.get("value")) for m in memories], deleted_memories)
+        with self._cursor() as cur:
+            cur.execute("BEGIN")
+            try:
+                cur.executemany("""
+                    INSERT INTO agents (id, name, capabilities, status, config, api_key, created_at, last_active)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name, capabilities = EXCLUDED.capabilities,
+                        status = EXCLUDED.status, config = EXCLUDED.config, api_key = EXCLUDED.api_key,
+                        last_active = EXCLUDED.last_active
+                """, [
+                    (a["id"], a["name"], json.dumps(a.get("capabilities", [])), a.get("status"),
+                     json.dumps(a.get("config", {})), a.get("api_key"), a.get("created_at"), a.get("last_active"))
+                    for a in agents
+                ])
+                # Tasks may reference agents that were never flushed (placeholder rows)
+                cur.executemany(
+                    "INSERT INTO agents (id, name) VALUES (%s, %s) ON CONFLICT (id) DO NOTHING",
+                    [(a, a) for a in {t["agent_id"] for t in tasks} | {m["agent_id"] for m in memories}]
+                )
+                cur.executemany("""
+                    INSERT INTO tasks
+                        (id, agent_id, input, output, status, priority, tenant, callback_url, created_at, completed_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (id) DO UPDATE SET output = EXCLUDED.output, status = EXCLUDED.status,
+                        completed_at = EXCLUDED.completed_at
+                """, [_task_row(t) for t in tasks])
+                cur.executemany("DELETE FROM tasks WHERE id = %s", [(i,) for i in deleted_tasks])
+                cur.executemany("DELETE FROM tasks_archive WHERE id = %s", [(i,) for i in deleted_tasks])
+                cur.executemany("DELETE FROM memories WHERE agent_id = %s AND key = %s", list(deleted_memories))
+                cur.executemany(self._UPSERT_MEMORY_SQL, [
+                    (m["agent_id"], m["key"], m.get("value"), m.get("created_at"), blob)
+                    for m, blob in zip(memories, blobs)
+                ])
+                cur.executemany("""
+                    INSERT INTO messages (id, from_agent_id, to_agent_id, content, created_at)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (id) DO NOTHING
+                """, [
+                    (m["id"], m["from_agent_id"], m["to_agent_id"], m.get("content"), m.get("created_at"))
+                    for m in messages
+                ])
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        self._index_memories([(m["agent_id"], m["key"], b) for m, b in zip(memories, blobs)], deleted_memories)
+    
+    def load_state(self) -> Dict[str, List[Dict]]:
+        queries = {
+            "agents": "SELECT * FROM agents",
+            "tasks": f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks WHERE status NOT IN ('completed', 'failed') "
+                     "ORDER BY created_at, id",
+            "memories": f"SELECT {', '.join(MEMORY_COLUMNS)} FROM memories ORDER BY created_at, id",
+            "messages": "SELECT * FROM messages ORDER BY created_at, id"
+        }
+        state = {}
+        with self._cursor() as cur:
+            for name, sql in queries.items():
+                cur.execute(sql)
+                columns = [d[0] for d in cur.description]
+                state[name] = [dict(zip(columns, r)) for r in cur.fetchall()]
+        return state
+    
+    _UPSERT_MEMORY_SQL = """
+        INSERT INTO memories (agent_id, key, value, created_at, embedding) VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (agent_id, key) DO UPDATE
+        SET value = EXCLUDED.value, created_at = EXCLUDED.created_at, embedding = EXCLUDED.embedding
+    """
+    
     def store_memory(self, agent_id: str, key: str, value: str) -> Dict:
-        with self.conn.cursor() as cur:
-            # Delete existing
-            cur.execute("DELETE FROM memories WHERE agent_id = %s AND key = %s", (agent_id, key))
-            
-            cur.execute("""
-                INSERT INTO memories (agent_id, key, value)
-                VALUES (%s, %s, %s)
-                RETURNING *
-            """, (agent_id, key, value))
-            
-            return {"key": key, "value": value}
+        now = datetime.utcnow()
+        blob, = self._embeddings([(agent_id, key, value)])
+        with self._cursor() as cur:
+            cur.execute(self._UPSERT_MEMORY_SQL, (agent_id, key, value, now, blob))
+        self._index_memories([(agent_id, key, blob)])
+        return {"key": key, "value": value, "created_at": now.isoformat()}
     
-    def get_memories(self, agent_id: str) -> List[Dict]:
-        with self.conn.cursor() as cur:
-            cur.execute("SELECT * FROM memories WHERE agent_id = %s ORDER BY created_at DESC", (agent_id,))
-            return [{"id": r[0], "key": r[2], "value": r[3]} for r in cur.fetchall()]
+    def import_memories(self, agent_id: str, items: List[Tuple[str, str]]) -> int:
+        from psycopg2.extras import execute_values
+        now = datetime.utcnow()
+        items = list(items)
+        with self._cursor() as cur:
+            for start in range(0, len(items), MEMORY_IMPORT_CHUNK):
+                # One multi-row INSERT per chunk; it may not touch the same key twice
+                rows = {k: v for k, v in items[start:start + MEMORY_IMPORT_CHUNK]}
+                blobs = self._embeddings([(agent_id, k, v) for k, v in rows.items()])
+                execute_values(cur, """
+                    INSERT INTO memories (agent_id, key, value, created_at, embedding) VALUES %s
+                    ON CONFLICT (agent_id, key) DO UPDATE
+                    SET value = EXCLUDED.value, created_at = EXCLUDED.created_at, embedding = EXCLUDED.embedding
+                """, [(agent_id, k, v, now, blob) for (k, v), blob in zip(rows.items(), blobs)], page_size=len(rows))
+                self._index_memories([(agent_id, k, blob) for k, blob in zip(rows, blobs)])
+        return len(items)
     
-    def search_memories(self, agent_id: str, query: str) -> List[Dict]:
-        """Full-text search using PostgreSQL"""
-        if not query:
-            return self.get_memories(agent_id)
+    def get_memories(self, agent_id: str, since: str = None, until: str = None,
+                     after: tuple = None, limit: int = None, fields: List[str] = None) -> List[Dict]:
+        columns = _select_columns(fields, MEMORY_COLUMNS, ("id", "created_at"))
+        where, params = ["agent_id = %s"], [agent_id]
+        _keyset_where(where, params, "%s", "created_at", "id", since, until, after)
         
-        with self.conn.cursor() as cur:
+        sql = f"SELECT {', '.join(columns)} FROM memories WHERE {' AND '.join(where)} ORDER BY created_at DESC, id DESC"
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+        
+        with self._cursor() as cur:
+            cur.execute(sql, params)
+            return [dict(zip(columns, r)) for r in cur.fetchall()]
+    
+    def _keyword_search(self, agent_id: str, query: str, limit: int) -> List[Dict]:
+        """Ranked full-text search, topped up with trigram (fuzzy / substring) matches"""
+        terms = _tsquery(query or "")
+        if not terms:
+            return self.get_memories(agent_id, limit=limit)
+        
+        columns = ["id", "agent_id", "key", "value", "created_at", "snippet", "score"]
+        with self._cursor() as cur:
+            # Rank and limit first, so ts_headline only runs on the rows returned
             cur.execute("""
-                SELECT * FROM memories
-                WHERE agent_id = %s AND to_tsvector('english', key || ' ' || value) @@ plainto_tsquery('english', %s)
-                ORDER BY created_at DESC
-            """, (agent_id, query))
+                SELECT id, agent_id, key, value, created_at,
+                       ts_headline('english', coalesce(value, ''), q,
+                                   'StartSel=<mark>, StopSel=</mark>, MaxFragments=1, MaxWords=16, MinWords=4'),
+                       score
+                FROM (
+                    SELECT m.*, q, ts_rank_cd(m.search, q) AS score
+                    FROM memories m, to_tsquery('english', %s) q
+                    WHERE m.agent_id = %s AND m.search @@ q
+                    ORDER BY score DESC
+                    LIMIT %s
+                ) ranked
+                ORDER BY score DESC
+            """, (terms, agent_id, limit))
+            results = [dict(zip(columns, r)) for r in cur.fetchall()]
+            
+            if self.trigram and len(results) < limit:
+                pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                cur.execute("""
+                    SELECT id, agent_id, key, value, created_at, left(value, 200),
+                           greatest(word_similarity(%s, key), word_similarity(%s, coalesce(value, '')))
+                    FROM memories
+                    WHERE agent_id = %s AND NOT (id = ANY(%s))
+                      AND (%s <%% key OR %s <%% value OR key ILIKE %s OR value ILIKE %s)
+                    ORDER BY 7 DESC
+                    LIMIT %s
+                """, (query, query, agent_id, [r["id"] for r in results],
+                      query, query, pattern, pattern, limit - len(results)))
+                results += [dict(zip(columns, r)) for r in cur.fetchall()]
             
-            return [{"id": r[0], "key": r[2], "value": r[3]} for r in cur.fetchall()]
+            return results
+    
+    def _memories_by_keys(self, agent_id: str, keys: List[str]) -> List[Dict]:
+        if not keys:
+            return []
+        with self._cursor() as cur:
+            cur.execute(
+                f"SELECT {', '.join(MEMORY_COLUMNS)} FROM memories WHERE agent_id = %s AND key = ANY(%s)",
+                (agent_id, list(keys))
+            )
+            return [dict(zip(MEMORY_COLUMNS, r)) for r in cur.fetchall()]
+    
+    def _embedding_rows(self, agent_id: str) -> List[Tuple[str, str, Optional[bytes]]]:
+        with self._cursor() as cur:
+            cur.execute("SELECT key, value, embedding FROM memories WHERE agent_id = %s", (agent_id,))
+            return [(k, v, bytes(e) if e is not None else None) for k, v, e in cur.fetchall()]
+    
+    def _memory_fingerprint(self, agent_id: str) -> tuple:
+        with self._cursor() as cur:
+            cur.execute("SELECT count(*), max(created_at) FROM memories WHERE agent_id = %s", (agent_id,))
+            return tuple(cur.fetchone())
+    
+    def _store_embeddings(self, agent_id: str, items: List[Tuple[str, bytes]]):
+        with self._cursor() as cur:
+            cur.executemany(
+                "UPDATE memories SET embedding = %s WHERE agent_id = %s AND key = %s",
+                [(blob, agent_id, key) for key, blob in items]
+            )
     
     # ============ Shared Memory (Global) ============
     
     def shared_set(self, key: str, value: str) -> Dict:
         """Set a shared value (global, not per-agent)"""
-        with self.conn.cursor() as cur:
+        with self._cursor() as cur:
             cur.execute("""
                 INSERT INTO shared_memory (key, value, updated_at)
                 VALUES (%s, %s, NOW())
@@ -528,7 +1710,7 @@ class PostgresDB(Database):
     
     def shared_get(self, key: str) -> Optional[Dict]:
         """Get a shared value"""
-        with self.conn.cursor() as cur:
+        with self._cursor() as cur:
             cur.execute("SELECT * FROM shared_memory WHERE key = %s", (key,))
             row = cur.fetchone()
             if row:
@@ -537,37 +1719,59 @@ class PostgresDB(Database):
     
     def shared_incr(self, key: str, delta: int = 1) -> int:
         """Atomically increment a counter"""
-        with self.conn.cursor() as cur:
-            # Ensure key exists
+        with self._cursor() as cur:
             cur.execute("""
-                INSERT INTO shared_memory (key, counter, updated_at)
-                VALUES (%s, 0, NOW())
-                ON CONFLICT (key) DO NOTHING
-            """, (key,))
-            # Increment
+                INSERT INTO shared_memory (key, counter, updated_at) VALUES (%s, %s, NOW())
+                ON CONFLICT (key) DO UPDATE
+                SET counter = coalesce(shared_memory.counter, 0) + excluded.counter, updated_at = excluded.updated_at
+                RETURNING counter
+            """, (key, delta))
+            return cur.fetchone()[0]
+    
+    def shared_incr_many(self, deltas: Dict[str, int]) -> Dict[str, int]:
+        """Apply {key: delta} increments in one statement; returns the new counters"""
+        if not deltas:
+            return {}
+        keys = sorted(deltas)  # consistent lock order between concurrent batches
+        with self._cursor() as cur:
             cur.execute("""
-                UPDATE shared_memory SET counter = counter + %s, updated_at = NOW()
-                WHERE key = %s
-            """, (delta, key))
-            # Get new value
-            cur.execute("SELECT counter FROM shared_memory WHERE key = %s", (key,))
-            row = cur.fetchone()
-            return row[0] if row else 0
+                INSERT INTO shared_memory (key, counter, updated_at)
+                SELECT k, d, NOW() FROM unnest(%s::text[], %s::integer[]) AS t(k, d)
+                ON CONFLICT (key) DO UPDATE
+                SET counter = coalesce(shared_memory.counter, 0) + excluded.counter, updated_at = excluded.updated_at
+                RETURNING key, counter
+            """, (keys, [deltas[k] for k in keys]))
+            return dict(cur.fetchall())
     
     def shared_delete(self, key: str) -> bool:
         """Delete a shared key"""
-        with self.conn.cursor() as cur:
+        with self._cursor() as cur:
             cur.execute("DELETE FROM shared_memory WHERE key = %s", (key,))
         return True
     
-    def shared_list(self) -> List[Dict]:
-        """List all shared keys"""
-        with self.conn.cursor() as cur:
-            cur.execute("SELECT * FROM shared_memory ORDER BY updated_at DESC")
-            return [{"key": r[0], "value": r[1], "counter": r[3]} for r in cur.fetchall()]
+    def shared_list(self, since: str = None, until: str = None, after: tuple = None,
+                    limit: int = None, fields: List[str] = None) -> List[Dict]:
+        """List shared keys, most recently updated first"""
+        columns = _select_columns(fields, SHARED_COLUMNS, ("key", "updated_at"))
+        where, params = [], []
+        _keyset_where(where, params, "%s", "updated_at", "key", since, until, after, nullable=True)
+        
+        sql = f"SELECT {', '.join(columns)} FROM shared_memory"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY updated_at DESC NULLS LAST, key DESC"
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+        
+        with self._cursor() as cur:
+            cur.execute(sql, params)
+            return [dict(zip(columns, r)) for r in cur.fetchall()]
     
     def close(self):
-        self.conn.close()
+        if self.vectors:
+            self.vectors.close()
+        self.pool.closeall()
 
 
 def get_database(db_type: str = None) -> Database:
@@ -8,7 +8,7 @@ import sys
 import os
 sys.path.insert(0, '/home/openryanclaw/.openclaw/workspace')
 
-from botcloud.manager import BotCloudManager
+from botcloud.manager import BotCloudManager, PRIORITY_INTERACTIVE
 
 # Global manager instance
 _manager = None
@@ -67,7 +67,9 @@ def send_command(command: str, worker_name: str = None) -> str:
     m = get_manager()
     
     try:
-        result = m.submit_task(worker, command, wait_for_result=True, timeout=120)
+        # Commands typed by a user jump ahead of queued bulk work
+        result = m.submit_task(worker, command, wait_for_result=True, timeout=120,
+                               priority=PRIORITY_INTERACTIVE, tenant="interactive")
         
         if result.get('status') == 'completed':
             output = result.get('output', 'OK')
@@ -94,7 +96,8 @@ def send_command_any(command: str) -> str:
     m = get_manager()
     
     try:
-        result = m.submit_task_any(command, wait_for_result=True, timeout=120)
+        result = m.submit_task_any(command, wait_for_result=True, timeout=120,
+                                   priority=PRIORITY_INTERACTIVE, tenant="interactive")
         
         if result.get('status') == 'completed':
             return result.get('output', 'OK')
@@ -6,12 +6,14 @@ Manages BotCloud API and worker processes from OpenClaw
 
 import os
 import sys
+import atexit
+import json
 import subprocess
 import time
 import requests
 import signal
 import uuid
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple, Union
 from dataclasses import dataclass, field
 import threading
 
@@ -21,6 +23,14 @@ API_DIR = os.path.join(BOTCLOUD_DIR, "api")
 AGENT_DIR = os.path.join(BOTCLOUD_DIR, "agent")
 DEFAULT_API_URL = "http://localhost:8000"
 DEFAULT_POLL_INTERVAL = 2
+WORKER_RUNTIME = os.environ.get("BOTCLOUD_WORKER_RUNTIME", "thread")  # "async" runs async_worker.py
+FORK_SERVER = os.environ.get("BOTCLOUD_FORK_SERVER", "0") == "1"  # fork workers from a warm zygote.py
+ZYGOTE_PATH = os.path.join(BOTCLOUD_DIR, "zygote.py")
+
+# Suggested task priorities; the API takes any int, higher is claimed first
+PRIORITY_INTERACTIVE = 10
+PRIORITY_NORMAL = 0
+PRIORITY_BATCH = -10
 
 
 @dataclass
@@ -28,10 +38,11 @@ class BotCloudWorker:
     """Represents a BotCloud worker process"""
     name: str
     agent_id: Optional[str] = None
-    process: Optional[subprocess.Popen] = None
+    process: Optional[Union[subprocess.Popen, "ForkedWorker"]] = None
     api_key: Optional[str] = None
     capabilities: List[str] = field(default_factory=list)
     status: str = "stopped"
+    returncode: Optional[int] = None  # exit status once the process has exited on its own
 
 
 class Chain:
@@ -84,10 +95,9 @@ class Chain:
                 if step.get("parallel"):
                     # Parallel execution
                     workers = step.get("workers", [])
-                    task_results = []
-                    for w in workers:
-                        r = self.manager.submit_task(w, task, wait_for_result=True)
-                        task_results.append(r)
+                    task_results = self.manager.submit_tasks(
+                        [(w, task) for w in workers], wait_for_result=True
+                    )
                     results.append({"step": i, "type": "parallel", "results": task_results})
                     # Use last result as output
                     previous_output = task_results[-1].get("output")
@@ -110,6 +120,178 @@ class Chain:
         return results
 
 
+class CounterAggregator:
+    """
+    Coalesces shared-counter increments in process and sends them as one
+    POST /shared:incr-batch every `interval` seconds (and at exit).
+    
+    Usage:
+        counters = manager.counter_aggregator()
+        counters.incr("requests")    # no round trip
+        counters.flush()             # push now; returns the new counters
+    """
+    
+    def __init__(self, api_url: str = DEFAULT_API_URL, interval: float = 1.0):
+        self.api_url = api_url.rstrip('/')
+        self.interval = interval
+        self._pending: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def incr(self, key: str, delta: int = 1):
+        """Add to the pending delta for key"""
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + delta
+    
+    def flush(self) -> Dict[str, int]:
+        """Send pending deltas; on failure they are kept for the next flush"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return {}
+        try:
+            resp = requests.post(
+                f"{self.api_url}/shared:incr-batch",
+                json={"increments": [{"key": k, "delta": d} for k, d in pending.items()]},
+                timeout=10
+            )
+            resp.raise_for_status()
+        except requests.RequestException:
+            with self._lock:
+                for key, delta in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + delta
+            raise
+        return resp.json().get("counters", {})
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except requests.RequestException as e:
+                print(f"Counter flush failed: {e}")
+    
+    def close(self):
+        """Stop the background flusher and send what is left"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        try:
+            self.flush()
+        except requests.RequestException as e:
+            print(f"Counter flush failed: {e}")
+
+
+class ForkedWorker:
+    """Popen-like handle for a worker forked by the fork server (which reaps
+    it and reports its exit status)"""
+    
+    def __init__(self, pid: int, server: "ForkServer" = None):
+        self.pid = pid
+        self.server = server
+        self.returncode: Optional[int] = None
+    
+    def poll(self) -> Optional[int]:
+        if self.returncode is None:
+            try:
+                self.returncode = self.server.poll(self.pid)
+                if self.returncode is None and self._gone():
+                    # reaped between the two checks, or its status was evicted
+                    self.returncode = self.server.poll(self.pid)
+                    if self.returncode is None:
+                        self.returncode = 0
+            except (AttributeError, OSError, RuntimeError, ValueError):
+                # The fork server is gone and its workers were re-parented:
+                # whether this one has exited is still visible, its status is not
+                if self._gone():
+                    self.returncode = 0
+        return self.returncode
+    
+    def _gone(self) -> bool:
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass  # the pid was reused by another user's process
+        return False
+    
+    def terminate(self):
+        try:
+            os.kill(self.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+class ForkServer:
+    """
+    Keeps one warm zygote.py process that has already imported the worker
+    runtime and forks a worker per request, so spawning takes milliseconds
+    instead of a fresh interpreter.
+    
+    Usage:
+        server = ForkServer()
+        handle = server.spawn(worker_py, env)    # ForkedWorker
+        server.close()                           # forked workers keep running
+    """
+    
+    def __init__(self):
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """Start the zygote and wait until its imports are done"""
+        with self._lock:
+            self._start()
+    
+    def _start(self):
+        if self._process and self._process.poll() is None:
+            return
+        self._process = subprocess.Popen(
+            [sys.executable, ZYGOTE_PATH],
+            cwd=BOTCLOUD_DIR,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            preexec_fn=os.setsid
+        )
+        if "ready" not in json.loads(self._process.stdout.readline() or "{}"):
+            raise RuntimeError("Fork server failed to start")
+    
+    def spawn(self, script: str, env: Dict[str, str]) -> ForkedWorker:
+        """Fork a worker running `script` with exactly `env` as its environment"""
+        with self._lock:
+            self._start()
+            self._process.stdin.write(json.dumps({"script": script, "env": env}) + "\n")
+            self._process.stdin.flush()
+            reply = json.loads(self._process.stdout.readline() or "{}")
+        if "pid" not in reply:
+            raise RuntimeError(f"Fork failed: {reply.get('error', 'fork server exited')}")
+        return ForkedWorker(reply["pid"], self)
+    
+    def poll(self, pid: int) -> Optional[int]:
+        """Exit status of a forked worker, or None while it runs"""
+        with self._lock:
+            if not self._process or self._process.poll() is not None:
+                raise RuntimeError("fork server is not running")
+            self._process.stdin.write(json.dumps({"poll": pid}) + "\n")
+            self._process.stdin.flush()
+            reply = json.loads(self._process.stdout.readline() or "{}")
+        if reply.get("pid") != pid:
+            raise RuntimeError("fork server exited")
+        return reply["returncode"]
+    
+    def close(self):
+        """Stop the zygote (workers it forked are not affected)"""
+        with self._lock:
+            if self._process:
+                self._process.stdin.close()
+                self._process.wait(timeout=5)
+                self._process = None
+
+
 class BotCloudManager:
     """
     Manages BotCloud API and worker processes for OpenClaw.
@@ -125,14 +307,17 @@ class BotCloudManager:
     def __init__(
         self,
         api_url: str = DEFAULT_API_URL,
-        workspace: str = None
+        workspace: str = None,
+        fork_server: bool = FORK_SERVER
     ):
         self.api_url = api_url.rstrip('/')
         self.workspace = workspace or os.path.join(os.path.expanduser("~"), "botcloud", "workspace")
         self.api_process: Optional[subprocess.Popen] = None
+        self.fork_server: Optional[ForkServer] = ForkServer() if fork_server and sys.platform != 'win32' else None
         self.workers: Dict[str, BotCloudWorker] = {}
         self._running = False
         self._lock = threading.Lock()
+        self._counters: Optional[CounterAggregator] = None
         
     def start_api(self, port: int = 8000) -> bool:
         """Start the BotCloud API server"""
@@ -221,6 +406,7 @@ class BotCloudManager:
     
     def start_worker(self, worker: BotCloudWorker, openclaw_url: str = None) -> bool:
         """Start a worker process"""
+        self._check_exited(worker)
         if worker.process:
             return True
         
@@ -234,19 +420,27 @@ class BotCloudManager:
         if openclaw_url:
             worker_env["OPENCLAW_URL"] = openclaw_url
         
-        worker.process = subprocess.Popen(
-            [sys.executable, self.worker_py_path()],
-            env=worker_env,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            preexec_fn=os.setsid if sys.platform != 'win32' else None
-        )
+        if self.fork_server:
+            try:
+                worker.process = self.fork_server.spawn(self.worker_py_path(), worker_env)
+            except (OSError, RuntimeError, ValueError) as e:
+                print(f"Fork server unavailable ({e}), starting a new process")
+        if not worker.process:
+            worker.process = subprocess.Popen(
+                [sys.executable, self.worker_py_path()],
+                env=worker_env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                preexec_fn=os.setsid if sys.platform != 'win32' else None
+            )
         worker.status = "running"
         print(f"✓ Started worker process: {worker.name}")
         return True
     
     def worker_py_path(self) -> str:
-        """Get path to worker.py"""
+        """Get path to worker.py (async_worker.py when BOTCLOUD_WORKER_RUNTIME=async)"""
+        if WORKER_RUNTIME == "async":
+            return os.path.join(BOTCLOUD_DIR, "async_worker.py")
         return os.path.join(BOTCLOUD_DIR, "worker.py")
     
     def spawn_workers(
@@ -288,16 +482,20 @@ class BotCloudManager:
         task_input: str,
         wait_for_result: bool = True,
         timeout: int = 60,
-        callback_url: str = None
+        callback_url: str = None,
+        priority: int = PRIORITY_NORMAL,
+        tenant: str = None
     ) -> Dict[str, Any]:
         """Submit a task to a worker"""
         worker = self.workers.get(worker_name)
         if not worker or not worker.agent_id:
             raise ValueError(f"Worker {worker_name} not found")
         
-        payload = {"input_data": task_input}
+        payload = {"input_data": task_input, "priority": priority}
         if callback_url:
             payload["callback_url"] = callback_url
+        if tenant:
+            payload["tenant"] = tenant
         
         resp = requests.post(
             f"{self.api_url}/agents/{worker.agent_id}/tasks",
@@ -315,12 +513,55 @@ class BotCloudManager:
         
         return task_data
     
+    def submit_tasks(
+        self,
+        assignments: List[Tuple[str, str]],
+        wait_for_result: bool = True,
+        timeout: int = 60,
+        callback_url: str = None,
+        priority: int = PRIORITY_NORMAL,
+        tenant: str = None
+    ) -> List[Dict[str, Any]]:
+        """Submit (worker_name, task_input) pairs in a single batch request"""
+        if not assignments:
+            return []
+        
+        tasks = []
+        for worker_name, task_input in assignments:
+            worker = self.workers.get(worker_name)
+            if not worker or not worker.agent_id:
+                raise ValueError(f"Worker {worker_name} not found")
+            spec = {"agent_id": worker.agent_id, "input_data": task_input, "priority": priority}
+            if callback_url:
+                spec["callback_url"] = callback_url
+            if tenant:
+                spec["tenant"] = tenant
+            tasks.append(spec)
+        
+        api_key = self.workers[assignments[0][0]].api_key
+        resp = requests.post(
+            f"{self.api_url}/tasks:batch",
+            headers={"X-API-Key": api_key},
+            json={"tasks": tasks}
+        )
+        resp.raise_for_status()
+        created = resp.json()["tasks"]
+        
+        print(f"✓ Submitted {len(created)} tasks in one batch")
+        
+        if wait_for_result:
+            return self._wait_for_results([t["id"] for t in created], timeout)
+        
+        return created
+    
     def submit_task_any(
         self,
         task_input: str,
         wait_for_result: bool = True,
         timeout: int = 60,
-        callback_url: str = None
+        callback_url: str = None,
+        priority: int = PRIORITY_NORMAL,
+        tenant: str = None
     ) -> Dict[str, Any]:
         """Submit a task to any available worker (round-robin)"""
         if not self.workers:
@@ -337,7 +578,7 @@ class BotCloudManager:
             self.workers[worker_name].last_task_time = 0
         self.workers[worker_name].last_task_time = time.time()
         
-        return self.submit_task(worker_name, task_input, wait_for_result, timeout, callback_url)
+        return self.submit_task(worker_name, task_input, wait_for_result, timeout, callback_url, priority, tenant)
     
     def _wait_for_result(self, task_id: str, timeout: int) -> Dict[str, Any]:
         """Wait for task completion"""
@@ -358,13 +599,48 @@ class BotCloudManager:
         
         return {"id": task_id, "status": "timeout", "output": None}
     
+    def _wait_for_results(self, task_ids: List[str], timeout: int) -> List[Dict[str, Any]]:
+        """Wait for several tasks, sharing one deadline; results keep task_ids order"""
+        results: Dict[str, Dict[str, Any]] = {}
+        deadline = time.time() + timeout
+        
+        while len(results) < len(task_ids) and time.time() < deadline:
+            for task_id in task_ids:
+                if task_id in results:
+                    continue
+                try:
+                    resp = requests.get(f"{self.api_url}/tasks/{task_id}", timeout=5)
+                    if resp.status_code == 200 and resp.json()["status"] in ("completed", "failed"):
+                        results[task_id] = resp.json()
+                except:
+                    pass
+            if len(results) < len(task_ids):
+                time.sleep(0.5)
+        
+        return [
+            results.get(task_id, {"id": task_id, "status": "timeout", "output": None})
+            for task_id in task_ids
+        ]
+    
+    def _check_exited(self, worker: BotCloudWorker) -> bool:
+        """Notice a worker process that has exited on its own; True if it has"""
+        if not worker.process or worker.process.poll() is None:
+            return False
+        worker.returncode = worker.process.returncode
+        worker.process = None
+        worker.status = "exited"
+        print(f"✗ Worker {worker.name} exited with status {worker.returncode}")
+        return True
+    
     def get_worker_status(self) -> Dict[str, Dict]:
         """Get status of all workers"""
         status = {}
-        for name, worker in self.workers.items():
+        for name, worker in list(self.workers.items()):
+            self._check_exited(worker)
             status[name] = {
                 "agent_id": worker.agent_id,
                 "status": worker.status,
+                "returncode": worker.returncode,
                 "capabilities": worker.capabilities
             }
         return status
@@ -372,7 +648,7 @@ class BotCloudManager:
     def stop_worker(self, name: str):
         """Stop a specific worker"""
         worker = self.workers.get(name)
-        if worker and worker.process:
+        if worker and not self._check_exited(worker) and worker.process:
             try:
                 os.killpg(os.getpgid(worker.process.pid), signal.SIGTERM)
             except:
@@ -385,6 +661,8 @@ class BotCloudManager:
         """Stop all workers and API"""
         for name in list(self.workers.keys()):
             self.stop_worker(name)
+        if self.fork_server:
+            self.fork_server.close()
         self.stop_api()
         print("✓ All BotCloud resources stopped")
     
@@ -396,12 +674,13 @@ class BotCloudManager:
         except:
             health = {"status": "unavailable"}
         
+        workers = self.get_worker_status()
         return {
             "api_url": self.api_url,
             "api_status": health.get("status", "unknown"),
             "total_workers": len(self.workers),
             "running_workers": sum(1 for w in self.workers.values() if w.status == "running"),
-            "workers": self.get_worker_status()
+            "workers": workers
         }
     
     # ============ Ephemeral / Pooled Workers ============
@@ -429,21 +708,21 @@ class BotCloudManager:
     def run_parallel(self, tasks: List[str], timeout: int = 60) -> List[Dict[str, Any]]:
         """
         Run multiple tasks in parallel with separate workers.
-        Spawns a worker per task, kills them after.
+        Spawns a worker per task, submits all tasks in one batch, kills them after.
+        Results are returned in the order of `tasks`.
         """
-        import concurrent.futures
-        
-        results = []
-        
-        def run_one(task):
-            return self.run_ephemeral(task, timeout)
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(tasks)) as executor:
-            futures = {executor.submit(run_one, task): task for task in tasks}
-            for future in concurrent.futures.as_completed(futures):
-                results.append(future.result())
-        
-        return results
+        names = []
+        try:
+            for _ in tasks:
+                name = f"ephemeral-{uuid.uuid4().hex[:6]}"
+                worker = self.register_worker(name, ["general"], "ephemeral")
+                self.start_worker(worker)
+                names.append(name)
+            
+            return self.submit_tasks(list(zip(names, tasks)), wait_for_result=True, timeout=timeout)
+        finally:
+            for name in names:
+                self.stop_worker(name)
     
     # ============ Shared Memory ============
     
@@ -467,6 +746,22 @@ class BotCloudManager:
         resp.raise_for_status()
         return resp.json().get("counter", 0)
     
+    def shared_incr_batch(self, deltas: Dict[str, int]) -> Dict[str, int]:
+        """Apply many counter increments in one transaction"""
+        resp = requests.post(
+            f"{self.api_url}/shared:incr-batch",
+            json={"increments": [{"key": k, "delta": d} for k, d in deltas.items()]}
+        )
+        resp.raise_for_status()
+        return resp.json().get("counters", {})
+    
+    def counter_aggregator(self, interval: float = 1.0) -> CounterAggregator:
+        """Shared buffered counters for high-frequency increments (see CounterAggregator)"""
+        with self._lock:
+            if self._counters is None:
+                self._counters = CounterAggregator(self.api_url, interval)
+            return self._counters
+    
     def shared_delete(self, key: str):
         """Delete a shared key"""
         resp = requests.delete(f"{self.api_url}/shared/{key}")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+SQLite write throughput: per-write commits vs group commit.
+
+Usage: python3 tests/bench_sqlite_writes.py [threads] [writes_per_thread]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import SQLiteDB
+
+
+def run(threads: int, writes: int, **options) -> float:
+    """Each thread creates then completes `writes` tasks; returns writes/sec"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SQLiteDB(os.path.join(tmp, "bench.db"), **options)
+        agent = db.create_agent("bench", [], "bench_key")
+
+        def worker():
+            for i in range(writes):
+                task = db.create_task(agent["id"], f"task {i}")
+                db.complete_task(task["id"], "ok")
+
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - start
+        db.close()
+    return threads * writes * 2 / elapsed
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    writes = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    print(f"{threads} threads x {writes * 2} writes")
+    for synchronous in ("NORMAL", "FULL"):
+        base = run(threads, writes, synchronous=synchronous, group_commit=False)
+        grouped = run(threads, writes, synchronous=synchronous, group_commit=True)
+        print(f"synchronous={synchronous:<6}  per-write: {base:8.0f}/s  "
+              f"group commit: {grouped:8.0f}/s  ({grouped / base:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Worker cold start: `import worker` time (python -X importtime) and time to
+first task, checked against a budget so regressions show up; then spawn to
+ready for a new process vs. a fork from the manager's fork server.
+
+Usage: python3 tests/bench_worker_startup.py [import_budget_ms] [runs]
+"""
+
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BOTCLOUD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+FIRST_TASK = "import worker; worker.process_single_task('exec true')"
+# What a new worker does before its first claim, then a marker file
+PROBE = """import sys, worker
+worker.api_session()
+worker.process_single_task('exec true')
+open(sys.argv[1] if len(sys.argv) > 1 else worker.WORKSPACE + "/ready", "w").close()
+"""
+
+
+def python(code: str, *flags: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, BOTCLOUD_WORKSPACE=tempfile.gettempdir())
+    return subprocess.run([sys.executable, *flags, "-c", code], cwd=BOTCLOUD_DIR, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def import_times() -> dict:
+    """module -> (self_us, cumulative_us) for one `import worker`"""
+    times = {}
+    for line in python("import worker", "-X", "importtime").stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)", line)
+        if match:
+            times[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return times
+
+
+def wall_ms(code: str) -> float:
+    start = time.perf_counter()
+    python(code)
+    return (time.perf_counter() - start) * 1000
+
+
+def spawn_ms(spawn, marker: str) -> float:
+    """Time from spawn() until the probe has run its first task"""
+    start = time.perf_counter()
+    spawn()
+    while not os.path.exists(marker):
+        time.sleep(0.0005)
+    elapsed = (time.perf_counter() - start) * 1000
+    os.remove(marker)
+    return elapsed
+
+
+def spawn_times(runs: int):
+    """Median spawn-to-ready (ms) for subprocess.Popen and ForkServer.spawn"""
+    sys.path.insert(0, BOTCLOUD_DIR)
+    from manager import ForkServer
+
+    with tempfile.TemporaryDirectory() as tmp:
+        probe, marker = os.path.join(tmp, "probe.py"), os.path.join(tmp, "ready")
+        with open(probe, "w") as f:
+            f.write(PROBE)
+        env = dict(os.environ, BOTCLOUD_WORKSPACE=tmp, PYTHONPATH=BOTCLOUD_DIR)
+        popen = statistics.median(
+            spawn_ms(lambda: subprocess.Popen([sys.executable, probe], env=env), marker) for _ in range(runs)
+        )
+        server = ForkServer()
+        server.start()
+        try:
+            forked = statistics.median(spawn_ms(lambda: server.spawn(probe, env), marker) for _ in range(runs))
+        finally:
+            server.close()
+    return popen, forked
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else float(os.environ.get("BOTCLOUD_IMPORT_BUDGET_MS", "50"))
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    samples = [import_times() for _ in range(runs)]
+    import_ms = statistics.median(s["worker"][1] for s in samples) / 1000
+    slowest = sorted(samples[-1].items(), key=lambda item: item[1][0], reverse=True)[:5]
+    interpreter = statistics.median(wall_ms("pass") for _ in range(runs))
+    first_task = statistics.median(wall_ms(FIRST_TASK) for _ in range(runs))
+
+    print(f"import worker:      {import_ms:7.1f} ms  (budget {budget:.0f} ms, median of {runs})")
+    print(f"time to first task: {first_task - interpreter:7.1f} ms  (+{interpreter:.1f} ms interpreter start)")
+    print("slowest modules (self time):")
+    for module, (self_us, _) in slowest:
+        print(f"  {self_us / 1000:6.1f} ms  {module}")
+
+    popen, forked = spawn_times(runs)
+    print(f"spawn to first task: new process {popen:7.1f} ms, fork server {forked:6.1f} ms")
+
+    if import_ms > budget:
+        print(f"FAIL: import worker is over budget by {import_ms - budget:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Shared pytest fixtures. The files in this directory that are not test_*.py
+modules collected by pytest (test_runner.py, *.sh, bench_*.py) run against a
+live server instead.
+"""
+
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "api")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+collect_ignore = ["test_runner.py"]  # a script for a running server, not a pytest module
+
+
+@pytest.fixture(scope="module")
+def main(tmp_path_factory):
+    """api/main.py imported afresh, with its database under a temp HOME"""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("HOME", str(tmp_path_factory.mktemp("home")))
+        for name in ("main", "database", "vectors"):
+            sys.modules.pop(name, None)
+        module = importlib.import_module("main")
+        yield module
+        if module._db is not None:
+            module._db.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A fresh SQLite database"""
+    import database
+    db = database.SQLiteDB(str(tmp_path / "botcloud.db"))
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def store(main, db):
+    """An empty BotStore writing behind to `db` (flush() by hand)"""
+    return main.BotStore(archive=lambda: db)
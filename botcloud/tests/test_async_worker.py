@@ -0,0 +1,30 @@
+"""
+async_worker.py command dispatch: native asyncio tools first, then the
+tools/ registry on the executor, shell for anything else.
+
+Run: python -m pytest -q tests/test_async_worker.py
+"""
+
+import asyncio
+
+import async_worker
+import tools
+
+
+def run(task_input):
+    return asyncio.run(async_worker.process_single_task(task_input))
+
+
+def test_registry_commands_run_their_handler(monkeypatch):
+    calls = []
+    monkeypatch.setitem(tools.COMMANDS, "probe", "calc:calculate")
+    monkeypatch.setattr("tools.calc.calculate", lambda arg: calls.append(arg) or "ok", raising=False)
+    assert run("probe 1+1") == "ok"
+    assert run("math 2+3") == "ok"
+    assert calls == ["1+1", "2+3"]
+
+
+def test_fallbacks():
+    assert run("help") == tools.HELP
+    assert run("info").startswith("Worker:")
+    assert run("echo dispatched").strip() == "dispatched"
@@ -0,0 +1,303 @@
+"""
+database.py: group commit, full-text search, memory upserts and imports
+(with the NDJSON import endpoint), migrations and the hot/cold task tiers on
+SQLite; the Postgres search queries against a fake cursor.
+
+Run: python -m pytest -q tests/test_database.py
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "botcloud.db")
+
+
+def test_group_commit_is_durable_and_isolates_failures(path):
+    db = database.SQLiteDB(path, group_commit=True, commit_window_ms=20)
+    errors = []
+
+    def writer(i):
+        try:
+            if i % 5 == 4:
+                def half_done(conn):
+                    conn.execute("INSERT INTO shared_memory (key, value) VALUES (?, 'partial')", (f"bad{i}",))
+                    raise ValueError(i)
+                db._write(half_done)
+            else:
+                db.shared_set(f"good{i}", str(i))
+        except ValueError as e:
+            errors.append(e.args[0])
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    db.close()
+
+    assert sorted(errors) == [4, 9, 14, 19]  # only the failing writes fail
+    db = database.SQLiteDB(path, group_commit=False)
+    keys = {row["key"] for row in db.shared_list()}
+    assert keys == {f"good{i}" for i in range(20) if i % 5 != 4}  # committed; failed ones rolled back
+    db.close()
+
+
+def search(db, agent_id, query):
+    return [(r["key"], r["snippet"]) for r in db._keyword_search(agent_id, query, 10)]
+
+
+def test_fts_follows_updates_and_deletes(path):
+    db = database.SQLiteDB(path, group_commit=False)
+    db.store_memory("agent_a", "note", "the quick brown fox")
+    db.store_memory("agent_b", "note", "a quick reply")
+    assert search(db, "agent_a", "quick") == [("note", "the <mark>quick</mark> brown fox")]
+
+    db.store_memory("agent_a", "note", "a lazy dog")  # upsert: the old text leaves the index
+    assert search(db, "agent_a", "quick") == []
+    assert search(db, "agent_a", "laz*") == [("note", "a <mark>lazy</mark> dog")]
+
+    db.write_batch(deleted_memories=[("agent_a", "note")])
+    assert search(db, "agent_a", "lazy") == []
+    assert search(db, "agent_b", "quick") == [("note", "a <mark>quick</mark> reply")]  # other agents untouched
+    db.close()
+
+
+def test_fts_ranks_by_bm25_with_key_boost(path):
+    db = database.SQLiteDB(path, group_commit=False)
+    db.import_memories("agent_a", [
+        ("deploy", "steps for the release"),  # the word only in the key (weighted double)
+        ("checklist", "deploy deploy deploy, then verify the deploy"),
+        ("once", "we deploy on fridays, along with many other unrelated chores and meetings"),
+        ("unrelated", "lunch menu"),
+    ])
+    rows = db._keyword_search("agent_a", "deploy", 10)
+    assert [r["key"] for r in rows] == ["checklist", "deploy", "once"]
+    assert rows[0]["score"] > rows[1]["score"] > rows[2]["score"] > 0
+    db.close()
+
+
+def test_memory_upsert_keeps_one_row_per_key(path):
+    db = database.SQLiteDB(path, group_commit=False)
+    db.store_memory("agent_a", "k", "first")
+    db.store_memory("agent_a", "k", "second")
+    db.store_memory("agent_b", "k", "other agent")
+    db.import_memories("agent_a", [("k", "third"), ("j", "1"), ("j", "2")])
+    rows = {(r["agent_id"], r["key"]): r["value"] for r in db.conn.execute("SELECT * FROM memories")}
+    assert rows == {("agent_a", "k"): "third", ("agent_a", "j"): "2", ("agent_b", "k"): "other agent"}
+    db.close()
+
+
+def test_ndjson_import_stops_at_a_malformed_line(main, monkeypatch):
+    monkeypatch.setattr(main, "MEMORY_IMPORT_CHUNK", 2)
+    lines = ['{"key": "a", "value": 1}', '{"key": "b", "value": "x"}', "", '{"key": "a", "value": "again"}',
+             '{"key": "c", "value": null}', '{"key": "d"}', '{"value": "no key"}', '{"key": "e"}']
+    with TestClient(main.app) as client:
+        resp = client.post("/db/memory/agent_nd:import", content="\n".join(lines))
+        assert resp.status_code == 400
+        assert resp.json()["detail"] == "line 7: expected a JSON object with a key (imported 4 before it)"
+        stored = {m["key"]: m["value"] for m in client.get("/db/memory/agent_nd").json()["memories"]}
+        assert stored == {"a": "again", "b": "x", "c": ""}  # whole chunks before the bad line
+
+        resp = client.post("/db/memory/agent_nd:import", content="\n".join(lines[:6]) + "\n")
+        assert resp.json() == {"imported": 5}
+
+
+# The schema databases had before migrations were versioned
+UNVERSIONED_SCHEMA = """
+    CREATE TABLE agents (id TEXT PRIMARY KEY, name TEXT NOT NULL, capabilities TEXT, status TEXT DEFAULT 'stopped',
+                         config TEXT, api_key TEXT, created_at TEXT, last_active TEXT);
+    CREATE TABLE tasks (id TEXT PRIMARY KEY, agent_id TEXT NOT NULL, input TEXT, output TEXT,
+                        status TEXT DEFAULT 'pending', created_at TEXT, completed_at TEXT);
+    CREATE TABLE memories (id INTEGER PRIMARY KEY AUTOINCREMENT, agent_id TEXT NOT NULL, key TEXT NOT NULL,
+                           value TEXT, created_at TEXT);
+    CREATE TABLE shared_memory (key TEXT PRIMARY KEY, value TEXT, updated_at TEXT, counter INTEGER DEFAULT 0);
+    CREATE TABLE messages (id TEXT PRIMARY KEY, from_agent_id TEXT, to_agent_id TEXT, content TEXT, created_at TEXT);
+    CREATE VIRTUAL TABLE memories_fts USING fts5(agent_id, key, value, content='memories', content_rowid='id');
+    INSERT INTO tasks (id, agent_id, input, status, created_at)
+        VALUES ('task_old', 'agent_a', 'echo', 'pending', '2024-01-01');
+    INSERT INTO memories (agent_id, key, value, created_at) VALUES ('agent_a', 'k', 'stale', '2024-01-01');
+    INSERT INTO memories (agent_id, key, value, created_at) VALUES ('agent_a', 'k', 'latest words', '2024-01-02');
+"""
+
+
+def applied(db):
+    return [r[0] for r in db.conn.execute("SELECT version FROM schema_version ORDER BY version")]
+
+
+@pytest.mark.parametrize("existing", [False, True])
+def test_migrations_apply_once(path, capsys, existing):
+    if existing:
+        conn = database.sqlite3.connect(path)
+        conn.executescript(UNVERSIONED_SCHEMA)
+        conn.close()
+    latest = [version for version, _, _ in database.SQLITE_MIGRATIONS]
+
+    db = database.SQLiteDB(path, group_commit=False)
+    assert applied(db) == latest
+    assert capsys.readouterr().out.count("Applying schema migration") == len(latest)
+    if existing:
+        task = db.get_task("task_old")
+        assert (task["input"], task["priority"], task["tenant"]) == ("echo", 0, "default")
+        assert [(r["key"], r["value"]) for r in db.get_memories("agent_a")] == [("k", "latest words")]
+        assert [r["key"] for r in db._keyword_search("agent_a", "words", 5)] == ["k"]  # FTS rebuilt
+    db.close()
+
+    db = database.SQLiteDB(path, group_commit=False)
+    assert applied(db) == latest
+    assert "Applying schema migration" not in capsys.readouterr().out
+    db.close()
+
+
+def test_archive_moves_terminal_tasks_compressed(path):
+    db = database.SQLiteDB(path, group_commit=False)
+    tasks = db.create_tasks([("agent_a", f"input {i}", 0) for i in range(6)])
+    ids = [t["id"] for t in tasks]
+    db.complete_tasks([(ids[0], "out 0", "completed"), (ids[1], "out 1", "failed"),
+                       (ids[2], "out 2", "completed"), (ids[3], "x" * 1000, "completed")])
+    assert db.archive_tasks("2000-01-01") == 0  # none finished that long ago
+    future = "9999-01-01"
+    assert [db.archive_tasks(future, limit=3) for _ in range(3)] == [3, 1, 0]
+
+    raw = dict(db.conn.execute("SELECT id, output FROM tasks_archive").fetchall())
+    assert sorted(raw) == sorted(ids[:4])
+    assert database.zlib.decompress(raw[ids[3]]) == b"x" * 1000
+    assert len(raw[ids[3]]) < 100
+    assert db.get_task(ids[3])["output"] == "x" * 1000
+    assert db.get_task(ids[1])["status"] == "failed"
+
+    newest_first = [t["id"] for t in sorted(tasks, key=lambda t: (t["created_at"], t["id"]), reverse=True)]
+    assert [r["id"] for r in db.list_tasks("agent_a")] == newest_first
+    assert [r["id"] for r in db.list_tasks("agent_a", status="failed")] == [ids[1]]
+    assert sorted(r["id"] for r in db.list_tasks("agent_a", status="pending")) == sorted(ids[4:])
+
+    db.upsert_tasks([dict(db.get_task(ids[0]), status="pending")])  # written back to the hot tier
+    listed = [r["id"] for r in db.list_tasks("agent_a")]
+    assert sorted(listed) == sorted(ids)  # listed once, from the hot tier
+    assert db.get_task(ids[0])["status"] == "pending"
+    db.close()
+
+
+def test_aio_runs_off_the_event_loop_with_its_own_connection(path):
+    db = database.SQLiteDB(path, group_commit=False)
+    db.shared_set("k", "v")
+    main_conn = db.conn
+
+    def slow_get(key):
+        time.sleep(0.2)
+        return db.conn, db.shared_get(key)
+
+    db.slow_get = slow_get  # db.aio looks methods up on the instance
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        tick = asyncio.ensure_future(ticker())
+        results = await asyncio.gather(*(db.aio.slow_get("k") for _ in range(4)))
+        tick.cancel()
+        return ticks, results
+
+    started = time.monotonic()
+    ticks, results = asyncio.run(run())
+    assert time.monotonic() - started < 0.6  # the four calls overlapped
+    assert ticks >= 10  # and the loop kept running meanwhile
+    assert all(conn is not main_conn and row["value"] == "v" for conn, row in results)
+    db.close()
+
+
+def test_search_queries_are_sanitised():
+    query = 'deploy* "prod" OR -x; DROP'
+    assert database._fts_query(query) == '"deploy"* "prod" "OR" "x" "DROP"'
+    assert database._tsquery(query) == "deploy:* & prod & OR & x & DROP"
+    assert database._fts_query("!!") is None and database._tsquery("") is None
+
+
+class FakeCursor:
+    """Records statements and answers each with the next canned result"""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=()):
+        self.executed.append((" ".join(sql.split()), params))
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+
+class FakePool:
+    def __init__(self, cursor):
+        self.conn = type("Conn", (), {"closed": 0, "autocommit": False, "cursor": lambda conn: cursor})()
+
+    def getconn(self):
+        return self.conn
+
+    def putconn(self, conn, close=False):
+        pass
+
+
+def test_pg_search_tops_up_with_trigram_matches():
+    ranked = [(1, "agent_a", "deploy", "ship it", "2024-01-01", "<mark>deploy</mark>", 0.5)]
+    fuzzy = [(2, "agent_a", "deployment_100%", "", "2024-01-02", "", 0.3)]
+    cur = FakeCursor([ranked, fuzzy])
+    db = database.PostgresDB.__new__(database.PostgresDB)
+    db.pool, db._slots, db.trigram = FakePool(cur), threading.BoundedSemaphore(1), True
+
+    rows = db._keyword_search("agent_a", "deploy_100%", 5)
+    assert [(r["key"], r["score"]) for r in rows] == [("deploy", 0.5), ("deployment_100%", 0.3)]
+    (ranked_sql, ranked_params), (fuzzy_sql, fuzzy_params) = cur.executed
+    assert "to_tsquery('english', %s)" in ranked_sql and ranked_params == ("deploy_100", "agent_a", 5)
+    assert "word_similarity" in fuzzy_sql
+    assert fuzzy_params[3] == [1]  # ranked hits are not repeated
+    assert fuzzy_params[6] == "%deploy\\_100\\%%" and fuzzy_params[-1] == 4  # LIKE-escaped, only the shortfall
+
+
+@pytest.mark.parametrize("group_commit", [True, False])
+def test_concurrent_increments_are_not_lost(path, group_commit):
+    db = database.SQLiteDB(path, group_commit=group_commit)
+    db.shared_set("hits", "a value, no counter yet")
+
+    def bump():
+        for _ in range(50):
+            db.shared_incr("hits")
+        db.shared_incr_many({"a": 1, "b": 2})
+
+    threads = [threading.Thread(target=bump) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert db.shared_incr("hits", 0) == 400
+    assert db.shared_incr_many({"b": -16, "a": 0}) == {"a": 8, "b": 0}
+    assert db.shared_get("hits")["value"] == "a value, no counter yet"
+    db.close()
+
+
+def test_incr_batch_endpoint_merges_keys(main):
+    with TestClient(main.app) as client:
+        increments = [{"key": "x", "delta": 2}, {"key": "y"}, {"key": "x", "delta": 3}]
+        assert client.post("/shared:incr-batch", json={"increments": increments}).json() == {
+            "counters": {"x": 5, "y": 1}
+        }
+        assert client.post("/shared/x/incr", json={"delta": -1}).json() == {"key": "x", "counter": 4}
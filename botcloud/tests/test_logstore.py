@@ -0,0 +1,117 @@
+"""
+tools/logstore.py: replay, tombstones, compaction and the single-writer lock.
+
+Run: python -m pytest -q tests/test_logstore.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import logstore
+from tools.logstore import HEADER, LogStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "memory.log")
+
+
+def test_values_survive_reopen(path):
+    store = LogStore(path)
+    store.set("a", "1")
+    store.set("b", "2")
+    store.set("a", "3")
+    store.close()
+
+    store = LogStore(path)
+    assert store.get("a")[0] == "3"
+    assert store.get("b")[0] == "2"
+    assert [k for k, _, _ in store.items()] == ["b", "a"]
+    store.close()
+
+
+def test_torn_tail_is_dropped_and_overwritten(path):
+    store = LogStore(path)
+    store.set("a", "kept")
+    store.set("b", "torn")
+    offset, _, _ = store.index["b"]
+    record_start = offset - HEADER.size - len("b")
+    store.buf[offset] ^= 0xFF  # a crash mid-write: the CRC no longer matches
+    store.close()
+
+    store = LogStore(path)
+    assert store.get("a")[0] == "kept"
+    assert store.get("b") is None
+    assert store.end == record_start
+    store.set("c", "new")  # appends over the torn record
+    assert store.index["c"][0] == record_start + HEADER.size + len("c")
+    store.close()
+
+    store = LogStore(path)
+    assert [(k, v) for k, v, _ in store.items()] == [("a", "kept"), ("c", "new")]
+    store.close()
+
+
+def test_tombstones_survive_reopen(path):
+    store = LogStore(path)
+    store.set("a", "1")
+    store.set("b", "2")
+    assert store.delete("a")
+    assert not store.delete("missing")
+    store.close()
+
+    store = LogStore(path)
+    assert store.get("a") is None
+    assert len(store) == 1
+    store.set("a", "back")
+    store.close()
+
+    store = LogStore(path)
+    assert [(k, v) for k, v, _ in store.items()] == [("b", "2"), ("a", "back")]
+    store.close()
+
+
+@pytest.mark.parametrize("persist", [True, False])
+def test_compaction_keeps_live_values_in_order(path, monkeypatch, persist):
+    monkeypatch.setattr(logstore, "COMPACT_MIN", 4096)
+    store = LogStore(path if persist else None)
+    for key in "abcdef":
+        store.set(key, key * 10)
+    for i in range(500):
+        store.set("c", f"c{i}")
+    store.delete("e")
+    assert store.end < 500 * HEADER.size  # the 500 overwrites were compacted away
+    expected = [("a", "a" * 10), ("b", "b" * 10), ("d", "d" * 10), ("f", "f" * 10), ("c", "c499")]
+    assert [(k, v) for k, v, _ in store.items()] == expected
+    if persist:
+        assert not os.path.exists(path + ".compact")
+        store.close()
+        store = LogStore(path)
+        assert [(k, v) for k, v, _ in store.items()] == expected
+    store.close()
+
+
+def test_second_opener_is_refused(path):
+    store = LogStore(path)
+    with pytest.raises(BlockingIOError):
+        LogStore(path)
+    store.close()
+    LogStore(path).close()  # free again once the first writer closes
+
+
+def test_in_memory_store(monkeypatch):
+    monkeypatch.setattr(logstore, "INITIAL_SIZE", 64)
+    store = LogStore(None)
+    assert store.path is None
+    for i in range(100):
+        store.set(f"k{i}", "v" * i)  # grows the buffer past INITIAL_SIZE
+    store.delete("k0")
+    assert store.get("k99")[0] == "v" * 99
+    assert store.get("k0") is None
+    assert len(store) == 99
+    store.flush()
+    store.close()
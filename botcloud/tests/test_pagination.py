@@ -0,0 +1,152 @@
+"""
+Keyset pagination of the list endpoints: in-memory (/agents/{id}/tasks,
+/tasks) and database-backed (/db/agents/{id}/tasks, Database.list_tasks).
+
+Run: python -m pytest -q tests/test_pagination.py
+"""
+
+import importlib
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "api")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+H = {"X-API-Key": "demo_key_123"}
+N_TASKS = 23
+
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    """A fresh API (main imported again) whose data lives under a temp HOME"""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("HOME", str(tmp_path_factory.mktemp("home")))
+        for name in ("main", "database", "vectors"):
+            sys.modules.pop(name, None)
+        main = importlib.import_module("main")
+        with TestClient(main.app) as client:
+            agent_id = client.get("/agents", headers=H).json()["agents"][0]["id"]
+            ids = [client.post(f"/agents/{agent_id}/tasks", json={"input_data": f"task {i}"}, headers=H).json()["id"]
+                   for i in range(N_TASKS)]
+            client.get(f"/agents/{agent_id}/tasks/next", params={"wait": 0, "max": N_TASKS}, headers=H)
+            for task_id in ids[::3]:
+                client.post(f"/tasks/{task_id}/complete", json={"output": "ok", "status": "completed"}, headers=H)
+            yield client, main, agent_id, ids
+        if main._db is not None:
+            main._db.close()
+
+
+def walk(client, url, limit, **params):
+    """Follow next_cursor to the end; returns every page"""
+    pages, after = [], None
+    while True:
+        query = dict(params, limit=limit)
+        if after:
+            query["after"] = after
+        resp = client.get(url, params=query, headers=H)
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        pages.append(body["tasks"])
+        after = body.get("next_cursor")
+        if not after:
+            return pages
+        assert len(body["tasks"]) == limit
+
+
+@pytest.mark.parametrize("limit", [1, 5, 7, N_TASKS, 100])
+def test_memory_walk_agent_tasks(api, limit):
+    client, _, agent_id, ids = api
+    pages = walk(client, f"/agents/{agent_id}/tasks", limit)
+    assert [t["id"] for page in pages for t in page] == ids  # creation order, no gaps or repeats
+
+
+def test_memory_walk_all_tasks_and_status(api):
+    client, _, agent_id, ids = api
+    seen = [t["id"] for page in walk(client, "/tasks", 4) for t in page]
+    assert [i for i in seen if i in ids] == ids
+    assert len(seen) == len(set(seen))
+
+    completed = [t["id"] for page in walk(client, f"/agents/{agent_id}/tasks", 2, status="completed") for t in page]
+    assert completed == ids[::3]
+
+
+def test_memory_fields_projection(api):
+    client, _, agent_id, ids = api
+    body = client.get(f"/agents/{agent_id}/tasks", params={"limit": 3, "fields": "id,input"}, headers=H).json()
+    assert [set(t) for t in body["tasks"]] == [{"id", "input"}] * 3
+    assert [t["id"] for t in body["tasks"]] == ids[:3]
+
+
+def test_db_walk_and_projection(api):
+    client, _, agent_id, _ = api
+    ids = [client.post(f"/db/agents/{agent_id}/tasks", json={"input_data": f"db {i}"}).json()["id"]
+           for i in range(11)]
+    pages = walk(client, f"/db/agents/{agent_id}/tasks", 3, fields="id,input")
+    seen = [t["id"] for page in pages for t in page]
+    assert len(seen) == len(set(seen))
+    assert [i for i in seen if i in ids] == ids[::-1]  # newest first
+    assert all(set(t) == {"id", "input"} for page in pages for t in page)
+
+
+@pytest.mark.parametrize("url", ["/agents/{agent_id}/tasks", "/tasks", "/db/agents/{agent_id}/tasks"])
+@pytest.mark.parametrize("cursor", ["junk", "bm90IGpzb24", "WzEsIDJd"])
+def test_invalid_cursor(api, url, cursor):
+    client, _, agent_id, _ = api
+    resp = client.get(url.format(agent_id=agent_id), params={"after": cursor}, headers=H)
+    assert resp.status_code == 400
+
+
+def test_hot_cold_merge(tmp_path):
+    """list_tasks pages seamlessly across tasks and tasks_archive"""
+    import database
+    db = database.SQLiteDB(str(tmp_path / "merge.db"))
+    try:
+        created = db.create_tasks([("agent_m", f"m {i}", 0) for i in range(10)])
+        created += db.create_tasks([("agent_m", f"n {i}", 0) for i in range(10)])
+        done = created[::2]
+        db.complete_tasks([(t["id"], "ok", "completed") for t in done])
+        future = (datetime.utcnow() + timedelta(days=1)).isoformat()
+        assert db.archive_tasks(future) == len(done)
+
+        expected = [t["id"] for t in sorted(created, key=lambda t: (t["created_at"], t["id"]), reverse=True)]
+        seen, after = [], None
+        while True:
+            rows = db.list_tasks("agent_m", after=after, limit=3, fields=["id"])
+            seen += [r["id"] for r in rows]
+            if len(rows) < 3:
+                break
+            after = (rows[-1]["created_at"], rows[-1]["id"])
+        assert seen == expected
+
+        completed = db.list_tasks("agent_m", status="completed")
+        assert sorted(r["id"] for r in completed) == sorted(t["id"] for t in done)
+        assert all(r["output"] == "ok" for r in completed)  # archived rows are unpacked
+    finally:
+        db.close()
+
+
+def test_shared_walk_with_null_timestamps(api):
+    """Rows without updated_at (older imports) page last instead of breaking the cursor"""
+    client, main, _, _ = api
+    db = main.get_db()
+    for key in ("nul_a", "nul_b", "nul_c"):
+        db.conn.execute("INSERT INTO shared_memory (key, value, updated_at) VALUES (?, 'old', NULL)", (key,))
+    db.conn.commit()
+    for key in ("set_a", "set_b", "set_c"):
+        assert client.put(f"/shared/{key}", json={"value": "new"}).status_code == 200
+
+    seen, after = [], None
+    while True:
+        query = {"limit": 2, "after": after} if after else {"limit": 2}
+        body = client.get("/shared", params=query).json()
+        seen += [row["key"] for row in body["shared"]]
+        after = body["next_cursor"]
+        if not after:
+            break
+    assert seen == ["set_c", "set_b", "set_a", "nul_c", "nul_b", "nul_a"]
@@ -167,6 +167,26 @@ def test_get_task(result, task_id):
         result.fail_test("Get task", str(e))
 
 
+def test_claim_tasks(result, agent_id):
+    """Test 8b: Claim tasks via long-poll"""
+    if not agent_id:
+        result.skip_test("Claim tasks")
+        return
+    try:
+        r = requests.get(
+            f"{BOTCLOUD_URL}/agents/{agent_id}/tasks/next",
+            params={"wait": 1, "max": 5},
+            headers={"X-API-Key": "demo_key_123"},
+            timeout=10
+        )
+        if r.status_code == 200 and all(t["status"] == "claimed" for t in r.json().get("tasks", [])):
+            result.pass_test(f"Claim tasks ({len(r.json()['tasks'])} claimed)")
+        else:
+            result.fail_test("Claim tasks", r.text)
+    except Exception as e:
+        result.fail_test("Claim tasks", str(e))
+
+
 def test_store_memory(result, agent_id):
     """Test 9: Store memory"""
     if not agent_id:
@@ -266,6 +286,7 @@ def main():
     test_stop_agent(result, agent_id)
     task_id = test_create_task(result, agent_id)
     test_get_task(result, task_id)
+    test_claim_tasks(result, agent_id)
     test_store_memory(result, agent_id)
     test_get_memory(result, agent_id)
     test_metrics(result, agent_id)
@@ -0,0 +1,235 @@
+"""
+BotStore, the in-memory hot tier of api/main.py: write-behind persistence,
+retention, claims and leases, scheduling and routing.
+
+Run: python -m pytest -q tests/test_store.py
+"""
+
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+H = {"X-API-Key": "demo_key_123"}
+
+
+def test_rehydrate_keeps_tenant_and_callback(main, db, store):
+    agent = store.create_agent("persisted", ["shell"])
+    kept = store.create_task(agent.id, "echo hi", callback_url="http://cb.example/done", tenant="acme", priority=5)
+    claimed = store.create_task(agent.id, "echo claimed", callback_url="http://cb.example/2", tenant="beta")
+    assert [t.id for t in store.claim_tasks(agent.id, 2)] == [kept.id, claimed.id]
+    store.release_tasks([kept.id])
+    assert store.flush()
+
+    fresh = main.BotStore(archive=lambda: db)
+    fresh.rehydrate()
+    for original in (kept, claimed):
+        task = fresh.get_task(original.id)
+        assert task.status == "pending"  # claims do not survive a restart
+        assert task.tenant == original.tenant
+        assert task.callback_url == original.callback_url
+        assert task.priority == original.priority
+    row = db.get_task(kept.id)
+    assert (row["tenant"], row["callback_url"]) == ("acme", "http://cb.example/done")
+
+
+def test_socket_drop_keeps_task_claimed(main):
+    with TestClient(main.app) as client:
+        agent_id = main.store.api_keys["demo_key_123"]
+        with client.websocket_connect(f"/ws/worker/{agent_id}", headers=H) as ws:
+            task_id = client.post(f"/agents/{agent_id}/tasks", json={"input_data": "sleep 5"}, headers=H).json()["id"]
+            pushed = ws.receive_json()
+            assert [t["id"] for t in pushed["tasks"]] == [task_id]
+        # the worker is still running it: no one else may claim it meanwhile
+        assert main.store.get_task(task_id).status == "claimed"
+        claimed = client.get(f"/agents/{agent_id}/tasks/next", params={"wait": 0}, headers=H).json()["tasks"]
+        assert task_id not in [t["id"] for t in claimed]
+        assert client.post(f"/tasks/{task_id}/lease", headers=H).status_code == 200
+
+        other = client.post("/agents", json={"name": "other", "capabilities": []}).json()
+        done = {"output": "ok", "status": "completed"}
+        resp = client.post(f"/tasks/{task_id}/complete", json=done, headers={"X-API-Key": other["api_key"]})
+        assert resp.status_code == 409
+        assert client.post(f"/tasks/{task_id}/complete", json=done, headers=H).status_code == 200
+        assert client.post(f"/tasks/{task_id}/complete", json=done, headers=H).status_code == 409
+
+
+def test_weighted_fair_share_between_tenants(main):
+    import manager
+    with TestClient(main.app) as client:
+        agent = client.post("/agents", json={"name": "fair", "capabilities": []}).json()
+        key = {"X-API-Key": agent["api_key"]}
+        assert client.put("/tenants/heavy/weight", json={"weight": 3}, headers=key).status_code == 200
+        tenant_of = {}
+        for tenant in ("bulk", "heavy"):  # bulk submits first, heavy gets 3x the share anyway
+            for i in range(8):
+                body = {"input_data": f"{tenant} {i}", "tenant": tenant}
+                task = client.post(f"/agents/{agent['id']}/tasks", json=body, headers=key).json()
+                tenant_of[task["id"]] = tenant
+        urgent = client.post(f"/agents/{agent['id']}/tasks", headers=key, json={
+            "input_data": "now", "tenant": "bulk", "priority": manager.PRIORITY_INTERACTIVE
+        }).json()["id"]
+
+        order = []
+        while True:
+            claimed = client.get(f"/agents/{agent['id']}/tasks/next", params={"wait": 0, "max": 3}, headers=key).json()
+            if not claimed["tasks"]:
+                break
+            order += [t["id"] for t in claimed["tasks"]]
+        assert order[0] == urgent
+        first = [tenant_of[t] for t in order[1:9]]
+        assert first[:2] == ["heavy", "heavy"] and first.count("heavy") == 6  # a 3:1 share
+        assert [tenant_of[t] for t in order[-6:]] == ["bulk"] * 6  # heavy ran out
+        assert sorted(order[1:]) == sorted(tenant_of)
+
+
+def test_expired_lease_is_claimed_again(store):
+    agent = store.create_agent("leases", [])
+    lapsed, renewed, done = tasks = [store.create_task(agent.id, f"task {i}") for i in range(3)]
+    assert store.claim_tasks(agent.id, 5, lease_seconds=60) == tasks
+    for _ in range(100):
+        store.renew_lease(renewed.id, 60)  # superseded heap entries are compacted away
+    assert len(store._leases[agent.id]) <= 64
+
+    for task in tasks:
+        store.renew_lease(task.id, 0)  # lapses now
+    store.renew_lease(renewed.id, 60)
+    store.complete_task(done.id, "ok", agent_id=agent.id)
+    assert store.claim_tasks(agent.id, 5, lease_seconds=60) == [lapsed]
+    assert store.claim_tasks(agent.id, 5) == []
+
+
+def test_concurrent_claimers_never_share_a_task(store):
+    agent = store.create_agent("racy", [])
+    tasks = store.create_tasks([(agent.id, f"task {i}", None, 0, None) for i in range(300)])
+
+    def claim_all():
+        claimed, start = [], threading.Barrier(8)
+
+        def claimer():
+            start.wait()
+            while True:
+                batch = store.claim_tasks(agent.id, 3, lease_seconds=60)
+                if not batch:
+                    return
+                claimed.extend(t.id for t in batch)
+
+        threads = [threading.Thread(target=claimer) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(claimed)
+
+    ids = sorted(t.id for t in tasks)
+    assert claim_all() == ids  # each pending task handed out exactly once
+    for task in tasks:
+        store.renew_lease(task.id, 0)
+    assert claim_all() == ids  # and each lapsed claim, too
+
+
+def test_retention_spills_oldest_terminal_tasks(main, store, monkeypatch):
+    monkeypatch.setattr(main, "MAX_TASKS_IN_MEMORY", 5)
+    monkeypatch.setattr(main, "TERMINAL_TASK_TTL", 0)
+    agent = store.create_agent("retained", [])
+    tasks = [store.create_task(agent.id, f"task {i}") for i in range(10)]
+    store.claim_tasks(agent.id, 8)
+    for task in tasks[:8]:
+        store.complete_task(task.id, f"out {task.input}", agent_id=agent.id)
+    store.enforce_retention(force=True)
+
+    spilled = tasks[:5]  # oldest completions go first, only down to the cap
+    assert sorted(store.tasks) == sorted(t.id for t in tasks[5:])
+    assert store.count_tasks(agent.id, "completed") == 3
+    for task in spilled:
+        archived = store.get_task(task.id)  # read back from the archive
+        assert (archived.status, archived.output, archived.agent_id) == ("completed", f"out {task.input}", agent.id)
+
+
+def test_failed_spill_keeps_tasks_in_memory(main, monkeypatch):
+    class Broken:
+        def upsert_tasks(self, rows):
+            raise OSError("disk full")
+
+    monkeypatch.setattr(main, "MAX_TASKS_IN_MEMORY", 1)
+    store = main.BotStore(archive=Broken)
+    agent = store.create_agent("unlucky", [])
+    tasks = [store.create_task(agent.id, f"task {i}") for i in range(3)]
+    store.claim_tasks(agent.id, 3)
+    store.complete_tasks([(t.id, "ok", "completed") for t in tasks], agent.id)
+    store.enforce_retention(force=True)
+    assert sorted(store.tasks) == sorted(t.id for t in tasks)
+    assert store.count_tasks(agent.id, "completed") == 3
+    assert all(t.id in store._dirty_tasks for t in tasks)  # written behind later instead
+
+
+def test_batch_create_and_complete_are_all_or_nothing(main):
+    with TestClient(main.app) as client:
+        agent = client.post("/agents", json={"name": "batcher", "capabilities": []}).json()
+        key = {"X-API-Key": agent["api_key"]}
+        before = len(main.store.tasks)
+        for bad in ({"input_data": "lost", "agent_id": "agent_missing"}, {"input_data": "no agent"}):
+            tasks = [{"input_data": "a", "agent_id": agent["id"]}, bad]
+            assert client.post("/tasks:batch", json={"tasks": tasks}, headers=key).status_code in (404, 422)
+        assert len(main.store.tasks) == before
+
+        tasks = [{"input_data": f"job {i}", "priority": i} for i in range(4)]
+        body = {"tasks": tasks, "agent_id": agent["id"]}
+        created = client.post("/tasks:batch", json=body, headers=key).json()["tasks"]
+        assert [t["input"] for t in created] == [f"job {i}" for i in range(4)]
+        ids = [t["id"] for t in created]
+        client.get(f"/agents/{agent['id']}/tasks/next", params={"wait": 0, "max": 3}, headers=key)  # 3 of 4
+        unclaimed = next(i for i in ids if main.store.get_task(i).status == "pending")
+
+        for stray in ("task_missing", unclaimed):
+            results = [{"task_id": i, "output": "ok"} for i in ids if i != unclaimed] + [{"task_id": stray}]
+            resp = client.post("/tasks:complete-batch", json={"results": results}, headers=key)
+            assert resp.status_code in (404, 409)
+            assert [main.store.get_task(i).status for i in ids].count("claimed") == 3  # none applied
+
+        results = [{"task_id": i, "output": "ok"} for i in ids if i != unclaimed]
+        done = client.post("/tasks:complete-batch", json={"results": results}, headers=key).json()["tasks"]
+        assert [t["status"] for t in done] == ["completed"] * 3
+
+
+def test_routing_picks_capable_least_loaded_agent(main, store):
+    busy = store.create_agent("busy", ["gpu", "shell"])
+    idle = store.create_agent("idle", ["gpu", "shell"])
+    cpu = store.create_agent("cpu", ["shell"])
+    stopped = store.create_agent("stopped", ["gpu", "shell"])
+    for agent in (busy, idle, cpu):
+        store.start_agent(agent.id)
+    for i in range(5):
+        store.create_task(busy.id, f"queued {i}")
+
+    assert sorted(store.agents_with(["gpu", "shell"])) == sorted([busy.id, idle.id, stopped.id])
+    assert {store.pick_agent(["gpu", "shell"]) for _ in range(20)} == {idle.id}  # both sampled, idle wins
+    assert store.pick_agent(["shell", "gpu"]) == idle.id
+    store.stop_agent(idle.id)
+    assert store.pick_agent(["gpu"]) == busy.id
+    with pytest.raises(main.HTTPException) as err:
+        store.pick_agent(["gpu", "tpu"])
+    assert err.value.status_code == 404
+
+
+def test_indexes_follow_status_changes(store):
+    agent = store.create_agent("indexed", [])
+    other = store.create_agent("other", [])
+    tasks = [store.create_task(agent.id, f"task {i}") for i in range(6)]
+    store.create_task(other.id, "elsewhere")
+    store.claim_tasks(agent.id, 4)
+    store.complete_task(tasks[0].id, "ok", agent_id=agent.id)
+    store.complete_task(tasks[1].id, "no", "failed", agent_id=agent.id)
+    store.delete_task(tasks[5].id)
+
+    def ids(status=None):
+        return [t.id for t in store.agent_tasks(agent.id, status)]
+
+    assert ids() == [t.id for t in tasks[:5]]
+    assert ids("completed") == [tasks[0].id]
+    assert ids("failed") == [tasks[1].id]
+    assert ids("claimed") == [tasks[2].id, tasks[3].id]
+    assert ids("pending") == [tasks[4].id]
+    assert [t.id for t in store.agent_tasks(agent.id, newest_first=True, limit=2)] == [tasks[4].id, tasks[3].id]
+    assert (store.count_tasks(agent.id), store.count_tasks(status="pending")) == (5, 2)
+    assert store.in_flight(agent.id) == 3
@@ -0,0 +1,49 @@
+"""
+tools/common.py: run_command streams output from a background sender, so a
+slow API never holds up the pipes.
+
+Run: python -m pytest -q tests/test_streaming.py
+"""
+
+import sys
+import time
+
+from tools import common
+
+
+def run_streamed(monkeypatch, args, post_delay):
+    sent = []
+
+    def slow_post(task_id, message):
+        time.sleep(post_delay)
+        sent.append(message)
+        return True
+
+    monkeypatch.setattr(common, "post_stream", slow_post)
+    monkeypatch.setattr(common._current, "task_id", "task_s", raising=False)
+    started = time.monotonic()
+    result = common.run_command(args, timeout=30)
+    return result, sent, time.monotonic() - started
+
+
+def test_slow_stream_is_coalesced(monkeypatch):
+    lines = "import sys, time\nfor i in range(40):\n    print(i, flush=True)\n    time.sleep(0.01)\n"
+    (returncode, stdout, _), sent, elapsed = run_streamed(monkeypatch, [sys.executable, "-c", lines], 0.2)
+    assert returncode == 0
+    assert stdout == "".join(f"{i}\n" for i in range(40))
+    assert "".join(m.get("stdout", "") for m in sent) == stdout  # nothing lost, in order
+    assert len(sent) < 10  # ~0.4s of output under 0.2s posts: merged, not one post per line
+    assert [m["seq"] for m in sent] == list(range(len(sent)))
+    assert sent[-1]["exit"] == 0
+    assert elapsed < 2
+
+
+def test_backlog_drops_oldest(monkeypatch):
+    monkeypatch.setattr(common, "STREAM_BACKLOG", 64 * 1024)
+    flood = "import sys\nfor i in range(2000):\n    sys.stdout.write(str(i).rjust(99) + '\\n')\n"
+    (returncode, stdout, _), sent, _ = run_streamed(monkeypatch, [sys.executable, "-c", flood], 0.5)
+    assert returncode == 0
+    streamed = "".join(m.get("stdout", "") for m in sent)
+    assert streamed.endswith(stdout[-1000:])  # the newest output always arrives
+    assert any("dropped" in m for m in sent)
+    assert len(streamed) + sum(m.get("dropped", 0) for m in sent) == 2000 * 100
@@ -0,0 +1,106 @@
+"""
+tools: the memoized result cache in tools/common.py, and tool modules
+loaded on first use.
+
+Run: python -m pytest -q tests/test_tools.py
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tools import common
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def memo(monkeypatch):
+    """A fresh 4KB result cache in place of the worker-wide one"""
+    cache = common.MemoCache(4096)
+    monkeypatch.setattr(common, "_memo", cache)
+    return cache
+
+
+def test_lru_evicts_oldest_within_budget():
+    cache = common.MemoCache(4096)
+    for i in range(6):
+        cache.put(("k", i), "t", "x" * 900)
+    assert cache.size <= cache.budget
+    assert ("k", 0) not in cache.entries and ("k", 5) in cache.entries
+
+    survivor = next(iter(cache.entries))
+    assert cache.get(survivor, "t") == "x" * 900  # touched, so no longer the oldest
+    cache.put(("k", 6), "t", "x" * 900)
+    assert survivor in cache.entries
+
+    cache.put(("big",), "t", "x" * 2000)  # over a quarter of the budget: not cached
+    assert ("big",) not in cache.entries
+    assert cache.get(survivor, "other token") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_memoized_token_and_normalize(memo):
+    calls, token = [], {"now": 1}
+
+    @common.memoized(lambda arg: token["now"], normalize=lambda arg: (arg.strip(),))
+    def tool(arg):
+        calls.append(arg)
+        return f"result {len(calls)}"
+
+    assert tool("a") == tool(" a ") == "result 1"  # equivalent arguments share an entry
+    token["now"] = 2
+    assert tool("a") == "result 2"  # a changed token recomputes
+    assert tool("b") == "result 3"
+    assert len(calls) == 3
+
+    @common.memoized(lambda arg: None)
+    def uncached(arg):
+        calls.append(arg)
+        return "fresh"
+
+    uncached("a"), uncached("a")
+    assert len(calls) == 5  # a None token skips the cache
+
+
+def test_disabled_cache_is_bypassed(monkeypatch):
+    monkeypatch.setattr(common, "_memo", common.MemoCache(0))
+    calls = []
+
+    @common.memoized(lambda arg: "pure")
+    def tool(arg):
+        calls.append(arg)
+        return "ok"
+
+    tool("a"), tool("a")
+    assert len(calls) == 2 and not common._memo.entries
+
+
+def test_read_file_sees_edits(memo, tmp_path):
+    from tools import files
+    path = tmp_path / "notes.txt"
+    path.write_text("first")
+    assert files.read_file(str(path)) == files.read_file(str(path)) == "first"
+    assert memo.hits == 1
+
+    path.write_text("second, longer")  # new size and mtime: a new token
+    os.utime(path, ns=(0, 10**18))
+    assert files.read_file(str(path)) == "second, longer"
+
+
+def test_tool_modules_load_on_first_use():
+    """Checked in a fresh interpreter, since this one has imported tools already"""
+    script = (
+        "import sys, tools\n"
+        "loaded = lambda: sorted(m for m in sys.modules if m.startswith('tools.'))\n"
+        "assert loaded() == ['tools.common'], loaded()\n"
+        "assert tools.process_single_task('math 2+3') == '2+3 = 5'\n"
+        "assert loaded() == ['tools.calc', 'tools.common'], loaded()\n"
+        "assert tools.get_handler('nope') is None and loaded() == ['tools.calc', 'tools.common']\n"
+        "print(tools.process_single_task('help').splitlines()[0])\n"
+    )
+    done = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert done.returncode == 0, done.stderr
+    assert done.stdout.strip() == "BotCloud Worker Commands:"
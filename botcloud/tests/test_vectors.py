@@ -0,0 +1,92 @@
+"""
+vectors.py: index files survive a save/load round trip, and a stale or
+damaged file is rebuilt from the database rows.
+
+Run: python -m pytest -q tests/test_vectors.py
+"""
+
+import os
+
+import vectors
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu".split()
+TEXTS = {f"note{i}": " ".join(WORDS[(i * j) % len(WORDS)] for j in range(1, 6)) for i in range(60)}
+QUERIES = ["alpha beta", "kappa", "theta mu zeta"]
+
+
+class Rows:
+    """Stands in for the database: (key, value, blob) rows and their fingerprint"""
+
+    def __init__(self):
+        self.rows = {key: (value, None) for key, value in TEXTS.items()}  # embedded on first build
+        self.reads = 0
+
+    def __call__(self, agent_id):
+        self.reads += 1
+        return [(key, value, blob) for key, (value, blob) in self.rows.items()]
+
+    def fingerprint(self, agent_id):
+        return [len(self.rows), max(self.rows)]
+
+    def backfill(self, agent_id, items):
+        for key, blob in items:
+            self.rows[key] = (self.rows[key][0], blob)
+
+
+def open_index(directory, rows):
+    return vectors.MemoryVectors(str(directory), rows, rows.fingerprint, rows.backfill)
+
+
+def search_all(index):
+    return {q: index.search("agent_a", q, 5) for q in QUERIES}
+
+
+def test_saved_index_is_loaded_not_rebuilt(tmp_path):
+    rows = Rows()
+    index = open_index(tmp_path, rows)
+    expected = search_all(index)
+    assert rows.reads == 1 and all(expected.values())
+    assert all(blob is not None for _, blob in rows.rows.values())  # embeddings stored back
+    index.close()
+
+    index = open_index(tmp_path, rows)
+    assert search_all(index) == expected
+    assert rows.reads == 1  # read from the file
+    index.close()
+
+
+def test_stale_or_damaged_file_is_rebuilt(tmp_path):
+    rows = Rows()
+    index = open_index(tmp_path, rows)
+    expected = search_all(index)
+    index.close()
+
+    del rows.rows["note59"]  # the database changed behind the saved file
+    index = open_index(tmp_path, rows)
+    search_all(index)
+    assert rows.reads == 2
+    index.close()
+
+    path = index._path("agent_a")
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) // 2)
+    rows.rows["note59"] = (TEXTS["note59"], None)
+    index = open_index(tmp_path, rows)
+    assert search_all(index) == expected
+    assert rows.reads == 3
+    index.close()
+
+
+def test_hnsw_graph_round_trip():
+    embedder = vectors.load_embedder()
+    graph = vectors.HNSWIndex(embedder.dim)
+    for key, value in TEXTS.items():
+        graph.add(key, *vectors.dequantize(vectors.quantize(embedder.embed(f"{key} {value}"))))
+    graph.remove("note7")
+
+    header, sections = vectors.unpack_index(vectors.pack_index(*graph.dump()))
+    loaded = vectors.HNSWIndex.load(embedder.dim, header, sections)
+    assert len(loaded) == len(graph) == len(TEXTS) - 1
+    for query in QUERIES:
+        vector = embedder.embed(query)
+        assert loaded.search(vector, 5) == graph.search(vector, 5)
@@ -0,0 +1,78 @@
+"""
+worker.py TaskPool: claimed tasks run concurrently, serial tools one at a
+time, and every task reports exactly once.
+
+Run: python -m pytest -q tests/test_worker.py
+"""
+
+import threading
+import time
+
+import pytest
+
+import worker
+
+
+@pytest.fixture
+def running(monkeypatch):
+    """Replaces the tools with a 0.1s stub that tracks how many run at once, per command"""
+    state = {"now": {}, "peak": {}}
+    lock = threading.Lock()
+
+    def fake_task(task_input):
+        cmd = worker.command_name(task_input)
+        if cmd == "boom":
+            raise RuntimeError("tool crashed")
+        with lock:
+            state["now"][cmd] = state["now"].get(cmd, 0) + 1
+            state["peak"][cmd] = max(state["peak"].get(cmd, 0), state["now"][cmd])
+        time.sleep(0.1)
+        with lock:
+            state["now"][cmd] -= 1
+        return f"ran {task_input}"
+
+    monkeypatch.setattr(worker, "process_single_task", fake_task)
+    return state
+
+
+def run_all(pool, inputs, on_done=None):
+    results, done = {}, threading.Event()
+
+    def record(task, result):
+        results[task["id"]] = result
+        if len(results) == len(inputs):
+            done.set()
+        if on_done:
+            on_done(task, result)
+
+    for i, task_input in enumerate(inputs):
+        pool.wait_for_slot()
+        pool.submit({"id": f"t{i}", "input": task_input}, record)
+    assert done.wait(10)
+    return results
+
+
+def test_tasks_overlap_but_serial_tools_do_not(running):
+    pool = worker.TaskPool(size=4)
+    started = time.monotonic()
+    results = run_all(pool, ["exec a", "exec b", "git status", "git log", "exec c", "git diff"])
+    assert time.monotonic() - started < 0.5  # six 0.1s tasks, four at a time, git queued behind git
+    assert running["peak"]["git"] == 1
+    assert running["peak"]["exec"] >= 2
+    assert results["t2"] == {"task_id": "t2", "output": "ran git status", "status": "completed"}
+
+
+def test_failures_report_and_free_their_slot(running):
+    pool = worker.TaskPool(size=1)
+
+    def flaky_report(task, result):
+        if task["id"] == "t1":
+            raise OSError("API down")
+
+    results = run_all(pool, ["boom", "exec a", "exec b"], flaky_report)
+    assert results["t0"] == {"task_id": "t0", "output": "Error: tool crashed", "status": "failed"}
+    assert [results[t]["status"] for t in ("t1", "t2")] == ["completed", "completed"]
+    deadline = time.monotonic() + 5
+    while pool.free() != 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool.free() == 1 and pool.inflight() == []
@@ -0,0 +1,72 @@
+"""
+zygote.py / manager.ForkServer: forked workers and their exit statuses.
+
+Run: python -m pytest -q tests/test_zygote.py
+"""
+
+import sys
+import time
+
+import pytest
+
+import manager
+import zygote
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="fork server is POSIX only")
+
+
+@pytest.fixture
+def server():
+    server = manager.ForkServer()
+    yield server
+    server.close()
+
+
+def wait_exit(handle, timeout=10):
+    deadline = time.time() + timeout
+    while handle.poll() is None and time.time() < deadline:
+        time.sleep(0.05)
+    return handle.returncode
+
+
+def script(tmp_path, body):
+    path = tmp_path / "child.py"
+    path.write_text(body)
+    return str(path)
+
+
+def test_poll_reports_exit_status(server, tmp_path):
+    handle = server.spawn(script(tmp_path, "import sys\nsys.exit(3)\n"), {})
+    assert wait_exit(handle) == 3
+    assert server.poll(handle.pid) is None  # reported once
+
+
+def test_poll_reports_signal(server, tmp_path):
+    handle = server.spawn(script(tmp_path, "import time\ntime.sleep(60)\n"), {})
+    assert handle.poll() is None
+    handle.terminate()
+    assert wait_exit(handle) == -15
+
+
+def test_worker_status_notices_exit(server, tmp_path):
+    mgr = manager.BotCloudManager(fork_server=False)
+    worker = manager.BotCloudWorker(name="w", status="running")
+    worker.process = server.spawn(script(tmp_path, "raise SystemExit(2)\n"), {})
+    mgr.workers["w"] = worker
+    deadline = time.time() + 10
+    while mgr.get_worker_status()["w"]["status"] == "running" and time.time() < deadline:
+        time.sleep(0.05)
+    assert mgr.get_worker_status()["w"] == {
+        "agent_id": None, "status": "exited", "returncode": 2, "capabilities": []
+    }
+    assert worker.process is None
+    mgr.stop_worker("w")  # nothing left to signal
+
+
+def test_exited_is_bounded(monkeypatch):
+    monkeypatch.setattr(zygote, "EXITED_MAX", 3)
+    monkeypatch.setattr(zygote, "exited", zygote.OrderedDict())
+    statuses = iter([(pid, 1 << 8) for pid in range(100, 106)] + [(0, 0)])  # each exited with 1
+    monkeypatch.setattr(zygote.os, "waitpid", lambda pid, flags: next(statuses))
+    zygote.reap()
+    assert dict(zygote.exited) == {103: 1, 104: 1, 105: 1}
@@ -0,0 +1,79 @@
+"""
+BotCloud worker tools, imported on first use.
+
+COMMANDS maps each command word to "module:handler"; the handler takes the
+rest of the task line. A tool module is only imported the first time one of
+its commands runs, so a worker that only ever runs exec never loads the rest.
+"""
+
+import importlib
+
+from tools.common import API_URL, AGENT_ID, WORKSPACE, _memo
+
+COMMANDS = {
+    "exec": "shell:exec_shell", "run": "shell:exec_shell", "sh": "shell:exec_shell",
+    "read": "files:read_file",
+    "write": "files:write_command",
+    "ls": "files:list_files", "list": "files:list_files",
+    "rm": "files:delete_file", "delete": "files:delete_file",
+    "mkdir": "files:make_directory",
+    "memory": "memory:command", "mem": "memory:command",
+    "shared": "shared:command",
+    "cron": "cron:command", "schedule": "cron:command",
+    "git": "git:git_command",
+    "push": "notify:command",
+    "open": "browser:browser_open", "browse": "browser:browser_open",
+    "screenshot": "browser:screenshot_command", "screen": "browser:screenshot_command",
+    "http": "web:http_request",
+    "curl": "web:fetch_url", "fetch": "web:fetch_url", "wget": "web:fetch_url",
+    "composio": "composio:command", "action": "composio:command",
+    "delegate": "delegate:delegate_to_openclaw",
+    "hardware": "hardware:command", "sys": "hardware:command",
+    "search": "delegate:web_search",
+    "math": "calc:calculate", "calc": "calc:calculate",
+}
+
+HELP = """BotCloud Worker Commands:
+
+FILE: read, write, ls, mkdir, rm
+SHELL: exec <cmd>, run <cmd>
+MEMORY: memory [set|get|del|list]
+CRON: cron [add|list|remove]
+GIT: git <command>
+PUSHOVER: push <message>
+BROWSER: open <url>, screenshot [name]
+HTTP: http <METHOD> <URL>
+SEARCH: search <query>
+MATH: math <expr>
+COMPOSIO: composio <action> [params]
+DELEGATE: delegate <task>
+HARDWARE: hardware [status|processes]
+INFO: info"""
+
+
+def get_handler(cmd: str):
+    """The handler for a command word (imports its module), or None"""
+    target = COMMANDS.get(cmd)
+    if target is None:
+        return None
+    module, _, name = target.partition(":")
+    return getattr(importlib.import_module(f"tools.{module}"), name)
+
+
+def process_single_task(task_input: str) -> str:
+    """Process a single task"""
+    task = task_input.strip()
+    parts = task.split(None, 1)
+    cmd = parts[0].lower() if parts else ""
+    arg = parts[1] if len(parts) > 1 else ""
+
+    handler = get_handler(cmd)
+    if handler:
+        return handler(arg)
+    if cmd == "info":
+        return f"Worker: {AGENT_ID}\nWorkspace: {WORKSPACE}\nAPI: {API_URL}\n{_memo.stats()}"
+    if cmd == "help":
+        return HELP
+
+    # Default: shell
+    return get_handler("exec")(task)
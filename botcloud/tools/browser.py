@@ -0,0 +1,54 @@
+"""Browser and screen: open, screenshot"""
+
+import os
+import subprocess
+from datetime import datetime
+
+from tools.common import WORKSPACE
+
+
+def browser_open(url: str) -> str:
+    """Open a URL in browser"""
+    if not url.startswith(("http://", "https://")):
+        url = "https://" + url
+    
+    try:
+        import webbrowser
+        webbrowser.open(url)
+        return f"Opened: {url}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def browser_screenshot(name: str = "screenshot.png") -> str:
+    """Take a screenshot"""
+    try:
+        # Try different methods
+        try:
+            import pyscreenshot
+            img = pyscreenshot.grab()
+            path = os.path.join(WORKSPACE, name)
+            img.save(path)
+            return f"Screenshot saved: {name}"
+        except:
+            pass
+        
+        # Try gnome-screenshot
+        result = subprocess.run(["gnome-screenshot", "-f", name], capture_output=True, text=True)
+        if result.returncode == 0:
+            return f"Screenshot: {name}"
+        
+        return "Screenshot tool not available"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def take_screenshot(name: str = None) -> str:
+    """Take screenshot - alias for browser_screenshot"""
+    if not name:
+        name = f"screenshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+    return browser_screenshot(name)
+
+
+def screenshot_command(arg: str) -> str:
+    return take_screenshot(arg if arg else None)
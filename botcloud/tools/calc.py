@@ -0,0 +1,18 @@
+"""Math: math/calc <expression>"""
+
+from tools.common import memoized
+
+
+@memoized(lambda expr: "pure")  # the result echoes expr, so no key normalization
+def calculate(expr: str) -> str:
+    """Math calculation"""
+    if not expr:
+        return "Usage: math <expression>"
+    allowed = set("0123456789+-*/.() ")
+    if not all(c in allowed for c in expr):
+        return "Error: Only basic math allowed"
+    try:
+        result = eval(expr, {"__builtins__": {}}, {})
+        return f"{expr} = {result}"
+    except Exception as e:
+        return f"Math error: {str(e)}"
@@ -0,0 +1,300 @@
+"""
+Shared plumbing for worker tools: configuration, the result cache and
+streaming command execution.
+"""
+
+import codecs
+import functools
+import os
+import selectors
+import signal
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+API_URL = os.environ.get("BOTCLOUD_API", "http://localhost:8000")
+AGENT_ID = os.environ.get("BOTCLOUD_AGENT_ID", "")
+API_KEY = os.environ.get("BOTCLOUD_API_KEY", "")
+# Live output of exec/git goes to POST /tasks/{id}/stream in coalesced chunks
+STREAM_OUTPUT = os.environ.get("BOTCLOUD_STREAM_OUTPUT", "1") != "0"
+STREAM_INTERVAL = int(os.environ.get("BOTCLOUD_STREAM_INTERVAL_MS", "50")) / 1000
+STREAM_CHUNK = int(os.environ.get("BOTCLOUD_STREAM_CHUNK", "4096"))  # bytes that force an early flush
+STREAM_BACKLOG = int(os.environ.get("BOTCLOUD_STREAM_BACKLOG", "262144"))  # unsent bytes kept per pipe
+OUTPUT_LIMIT = int(os.environ.get("BOTCLOUD_OUTPUT_LIMIT", "65536"))  # bytes of stdout/stderr kept per task
+MEMO_BYTES = int(os.environ.get("BOTCLOUD_MEMO_BYTES", str(4 * 1024 * 1024)))  # result cache budget; 0 disables
+WORKSPACE = os.environ.get("BOTCLOUD_WORKSPACE", "/home/openryanclaw/botcloud/workspace")
+COMPOSIO_API_KEY = os.environ.get("COMPOSIO_API_KEY", "")
+
+
+# ============ MEMOIZATION ============
+
+class MemoCache:
+    """LRU of tool results within a byte budget. Each entry carries the
+    validity token it was computed under; a different token is a miss."""
+    
+    def __init__(self, budget: int = MEMO_BYTES):
+        self.budget = budget
+        self.entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (token, result, size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+    
+    def get(self, key: tuple, token) -> Optional[str]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] == token:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+    
+    def put(self, key: tuple, token, result: str):
+        size = len(result) + 64  # rough per-entry overhead
+        if size > self.budget // 4:
+            return  # one big result should not flush everything else
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.size -= old[2]
+            self.entries[key] = (token, result, size)
+            self.size += size
+            while self.size > self.budget:
+                _, (_, _, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+    
+    def stats(self) -> str:
+        with self._lock:
+            return (f"Memo: {self.hits} hits, {self.misses} misses, "
+                    f"{len(self.entries)} entries, {self.size}/{self.budget} bytes")
+
+
+_memo = MemoCache()
+
+
+def memoized(validity, normalize=None):
+    """Declare a tool cacheable. validity(*args) returns a token that changes
+    whenever the result could, or None to skip the cache for that call;
+    normalize(*args) maps equivalent arguments to one key."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def cached(*args):
+            token = validity(*args) if _memo.budget > 0 else None
+            if token is None:
+                return fn(*args)
+            key = (fn.__name__,) + (normalize(*args) if normalize else args)
+            result = _memo.get(key, token)
+            if result is None:
+                result = fn(*args)
+                _memo.put(key, token, result)
+            return result
+        return cached
+    return wrap
+
+
+def ttl_token(seconds: float):
+    """Validity that expires every `seconds`"""
+    return lambda *args: int(time.time() // seconds)
+
+
+def _file_token(path: Optional[str]):
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+# ============ SHELL ============
+
+_current = threading.local()  # .task_id of the task running on this thread
+
+
+class OutputBuffer:
+    """Keeps only the last `limit` bytes written, so huge outputs stay bounded"""
+    
+    def __init__(self, limit: int = OUTPUT_LIMIT):
+        self.limit = limit
+        self.data = bytearray()
+        self.dropped = 0
+    
+    def write(self, chunk: bytes):
+        self.data += chunk
+        excess = len(self.data) - self.limit
+        if excess > 0:
+            del self.data[:excess]
+            self.dropped += excess
+    
+    def text(self) -> str:
+        text = self.data.decode(errors="replace")
+        if self.dropped:
+            return f"[... {self.dropped} bytes truncated ...]\n{text}"
+        return text
+
+
+class StreamChunker:
+    """Coalesces a child's stdout/stderr into stream messages, one per
+    STREAM_INTERVAL or per STREAM_CHUNK bytes, whichever comes first"""
+    
+    def __init__(self):
+        self.decoders = {name: codecs.getincrementaldecoder("utf-8")("replace") for name in ("stdout", "stderr")}
+        self.pending = {"stdout": [], "stderr": []}
+        self.size = 0
+        self.since = None  # when the oldest pending byte arrived
+        self.seq = 0
+        self.dropped = 0  # unsent bytes discarded since the last message
+    
+    def write(self, name: str, chunk: bytes) -> bool:
+        """Buffer a chunk; True when enough is pending to send right away.
+        Past STREAM_BACKLOG unsent bytes the oldest pending text is dropped."""
+        text = self.decoders[name].decode(chunk)
+        if text:
+            parts = self.pending[name]
+            parts.append(text)
+            self.size += len(chunk)
+            if self.since is None:
+                self.since = time.monotonic()
+            while self.size > STREAM_BACKLOG and len(parts) > 1:
+                dropped = len(parts.pop(0).encode())
+                self.size -= dropped
+                self.dropped += dropped
+        return self.size >= STREAM_CHUNK
+    
+    def due(self) -> Optional[float]:
+        """Seconds until pending output should be sent (None: nothing pending)"""
+        if self.since is None:
+            return None
+        return max(0.0, self.since + STREAM_INTERVAL - time.monotonic())
+    
+    def take(self, **final) -> Optional[dict]:
+        """The next message (with any `final` fields, e.g. exit code), or None"""
+        message = {name: "".join(parts) for name, parts in self.pending.items() if parts}
+        if not message and not final:
+            return None
+        message.update(final)
+        if self.dropped:
+            message["dropped"] = self.dropped
+        message["seq"] = self.seq
+        self.seq += 1
+        self.pending = {"stdout": [], "stderr": []}
+        self.size, self.since, self.dropped = 0, None, 0
+        return message
+
+
+class StreamSender:
+    """Posts a task's stream messages from a background thread, so a slow API
+    never stalls the pipe reader: output that arrives while a post is in
+    flight is coalesced into the next message (see StreamChunker.write)."""
+    
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.chunker = StreamChunker()
+        self.final: Optional[dict] = None
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"stream-{task_id}", daemon=True)
+        self._thread.start()
+    
+    def write(self, name: str, chunk: bytes):
+        with self._cond:
+            self.chunker.write(name, chunk)
+            self._cond.notify()
+    
+    def close(self, timeout: float = 5, **final):
+        """Send what is left plus `final` (e.g. exit code), waiting up to `timeout`"""
+        with self._cond:
+            self.final = final
+            self._cond.notify()
+        self._thread.join(timeout)
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self.final is not None:
+                        message, last = self.chunker.take(**self.final), True
+                        break
+                    due = self.chunker.due()
+                    if due == 0 or self.chunker.size >= STREAM_CHUNK:
+                        message, last = self.chunker.take(), False
+                        break
+                    self._cond.wait(due)
+            if message and not post_stream(self.task_id, message):
+                return  # the command keeps running, it just stops streaming
+            if last:
+                return
+
+
+_sessions = threading.local()
+
+
+def api_session():
+    """This thread's HTTP session (requests.Session is not shared across threads)"""
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        import requests
+        session = requests.Session()
+        session.headers["X-API-Key"] = API_KEY
+        _sessions.session = session
+    return session
+
+
+def post_stream(task_id: str, message: dict) -> bool:
+    """Send one stream message; False if the API could not take it"""
+    try:
+        return api_session().post(f"{API_URL}/tasks/{task_id}/stream", json=message, timeout=2).status_code == 200
+    except Exception as e:
+        print(f"Stream error for {task_id}: {e}")
+        return False
+
+
+def run_command(args, timeout: float, shell: bool = False, cwd: str = None):
+    """Run a command, reading its pipes as it goes: output is streamed to the
+    current task's subscribers and only the last OUTPUT_LIMIT bytes are kept.
+    Returns (returncode, stdout, stderr); returncode is None on timeout."""
+    task_id = getattr(_current, "task_id", None)
+    buffers = {"stdout": OutputBuffer(), "stderr": OutputBuffer()}
+    proc = subprocess.Popen(
+        args, shell=shell, cwd=cwd, stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True
+    )
+    selector = selectors.DefaultSelector()
+    selector.register(proc.stdout, selectors.EVENT_READ, "stdout")
+    selector.register(proc.stderr, selectors.EVENT_READ, "stderr")
+    deadline = time.monotonic() + timeout
+    timed_out = False
+    sender = StreamSender(task_id) if STREAM_OUTPUT and task_id else None
+    try:
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            for key, _ in selector.select(remaining):
+                chunk = os.read(key.fd, 65536)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    continue
+                buffers[key.data].write(chunk)
+                if sender:
+                    sender.write(key.data, chunk)
+        if not timed_out:
+            try:
+                proc.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                timed_out = True
+        if timed_out:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)  # the shell and everything it started
+            except ProcessLookupError:
+                pass
+        returncode = proc.wait()
+    finally:
+        selector.close()
+        proc.stdout.close()
+        proc.stderr.close()
+    if sender:
+        sender.close(exit=None if timed_out else returncode)
+    return (None if timed_out else returncode), buffers["stdout"].text(), buffers["stderr"].text()
@@ -0,0 +1,39 @@
+"""Composio actions (opt-in): composio <action> [params]"""
+
+from tools.common import COMPOSIO_API_KEY
+
+
+def composio_action(action: str, params: str = "") -> str:
+    """Execute Composio action (opt-in)"""
+    if not COMPOSIO_API_KEY:
+        return "Composio not enabled. Set COMPOSIO_API_KEY to enable."
+    
+    try:
+        import requests
+        
+        # Parse action and params
+        # Format: "action_name param1=value1 param2=value2"
+        parts = params.split() if params else []
+        param_dict = {}
+        for p in parts:
+            if "=" in p:
+                k, v = p.split("=", 1)
+                param_dict[k] = v
+        
+        resp = requests.post(
+            "https://api.composio.dev/v1/actions/execute",
+            headers={"x-api-key": COMPOSIO_API_KEY, "Content-Type": "application/json"},
+            json={"action": action, "params": param_dict},
+            timeout=30
+        )
+        
+        if resp.status_code == 200:
+            return f"Action executed: {action}\n{resp.json()}"
+        return f"Failed: {resp.status_code} - {resp.text}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def command(arg: str) -> str:
+    sub = arg.split(None, 1)
+    return composio_action(sub[0], sub[1] if len(sub) > 1 else "")
@@ -0,0 +1,97 @@
+"""Interval jobs: cron [add <interval> <task>|list|remove <job_id>]"""
+
+import re
+import threading
+try:
+    from apscheduler.schedulers.background import BackgroundScheduler
+    _HAS_APSCHEDULER = True
+except ImportError:
+    _HAS_APSCHEDULER = False
+    BackgroundScheduler = None
+
+# In-memory scheduler, started by the first `cron add`
+_scheduler = None
+_scheduler_lock = threading.Lock()
+_scheduled_tasks = {}
+
+
+def _get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = BackgroundScheduler()
+            _scheduler.start()
+        return _scheduler
+
+
+def schedule_task(cron_expr: str, task: str) -> str:
+    """Schedule a task (simple interval: every N seconds/minutes/hours)"""
+    # Simple format: "every 30s", "every 5m", "every 1h"
+    match = re.match(r"every\s+(\d+)\s*([smh])", cron_expr.lower())
+    if not match:
+        return "Usage: every <number><s|m|h> (e.g., every 30s, every 5m)"
+    if not _HAS_APSCHEDULER:
+        return "apscheduler not installed. Install: pip install apscheduler"
+
+    value, unit = int(match.group(1)), match.group(2)
+
+    if unit == "s":
+        interval = value
+    elif unit == "m":
+        interval = value * 60
+    else:
+        interval = value * 3600
+
+    job_id = f"job_{len(_scheduled_tasks)}"
+
+    def run_task():
+        from tools import process_single_task
+        # Execute and optionally report back
+        result = process_single_task(task)
+        print(f"[Scheduled] {task} -> {result[:50]}")
+
+    _get_scheduler().add_job(run_task, 'interval', seconds=interval, id=job_id)
+    _scheduled_tasks[job_id] = {"task": task, "interval": interval}
+
+    return f"Scheduled: {task} every {value}{unit} (job_id: {job_id})"
+
+
+def list_scheduled() -> str:
+    """List scheduled tasks"""
+    if not _scheduled_tasks:
+        return "No scheduled tasks"
+    lines = []
+    for job_id, info in _scheduled_tasks.items():
+        interval = info["interval"]
+        if interval < 60:
+            unit = "s"
+        elif interval < 3600:
+            unit = "m"
+            interval //= 60
+        else:
+            unit = "h"
+            interval //= 3600
+        lines.append(f"- {job_id}: {info['task']} every {interval}{unit}")
+    return "\n".join(lines)
+
+
+def unschedule_task(job_id: str) -> str:
+    """Remove a scheduled task"""
+    if job_id in _scheduled_tasks:
+        _get_scheduler().remove_job(job_id)
+        del _scheduled_tasks[job_id]
+        return f"Removed: {job_id}"
+    return f"Not found: {job_id}"
+
+
+def command(arg: str) -> str:
+    sub = arg.split(None, 1)
+    if sub and sub[0] == "add" and len(sub) > 1:
+        parts2 = sub[1].split(None, 1)
+        if len(parts2) == 2:
+            return schedule_task(parts2[0], parts2[1])
+    if sub and sub[0] == "list":
+        return list_scheduled()
+    if sub and sub[0] == "remove":
+        return unschedule_task(sub[1] if len(sub) > 1 else "")
+    return "Usage: cron [add <interval> <task>|list|remove <job_id>]"
@@ -0,0 +1,39 @@
+"""OpenClaw delegation: delegate <task>, search <query>"""
+
+import os
+import sys
+
+
+def delegate_to_openclaw(task: str) -> str:
+    """Delegate task to OpenClaw"""
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+    
+    try:
+        from botcloud.openclaw_connector import OpenClawConnector
+        
+        openclaw_url = os.environ.get("OPENCLAW_URL", "http://localhost:8080")
+        connector = OpenClawConnector(openclaw_url=openclaw_url)
+        
+        health = connector.health_check()
+        if health["status"] != "healthy":
+            return f"OpenClaw unreachable: {health.get('error', 'unknown')}"
+        
+        result = connector.delegate_task(task, timeout=120)
+        
+        if result["status"] == "completed":
+            res = result.get("result", {})
+            if isinstance(res, dict):
+                return f"OpenClaw: {res.get('content', res)}"
+            return f"OpenClaw: {res}"
+        return f"OpenClaw error: {result.get('error', result.get('status'))}"
+    except ImportError:
+        return "OpenClaw connector not available"
+    except Exception as e:
+        return f"Delegate error: {str(e)}"
+
+
+def web_search(query: str) -> str:
+    """Web search - delegates to OpenClaw"""
+    if not query:
+        return "Usage: search <query>"
+    return delegate_to_openclaw(f"search: {query}")
@@ -0,0 +1,85 @@
+"""Files in the workspace: read, write, ls, rm, mkdir"""
+
+import os
+import shutil
+from typing import Optional
+
+from tools.common import WORKSPACE, memoized, _file_token
+
+
+def _read_path(filepath: str) -> Optional[str]:
+    """The file read_file would open (workspace first), or None"""
+    full_path = os.path.join(WORKSPACE, filepath)
+    if os.path.exists(full_path):
+        return full_path
+    return filepath if os.path.exists(filepath) else None
+
+
+@memoized(lambda filepath: _file_token(_read_path(filepath)), normalize=lambda filepath: (_read_path(filepath),))
+def read_file(filepath: str) -> str:
+    try:
+        full_path = os.path.join(WORKSPACE, filepath)
+        if not os.path.exists(full_path):
+            if os.path.exists(filepath):
+                with open(filepath) as f:
+                    return f.read()
+            return f"File not found: {filepath}"
+        with open(full_path) as f:
+            return f.read()
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def write_file(filepath: str, content: str) -> str:
+    try:
+        full_path = os.path.join(WORKSPACE, filepath)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'w') as f:
+            f.write(content)
+        return f"Wrote to {filepath} ({len(content)} bytes)"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def list_files(dirpath: str = "") -> str:
+    try:
+        full_path = os.path.join(WORKSPACE, dirpath) if dirpath else WORKSPACE
+        if not os.path.exists(full_path):
+            return f"Directory not found: {dirpath}"
+        items = []
+        for item in os.listdir(full_path):
+            full_item = os.path.join(full_path, item)
+            items.append(item + "/" if os.path.isdir(full_item) else item)
+        return "\n".join(items) if items else "Empty"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def delete_file(filepath: str) -> str:
+    try:
+        full_path = os.path.join(WORKSPACE, filepath)
+        if not os.path.exists(full_path):
+            return f"Not found: {filepath}"
+        if os.path.isdir(full_path):
+            shutil.rmtree(full_path)
+        else:
+            os.remove(full_path)
+        return f"Deleted: {filepath}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def make_directory(dirpath: str) -> str:
+    try:
+        full_path = os.path.join(WORKSPACE, dirpath)
+        os.makedirs(full_path, exist_ok=True)
+        return f"Created: {dirpath}/"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def write_command(arg: str) -> str:
+    if " " in arg:
+        idx = arg.index(" ")
+        return write_file(arg[:idx], arg[idx+1:])
+    return "Usage: write <filename> <content>"
@@ -0,0 +1,59 @@
+"""Git in the workspace: git <command>"""
+
+import os
+import time
+
+from tools.common import WORKSPACE, memoized, run_command, _file_token
+
+
+GIT_STATUS_TTL = 2  # seconds; worktree edits do not touch HEAD or the index
+
+
+def _git_token(args: str):
+    """HEAD commit (+ index state and a short TTL for status); None when the
+    command is not a read-only log/status or the workspace is not a repo"""
+    parts = args.split()
+    if not parts or parts[0] not in ("log", "status"):
+        return None
+    git_dir = os.path.join(WORKSPACE, ".git")
+    try:
+        with open(os.path.join(git_dir, "HEAD")) as f:
+            head = f.read().strip()
+        if head.startswith("ref: "):
+            ref = head[5:]
+            ref_path = os.path.join(git_dir, ref)
+            if os.path.exists(ref_path):
+                with open(ref_path) as f:
+                    head = f.read().strip()
+            else:
+                head = (ref, _file_token(os.path.join(git_dir, "packed-refs")))
+    except OSError:
+        return None
+    if parts[0] == "log":
+        return head
+    return (head, _file_token(os.path.join(git_dir, "index")), int(time.time() // GIT_STATUS_TTL))
+
+
+@memoized(_git_token, normalize=lambda args: (" ".join(args.split()),))
+def git_command(args: str) -> str:
+    """Run git commands"""
+    # Security: only allow safe git commands
+    allowed = {"status", "log", "diff", "branch", "checkout", "add", "commit", "push", "pull", "clone", "init"}
+    
+    parts = args.split()
+    if not parts:
+        return "Usage: git <command> [args]"
+    
+    cmd = parts[0]
+    if cmd not in allowed:
+        return f"Git command not allowed: {cmd}. Allowed: {allowed}"
+    
+    try:
+        returncode, stdout, stderr = run_command(["git"] + parts, timeout=30, cwd=WORKSPACE)
+        if returncode is None:
+            return "Error: Command timed out"
+        if returncode == 0:
+            return stdout[:2000] if stdout else "OK"
+        return f"Error: {stderr}"
+    except Exception as e:
+        return f"Error: {str(e)}"
@@ -0,0 +1,74 @@
+"""Host status: hardware [status|processes]"""
+
+import time
+
+from tools.common import memoized, ttl_token
+try:
+    import psutil
+    _HAS_PSUTIL = True
+except ImportError:
+    _HAS_PSUTIL = False
+    psutil = None
+
+# cpu_percent(interval=None) reports usage since its previous call without
+# blocking; start that window on import so the first reading means something
+MIN_CPU_SAMPLE = 0.1  # seconds
+_cpu_window_start = time.monotonic()
+if _HAS_PSUTIL:
+    psutil.cpu_percent(interval=None)
+
+
+@memoized(ttl_token(1))
+def hardware_status() -> str:
+    """Get hardware status"""
+    if not _HAS_PSUTIL:
+        return "psutil not installed. Install: pip install psutil"
+    try:
+        wait = MIN_CPU_SAMPLE - (time.monotonic() - _cpu_window_start)
+        if wait > 0:
+            time.sleep(wait)  # only the first call right after import
+        cpu = psutil.cpu_percent(interval=None)
+        mem = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        
+        return f"""Hardware Status:
+CPU: {cpu}%
+Memory: {mem.percent}% ({mem.used // (1024**2)}MB / {mem.total // (1024**2)}MB)
+Disk: {disk.percent}% ({disk.used // (1024**3)}GB / {disk.total // (1024**3)}GB)"""
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def hardware_reboot() -> str:
+    """Reboot system (requires root)"""
+    return "Reboot disabled for safety. Use exec sudo reboot manually."
+
+
+def hardware_shutdown() -> str:
+    """Shutdown system (requires root)"""
+    return "Shutdown disabled for safety. Use exec sudo shutdown manually."
+
+
+def hardware_processes() -> str:
+    """List top processes"""
+    if not _HAS_PSUTIL:
+        return "psutil not installed. Install: pip install psutil"
+    try:
+        procs = sorted(psutil.process_iter(['pid', 'name', 'cpu_percent']), 
+                      key=lambda x: x.info['cpu_percent'] or 0, reverse=True)[:10]
+        
+        lines = ["Top Processes:"]
+        for p in procs:
+            lines.append(f"  {p.info['pid']}: {p.info['name']} ({p.info['cpu_percent']}%)")
+        return "\n".join(lines)
+    except:
+        return "Could not get processes"
+
+
+def command(arg: str) -> str:
+    sub = arg.split(None, 1) if arg else []
+    if not sub or sub[0] == "status":
+        return hardware_status()
+    if sub[0] == "processes":
+        return hardware_processes()
+    return "Usage: hardware [status|processes]"
@@ -0,0 +1,206 @@
+"""
+Append-only key/value log behind the worker's `memory` commands.
+
+Records are appended to a memory-mapped file and located through an in-memory
+index, so reads and writes cost about as much as a dict and survive restarts.
+Each record is:
+
+    crc32 | timestamp | key_len | value_len | key | value
+
+value_len == TOMBSTONE marks a delete. On open the log is replayed until the
+first record whose CRC does not match (a write torn by a crash), and new
+records overwrite from there. Once dead records outweigh live ones the log is
+rewritten to a temp file and renamed over the old one.
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, Optional, Tuple
+
+HEADER = struct.Struct("<IdII")  # crc32, timestamp, key_len, value_len
+TOMBSTONE = 0xFFFFFFFF
+INITIAL_SIZE = 64 * 1024
+COMPACT_MIN = 1024 * 1024  # dead bytes before compaction is considered
+
+
+class LogStore:
+    """Key/value store on an append-only log. path=None keeps the log in
+    memory only (same code path, nothing persisted)."""
+
+    def __init__(self, path: Optional[str], sync: bool = False):
+        self.path = path
+        self.sync = sync  # msync after every write (survives power loss, not just crashes)
+        self.index: Dict[str, Tuple[int, int, float]] = {}  # key -> (value offset, value length, timestamp)
+        self.end = 0  # where the next record goes
+        self.dead = 0  # bytes held by overwritten or deleted records
+        self._lock = threading.Lock()
+        self._fd = None
+        self._lock_fd = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # One writer per log: a second worker with the same agent ID gets BlockingIOError
+            self._lock_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(self._lock_fd)
+                raise
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._map(max(os.fstat(self._fd).st_size, INITIAL_SIZE))
+        else:
+            self.buf = bytearray(INITIAL_SIZE)
+        self._replay()
+        self._maybe_compact()
+
+    # ---- file plumbing ----
+
+    def _map(self, size: int):
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self.buf = mmap.mmap(self._fd, size)
+
+    def _grow(self, needed: int):
+        size = len(self.buf)
+        while size < needed:
+            size *= 2
+        if self._fd is None:
+            self.buf.extend(bytes(size - len(self.buf)))
+            return
+        self.buf.close()
+        self._map(size)
+
+    def _replay(self):
+        """Rebuild the index from the log; stops at the first torn or empty record"""
+        pos, size = 0, len(self.buf)
+        while pos + HEADER.size <= size:
+            crc, ts, key_len, value_len = HEADER.unpack_from(self.buf, pos)
+            length = 0 if value_len == TOMBSTONE else value_len
+            end = pos + HEADER.size + key_len + length
+            if key_len == 0 or end > size or zlib.crc32(self.buf[pos + 4:end]) != crc:
+                break
+            key = self.buf[pos + HEADER.size:pos + HEADER.size + key_len].decode()
+            self._apply(key, pos, end, length, ts, value_len == TOMBSTONE)
+            pos = end
+        self.end = pos
+
+    def _apply(self, key: str, pos: int, end: int, length: int, ts: float, deleted: bool):
+        old = self.index.pop(key, None)
+        if old:
+            self.dead += HEADER.size + len(key.encode()) + old[1]
+        if deleted:
+            self.dead += end - pos
+        else:
+            self.index[key] = (end - length, length, ts)
+
+    def _append(self, key: str, value: Optional[bytes]) -> float:
+        key_bytes = key.encode()
+        value_bytes = value or b""
+        ts = time.time()
+        body = HEADER.pack(0, ts, len(key_bytes), TOMBSTONE if value is None else len(value_bytes))[4:]
+        record = body + key_bytes + value_bytes
+        pos, end = self.end, self.end + 4 + len(record)
+        if end > len(self.buf):
+            self._grow(end)
+        self.buf[pos + 4:end] = record
+        self.buf[pos:pos + 4] = struct.pack("<I", zlib.crc32(record))  # last: the record counts once this lands
+        if self.sync and self._fd is not None:
+            self.buf.flush()
+        self.end = end
+        self._apply(key, pos, end, len(value_bytes), ts, value is None)
+        return ts
+
+    # ---- public API ----
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """(value, timestamp) or None"""
+        with self._lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            offset, length, ts = entry
+            return self.buf[offset:offset + length].decode(), ts
+
+    def set(self, key: str, value: str) -> float:
+        with self._lock:
+            ts = self._append(key, value.encode())
+            self._maybe_compact()
+            return ts
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            if key not in self.index:
+                return False
+            self._append(key, None)
+            self._maybe_compact()
+            return True
+
+    def items(self) -> Iterator[Tuple[str, str, float]]:
+        """(key, value, timestamp) in insertion order of the current values"""
+        with self._lock:
+            entries = sorted(self.index.items(), key=lambda item: item[1][0])
+            return iter([(key, self.buf[offset:offset + length].decode(), ts)
+                         for key, (offset, length, ts) in entries])
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    # ---- compaction ----
+
+    def _maybe_compact(self):
+        if self.dead > COMPACT_MIN and self.dead > self.end - self.dead:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite only the live records; the old log stays valid until the rename"""
+        records = []
+        for key, (offset, length, ts) in sorted(self.index.items(), key=lambda item: item[1][0]):
+            key_bytes = key.encode()
+            record = HEADER.pack(0, ts, len(key_bytes), length)[4:] + key_bytes + self.buf[offset:offset + length]
+            records.append(struct.pack("<I", zlib.crc32(record)) + record)
+        data = b"".join(records)
+        size = INITIAL_SIZE
+        while size < len(data) * 2:
+            size *= 2
+
+        if self._fd is None:
+            self.buf = bytearray(data) + bytes(size - len(data))
+        else:
+            tmp = self.path + ".compact"
+            with open(tmp, "wb") as f:
+                f.write(data)
+                f.truncate(size)
+                f.flush()
+                os.fsync(f.fileno())
+            self.buf.close()
+            os.close(self._fd)
+            os.replace(tmp, self.path)
+            dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)  # make the rename itself durable
+            finally:
+                os.close(dir_fd)
+            self._fd = os.open(self.path, os.O_RDWR)
+            self._map(size)
+
+        self.index, self.end, self.dead = {}, 0, 0
+        self._replay()
+
+    def flush(self):
+        """Force written records to disk"""
+        with self._lock:
+            if self._fd is not None:
+                self.buf.flush()
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                self.buf.flush()
+                self.buf.close()
+                os.close(self._fd)
+                os.close(self._lock_fd)  # releases the flock
+                self._fd = self._lock_fd = None
@@ -0,0 +1,75 @@
+"""Worker-local memory: memory [set|get|del|list]"""
+
+import os
+import threading
+from datetime import datetime
+
+from tools.common import AGENT_ID
+from tools.logstore import LogStore
+
+# One append-only log per agent, so memory survives worker restarts
+MEMORY_DIR = os.environ.get("BOTCLOUD_MEMORY_DIR", "") or os.path.expanduser("~/botcloud/data/memory")
+MEMORY_PERSIST = os.environ.get("BOTCLOUD_MEMORY_PERSIST", "1") != "0"
+MEMORY_SYNC = os.environ.get("BOTCLOUD_MEMORY_SYNC", "0") == "1"  # msync every write
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _memory_store() -> LogStore:
+    """The store, opened on first use; in memory only if the log cannot be opened"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            path = os.path.join(MEMORY_DIR, f"{AGENT_ID or 'local'}.log") if MEMORY_PERSIST else None
+            try:
+                _store = LogStore(path, sync=MEMORY_SYNC)
+            except OSError as e:
+                print(f"Memory log unavailable ({e}), keeping memory in process only")
+                _store = LogStore(None)
+        return _store
+
+
+def memory_set(key: str, value: str) -> str:
+    """Store a memory"""
+    _memory_store().set(key, value)
+    return f"Memory set: {key}"
+
+
+def memory_get(key: str) -> str:
+    """Get a memory"""
+    mem = _memory_store().get(key)
+    if mem:
+        value, ts = mem
+        return f"{key}: {value} (at {datetime.fromtimestamp(ts).isoformat()})"
+    return f"No memory: {key}"
+
+
+def memory_list() -> str:
+    """List all memories"""
+    items = list(_memory_store().items())
+    if not items:
+        return "No memories stored"
+    return "\n".join(f"- {k}: {v[:50]}" for k, v, _ in items)
+
+
+def memory_delete(key: str) -> str:
+    """Delete a memory"""
+    if _memory_store().delete(key):
+        return f"Deleted: {key}"
+    return f"Not found: {key}"
+
+
+def command(arg: str) -> str:
+    sub = arg.split(None, 1)
+    if not sub:
+        return memory_list()
+    if sub[0] == "set" and len(sub) > 1:
+        parts2 = sub[1].split(None, 1)
+        if len(parts2) == 2:
+            return memory_set(parts2[0], parts2[1])
+    if sub[0] == "get":
+        return memory_get(sub[1] if len(sub) > 1 else "")
+    if sub[0] == "del":
+        return memory_delete(sub[1] if len(sub) > 1 else "")
+    return "Usage: memory [set <key> <val>|get <key>|del <key>|list]"
@@ -0,0 +1,32 @@
+"""Pushover notifications: push [title] <message>"""
+
+import os
+
+
+def send_pushover(message: str, title: str = "BotCloud") -> str:
+    """Send Pushover notification"""
+    token = os.environ.get("PUSHOVER_TOKEN", "")
+    user = os.environ.get("PUSHOVER_USER", "")
+    
+    if not token or not user:
+        return "Pushover not configured. Set PUSHOVER_TOKEN and PUSHOVER_USER"
+    
+    try:
+        import requests
+        resp = requests.post(
+            "https://api.pushover.net/1/messages.json",
+            data={"token": token, "user": user, "message": message, "title": title},
+            timeout=10
+        )
+        if resp.status_code == 200:
+            return f"Notification sent: {message[:50]}"
+        return f"Failed: {resp.status_code}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def command(arg: str) -> str:
+    sub = arg.split(None, 1)
+    if len(sub) == 2:
+        return send_pushover(sub[1], sub[0] if sub[0] else "BotCloud")
+    return send_pushover(arg)
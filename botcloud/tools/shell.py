@@ -0,0 +1,16 @@
+"""Shell: exec, run, sh (and any unknown command)"""
+
+from tools.common import run_command
+
+
+def exec_shell(cmd: str) -> str:
+    """Execute a shell command"""
+    try:
+        returncode, stdout, stderr = run_command(cmd, timeout=60, shell=True)
+        if returncode is None:
+            return "Error: Command timed out"
+        if returncode == 0:
+            return stdout if stdout else "OK"
+        return f"Error: {stderr}"
+    except Exception as e:
+        return f"Error: {str(e)}"
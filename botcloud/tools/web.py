@@ -0,0 +1,46 @@
+"""HTTP: http <METHOD> <URL> [body], curl/fetch/wget <url>"""
+
+
+def http_request(request_def: str) -> str:
+    """Make HTTP request"""
+    parts = request_def.split(None, 2)
+    if len(parts) < 2:
+        return "Usage: http <METHOD> <URL> [body]"
+    
+    method, url = parts[0].upper(), parts[1]
+    body = parts[2] if len(parts) > 2 else None
+    
+    try:
+        import requests
+        kwargs = {"url": url, "timeout": 15, "headers": {"User-Agent": "BotCloud/1.0"}}
+        
+        if method == "GET":
+            pass
+        elif method in ("POST", "PUT"):
+            kwargs["json"] = {"body": body} if body else {}
+        elif method == "DELETE":
+            pass
+        else:
+            return f"Unsupported: {method}"
+        
+        resp = requests.request(method, **kwargs)
+        return f"HTTP {resp.status_code}\n\n{resp.text[:1500]}"
+    except Exception as e:
+        return f"HTTP error: {str(e)}"
+
+
+def fetch_url(url: str) -> str:
+    """Fetch web page"""
+    if not url:
+        return "Usage: fetch <url>"
+    if not url.startswith(("http://", "https://")):
+        url = "https://" + url
+    
+    try:
+        import requests
+        resp = requests.get(url, timeout=15)
+        if resp.status_code == 200:
+            return f"=== {url} ===\n\n{resp.text[:2000]}"
+        return f"Fetch failed: HTTP {resp.status_code}"
+    except Exception as e:
+        return f"Error: {str(e)}"
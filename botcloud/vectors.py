@@ -0,0 +1,774 @@
+#!/usr/bin/env python3
+"""
+BotCloud Vector Index
+Offline embeddings and approximate nearest-neighbour search over agent memories
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import heapq
+import random
+import struct
+import threading
+import time
+import importlib
+import zlib
+from array import array
+from operator import itemgetter, mul
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    _HAS_NUMPY = True
+except ImportError:
+    np = None
+    _HAS_NUMPY = False
+
+EMBEDDING_DIM = int(os.environ.get("BOTCLOUD_EMBEDDING_DIM", "256"))
+# Agents with more vectors than this move from the flat index to an HNSW graph
+HNSW_THRESHOLD = int(os.environ.get("BOTCLOUD_HNSW_THRESHOLD", "50000"))
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 64
+HNSW_EF_SEARCH = 64
+# Rebuild a graph once this share of its nodes are deleted
+HNSW_MAX_DELETED = 0.3
+# Graph builds wait until an agent's writes have paused this long (bulk imports)
+HNSW_BUILD_DELAY = 1.0
+# Changed indexes are saved this often (seconds; 0 = only on close) and as
+# soon as this many memory writes have piled up
+SAVE_INTERVAL = float(os.environ.get("BOTCLOUD_VECTOR_SAVE_INTERVAL", "60"))
+SAVE_AFTER = int(os.environ.get("BOTCLOUD_VECTOR_SAVE_AFTER", "1000"))
+
+_WORD = re.compile(r"\w+")
+
+
+# ============ Embedding ============
+
+def quantize(vector: List[float]) -> bytes:
+    """L2-normalise and pack as a float32 scale followed by one int8 per dimension"""
+    return quantize_sparse(dict(_nonzero(vector)), len(vector))
+
+
+def quantize_sparse(weights: Dict[int, float], dim: int) -> bytes:
+    """quantize() for a {dimension: weight} vector"""
+    norm = math.sqrt(sum(x * x for x in weights.values())) or 1.0
+    peak = max((abs(x) for x in weights.values()), default=0.0) / norm
+    scale = peak / 127 if peak else 1.0
+    packed = array("b", bytes(dim))
+    for i, x in weights.items():
+        packed[i] = int(round(x / norm / scale))
+    return struct.pack("<f", scale) + packed.tobytes()
+
+
+def dequantize(blob: bytes) -> Tuple[float, array]:
+    scale = struct.unpack_from("<f", blob)[0]
+    vector = array("b")
+    vector.frombytes(bytes(blob[4:]))
+    return scale, vector
+
+
+class HashingEmbedder:
+    """
+    Offline embedder: signed feature hashing of words and word bigrams with
+    sublinear term frequency. IDF is applied to queries from the index's
+    document frequencies, so stored vectors never go stale.
+    """
+
+    uses_idf = True
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-v1-{dim}"
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for i, x in self.embed_sparse(text).items():
+            vector[i] = x
+        return vector
+
+    def embed_sparse(self, text: str) -> Dict[int, float]:
+        words = _WORD.findall(text.lower())
+        counts: Dict[str, int] = {}
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            counts[feature] = counts.get(feature, 0) + 1
+        weights: Dict[int, float] = {}
+        for feature, n in counts.items():
+            h = zlib.crc32(feature.encode())
+            i = h % self.dim
+            weights[i] = weights.get(i, 0.0) + (1.0 if h & 0x80000000 else -1.0) * (1 + math.log(n))
+        return weights
+
+
+def load_embedder():
+    """The embedder named by BOTCLOUD_EMBEDDER ("module:factory"), else HashingEmbedder.
+
+    A custom embedder needs `name`, `dim` and `embed(text) -> list of floats`.
+    """
+    spec = os.environ.get("BOTCLOUD_EMBEDDER")
+    if not spec:
+        return HashingEmbedder()
+    module, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module), attr)()
+
+
+_NONZERO_BYTE = re.compile(rb"[^\x00]")
+
+
+def _nonzero(vector) -> List[Tuple[int, float]]:
+    if isinstance(vector, array) and vector.typecode == "b":
+        # Stored vectors are sparse; let the regex engine skip the zero bytes
+        return [(m.start(), vector[m.start()]) for m in _NONZERO_BYTE.finditer(vector.tobytes())]
+    return [(i, x) for i, x in enumerate(vector) if x]
+
+
+class _SparseQuery:
+    """A query's non-zero dimensions, for fast dot products with int8 vectors"""
+
+    __slots__ = ("weights", "pick")
+
+    def __init__(self, vector, scale: float = 1.0):
+        nz = _nonzero(vector)
+        self.weights = tuple(x * scale for _, x in nz)
+        if len(nz) > 1:
+            self.pick = itemgetter(*(i for i, _ in nz))
+        elif nz:
+            index = nz[0][0]
+            self.pick = lambda v: (v[index],)
+        else:
+            self.pick = lambda v: ()
+
+    def dot(self, vector) -> float:
+        return sum(map(mul, self.weights, self.pick(vector)))
+
+
+# ============ Indexes ============
+
+class FlatIndex:
+    """Exact search over int8 vectors: a NumPy matrix product when available,
+    else a sparse dot product over the query's non-zero dimensions"""
+
+    kind = "flat"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.keys: List[Optional[str]] = []
+        self.scales: List[float] = []
+        self.vectors: List[array] = []
+        self.slots: Dict[str, int] = {}
+        self.free: List[int] = []
+        self._matrix = None
+        self._matrix_scales = None
+
+    def __len__(self):
+        return len(self.slots)
+
+    def items(self) -> Iterable[Tuple[str, float, array]]:
+        for key, slot in self.slots.items():
+            yield key, self.scales[slot], self.vectors[slot]
+
+    def add(self, key: str, scale: float, vector: array):
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.free.pop() if self.free else len(self.keys)
+            if slot == len(self.keys):
+                self.keys.append(None)
+                self.scales.append(0.0)
+                self.vectors.append(vector)
+            self.slots[key] = slot
+        self.keys[slot], self.scales[slot], self.vectors[slot] = key, scale, vector
+        self._sync(slot)
+
+    def remove(self, key: str):
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return
+        self.keys[slot], self.scales[slot] = None, 0.0
+        self.free.append(slot)
+        self._sync(slot)
+
+    def dump(self) -> Tuple[dict, Dict[str, array]]:
+        """JSON-safe header and flat arrays for the index file"""
+        vectors = array("b")
+        for vector in self.vectors:
+            vectors.extend(vector)
+        return {"keys": list(self.keys)}, {"scales": array("f", self.scales), "vectors": vectors}
+
+    @classmethod
+    def load(cls, dim: int, header: dict, sections: Dict[str, array]) -> "FlatIndex":
+        keys, scales, vectors = header["keys"], sections["scales"], sections["vectors"]
+        if len(scales) != len(keys) or len(vectors) != len(keys) * dim:
+            raise ValueError("flat index sizes disagree")
+        index = cls(dim)
+        index.keys = keys
+        index.scales = scales.tolist()
+        index.vectors = [vectors[i * dim:(i + 1) * dim] for i in range(len(keys))]
+        index.slots = {key: slot for slot, key in enumerate(keys) if key is not None}
+        index.free = [slot for slot, key in enumerate(keys) if key is None]
+        return index
+
+    def _build_matrix(self):
+        capacity = max(64, len(self.keys) * 2)
+        matrix = np.zeros((capacity, self.dim), dtype=np.int8)
+        scales = np.zeros(capacity, dtype=np.float32)
+        for i, key in enumerate(self.keys):
+            if key is not None:
+                matrix[i] = np.frombuffer(self.vectors[i], dtype=np.int8)
+                scales[i] = self.scales[i]
+        self._matrix, self._matrix_scales = matrix, scales
+
+    def _sync(self, slot: int):
+        """Mirror one slot into the NumPy matrix, growing it by doubling"""
+        if not _HAS_NUMPY:
+            return
+        if self._matrix is None or slot >= len(self._matrix):
+            self._build_matrix()
+        elif self.keys[slot] is not None:
+            self._matrix[slot] = np.frombuffer(self.vectors[slot], dtype=np.int8)
+            self._matrix_scales[slot] = self.scales[slot]
+        else:
+            self._matrix_scales[slot] = 0.0
+
+    def search(self, query: List[float], k: int) -> List[Tuple[str, float]]:
+        if not self.slots:
+            return []
+        if _HAS_NUMPY:
+            if self._matrix is None:
+                self._build_matrix()
+            n = len(self.keys)
+            scores = (self._matrix[:n].astype(np.float32) @ np.asarray(query, dtype=np.float32)) * self._matrix_scales[:n]
+            m = min(k + len(self.free), n)  # free slots score 0 and may crowd the top
+            top = np.argpartition(-scores, m - 1)[:m]
+            top = top[np.argsort(-scores[top])]
+            return [(self.keys[i], float(scores[i])) for i in top if self.keys[i] is not None][:k]
+        q = _SparseQuery(query)
+        scored = ((q.dot(self.vectors[slot]) * self.scales[slot], key) for key, slot in self.slots.items())
+        return [(key, score) for score, key in heapq.nlargest(k, scored)]
+
+
+class HNSWIndex:
+    """Hierarchical navigable small-world graph (Malkov & Yashunin) over int8
+    vectors. Deletes are tombstones; the owner rebuilds when too many pile up."""
+
+    kind = "hnsw"
+
+    def __init__(self, dim: int, m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION):
+        self.dim = dim
+        self.m = m
+        self.ef_construction = ef_construction
+        self.keys: List[str] = []
+        self.scales: List[float] = []
+        self.vectors: List[array] = []
+        # node -> level -> [(similarity, neighbour)], so pruning needs no recomputation
+        self.links: List[List[List[Tuple[float, int]]]] = []
+        self.slots: Dict[str, int] = {}
+        self.deleted = set()
+        self.entry: Optional[int] = None
+        self.max_level = -1
+        self._level_mult = 1 / math.log(m)
+        self._rng = random.Random(0)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def items(self) -> Iterable[Tuple[str, float, array]]:
+        for key, node in self.slots.items():
+            yield key, self.scales[node], self.vectors[node]
+
+    def _sim(self, q: _SparseQuery, node: int) -> float:
+        return q.dot(self.vectors[node]) * self.scales[node]
+
+    def _search_layer(self, q: _SparseQuery, entries: List[int], ef: int, level: int) -> List[Tuple[float, int]]:
+        """Best-first beam search on one level; returns up to ef (sim, node), best first"""
+        visited = set(entries)
+        candidates = [(-self._sim(q, e), e) for e in entries]
+        heapq.heapify(candidates)
+        results = [(-s, e) for s, e in candidates]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+        while candidates:
+            neg_sim, node = heapq.heappop(candidates)
+            if len(results) >= ef and -neg_sim < results[0][0]:
+                break
+            for _, neighbour in self.links[node][level]:
+                if neighbour in visited:
+                    continue
+                visited.add(neighbour)
+                sim = self._sim(q, neighbour)
+                if len(results) < ef or sim > results[0][0]:
+                    heapq.heappush(candidates, (-sim, neighbour))
+                    heapq.heappush(results, (sim, neighbour))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted(results, reverse=True)
+
+    def _descend(self, q: _SparseQuery, level: int) -> List[int]:
+        entry = [self.entry]
+        for lv in range(self.max_level, level, -1):
+            entry = [self._search_layer(q, entry, 1, lv)[0][1]]
+        return entry
+
+    def add(self, key: str, scale: float, vector: array):
+        self.remove(key)
+        node = len(self.keys)
+        level = int(-math.log(1 - self._rng.random()) * self._level_mult)
+        self.keys.append(key)
+        self.scales.append(scale)
+        self.vectors.append(vector)
+        self.links.append([[] for _ in range(level + 1)])
+        self.slots[key] = node
+        if self.entry is None:
+            self.entry, self.max_level = node, level
+            return
+
+        q = _SparseQuery(vector, scale)
+        entry = self._descend(q, level)
+        for lv in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(q, entry, self.ef_construction, lv)
+            max_links = self.m * 2 if lv == 0 else self.m
+            self.links[node][lv] = found[:self.m]
+            for sim, neighbour in found[:self.m]:
+                links = self.links[neighbour][lv]
+                links.append((sim, node))
+                if len(links) > max_links:
+                    links.sort(reverse=True)
+                    del links[max_links:]
+            entry = [n for _, n in found]
+        if level > self.max_level:
+            self.entry, self.max_level = node, level
+
+    def remove(self, key: str):
+        node = self.slots.pop(key, None)
+        if node is not None:
+            self.deleted.add(node)
+
+    def search(self, query: List[float], k: int, ef: int = HNSW_EF_SEARCH) -> List[Tuple[str, float]]:
+        if not self.slots:
+            return []
+        q = _SparseQuery(query)
+        found = self._search_layer(q, self._descend(q, 0), max(ef, k + len(self.deleted) // 8), 0)
+        return [(self.keys[n], sim) for sim, n in found if n not in self.deleted][:k]
+
+    def stale(self) -> bool:
+        return len(self.deleted) > HNSW_MAX_DELETED * max(len(self.keys), 1)
+
+    def dump(self) -> Tuple[dict, Dict[str, array]]:
+        """JSON-safe header and flat arrays for the index file; the adjacency
+        lists are flattened into per-node level counts, per-level degrees and
+        one (similarity, neighbour) pair of arrays"""
+        vectors, levels, degrees = array("b"), array("I"), array("I")
+        sims, neighbours = array("d"), array("I")
+        for vector in self.vectors:
+            vectors.extend(vector)
+        for node_links in self.links:
+            levels.append(len(node_links))
+            for links in node_links:
+                degrees.append(len(links))
+                sims.extend(sim for sim, _ in links)
+                neighbours.extend(n for _, n in links)
+        version, state, gauss = self._rng.getstate()
+        header = {"m": self.m, "ef_construction": self.ef_construction, "keys": list(self.keys),
+                  "deleted": sorted(self.deleted), "entry": self.entry, "max_level": self.max_level,
+                  "rng": [version, list(state), gauss]}
+        return header, {"scales": array("f", self.scales), "vectors": vectors, "levels": levels,
+                        "degrees": degrees, "sims": sims, "neighbours": neighbours}
+
+    @classmethod
+    def load(cls, dim: int, header: dict, sections: Dict[str, array]) -> "HNSWIndex":
+        keys, entry = header["keys"], header["entry"]
+        scales, vectors, levels, degrees, sims, neighbours = (
+            sections[name] for name in ("scales", "vectors", "levels", "degrees", "sims", "neighbours"))
+        n = len(keys)
+        if (len(scales) != n or len(vectors) != n * dim or len(levels) != n
+                or len(degrees) != sum(levels) or len(sims) != len(neighbours) or len(neighbours) != sum(degrees)):
+            raise ValueError("graph sizes disagree")
+        if entry is not None and not (0 <= entry < n and levels[entry] == header["max_level"] + 1):
+            raise ValueError("bad graph entry point")
+        index = cls(dim, header["m"], header["ef_construction"])
+        index.keys = keys
+        index.scales = scales.tolist()
+        index.vectors = [vectors[i * dim:(i + 1) * dim] for i in range(n)]
+        d = e = 0
+        for count in levels:
+            node_links = []
+            for level in range(count):
+                ns = neighbours[e:e + degrees[d]]
+                if any(x >= n or levels[x] <= level for x in ns):
+                    raise ValueError("graph link to a missing node")
+                node_links.append(list(zip(sims[e:e + degrees[d]], ns)))
+                e += degrees[d]
+                d += 1
+            index.links.append(node_links)
+        index.deleted = set(header["deleted"])
+        index.slots = {key: node for node, key in enumerate(keys) if node not in index.deleted}
+        index.entry, index.max_level = entry, header["max_level"]
+        version, state, gauss = header["rng"]
+        index._rng.setstate((version, tuple(state), gauss))
+        return index
+
+
+class AgentVectors:
+    """
+    One agent's vectors. The flat index always holds every vector and is the
+    exact answer; past HNSW_THRESHOLD a background thread maintains an HNSW
+    graph that answers instead. Keys written since the graph last saw them are
+    `pending` and scored exactly, so writes never wait on the graph. Also
+    tracks per-dimension document frequencies for IDF.
+    """
+
+    def __init__(self, dim: int, fingerprint=None):
+        self.flat = FlatIndex(dim)
+        self.graph: Optional[HNSWIndex] = None
+        self.pending: set = set()
+        self.df = [0] * dim
+        self.fingerprint = fingerprint
+        self.dirty = False
+        self._init_runtime()
+
+    def _init_runtime(self):
+        self._lock = threading.RLock()
+        self._maintaining = False
+        self._last_write = 0.0
+
+    def __len__(self):
+        return len(self.flat)
+
+    def dump(self) -> Tuple[dict, Dict[str, array]]:
+        """Header and arrays for the index file (call with _lock held)"""
+        flat_header, flat_sections = self.flat.dump()
+        header = {"dim": self.flat.dim, "pending": sorted(self.pending), "flat": flat_header, "graph": None}
+        sections = {"df": array("q", self.df)}
+        sections.update(("flat." + name, a) for name, a in flat_sections.items())
+        if self.graph is not None:
+            header["graph"], graph_sections = self.graph.dump()
+            sections.update(("graph." + name, a) for name, a in graph_sections.items())
+        return header, sections
+
+    @classmethod
+    def load(cls, header: dict, sections: Dict[str, array], fingerprint=None) -> "AgentVectors":
+        dim = header["dim"]
+        if len(sections["df"]) != dim:
+            raise ValueError("document frequencies do not match the dimension")
+        agent = cls(dim, fingerprint)
+        agent.flat = FlatIndex.load(dim, header["flat"], _prefixed(sections, "flat."))
+        agent.df = sections["df"].tolist()
+        agent.pending = set(header["pending"])
+        if header["graph"] is not None:
+            graph = HNSWIndex.load(dim, header["graph"], _prefixed(sections, "graph."))
+            for node, key in enumerate(graph.keys):
+                # Share the flat index's copy, as the live graph does
+                slot = agent.flat.slots.get(key)
+                if slot is not None and agent.flat.vectors[slot] == graph.vectors[node]:
+                    graph.vectors[node] = agent.flat.vectors[slot]
+            agent.graph = graph
+        return agent
+
+    def add(self, key: str, blob: bytes):
+        scale, vector = dequantize(blob)
+        with self._lock:
+            self._forget(key)
+            for i, _ in _nonzero(vector):
+                self.df[i] += 1
+            self.flat.add(key, scale, vector)
+            self._changed(key)
+
+    def remove(self, key: str):
+        with self._lock:
+            self._forget(key)
+            self._changed(key)
+
+    def _forget(self, key: str):
+        slot = self.flat.slots.get(key)
+        if slot is not None:
+            for i, _ in _nonzero(self.flat.vectors[slot]):
+                self.df[i] -= 1
+            self.flat.remove(key)
+
+    def _changed(self, key: str):
+        self.dirty = True
+        self._last_write = time.monotonic()
+        if self.graph is not None or len(self.flat) > HNSW_THRESHOLD:
+            self.pending.add(key)
+            self._maintain()
+
+    def _maintain(self):
+        if not self._maintaining:
+            self._maintaining = True
+            threading.Thread(target=self._maintain_loop, daemon=True).start()
+
+    def _maintain_loop(self):
+        """Build the graph, then fold pending keys into it one at a time"""
+        while True:
+            with self._lock:
+                if len(self.flat) <= HNSW_THRESHOLD:
+                    self.graph, self.pending = None, set()
+                    self._maintaining = False
+                    return
+                if self.graph is None or self.graph.stale():
+                    quiet_for = time.monotonic() - self._last_write
+                    if quiet_for < HNSW_BUILD_DELAY:
+                        items = None
+                    else:
+                        items = list(self.flat.items())
+                        self.pending = set()
+                else:
+                    if not self.pending:
+                        self._maintaining = False
+                        return
+                    key = self.pending.pop()
+                    slot = self.flat.slots.get(key)
+                    if slot is None:
+                        self.graph.remove(key)
+                    else:
+                        self.graph.add(key, self.flat.scales[slot], self.flat.vectors[slot])
+                    self.dirty = True
+                    continue
+            if items is None:
+                time.sleep(HNSW_BUILD_DELAY - quiet_for)
+                continue
+            graph = HNSWIndex(self.flat.dim)
+            for key, scale, vector in items:
+                graph.add(key, scale, vector)
+            with self._lock:
+                self.graph = graph
+                self.dirty = True
+
+    def search(self, query: List[float], k: int, idf: bool) -> List[Tuple[str, float]]:
+        with self._lock:
+            if idf:
+                n = len(self.flat)
+                query = [x * (math.log((n + 1) / (df + 1)) + 1) for x, df in zip(query, self.df)]
+            norm = math.sqrt(sum(x * x for x in query))
+            if not norm:
+                return []
+            query = [x / norm for x in query]
+            if self.graph is None:
+                if len(self.flat) > HNSW_THRESHOLD:
+                    self._maintain()  # e.g. loaded from disk before the graph was built
+                return self.flat.search(query, k)
+            hits = [(key, score) for key, score in self.graph.search(query, k) if key not in self.pending]
+            if self.pending:
+                q = _SparseQuery(query)
+                for key in self.pending:
+                    slot = self.flat.slots.get(key)
+                    if slot is not None:
+                        hits.append((key, q.dot(self.flat.vectors[slot]) * self.flat.scales[slot]))
+                if self._maintaining is False:
+                    self._maintain()
+            return heapq.nlargest(k, hits, key=lambda hit: hit[1])
+
+
+# ============ Per-agent indexes, persisted ============
+
+# An index file is INDEX_MAGIC, a uint32 header length, a JSON header and the
+# raw bytes of every array listed in header["sections"]. Loading only parses
+# JSON and copies bytes into arrays; nothing in the file is executed.
+INDEX_MAGIC = b"BCVEC1\n"
+_HEADER_LEN = struct.Struct("<I")
+_TYPECODES = "bfdIq"
+
+
+def pack_index(header: dict, sections: Dict[str, array]) -> bytes:
+    header = dict(header, byteorder=sys.byteorder,
+                  sections=[[name, a.typecode, len(a)] for name, a in sections.items()])
+    head = json.dumps(header).encode()
+    return b"".join([INDEX_MAGIC, _HEADER_LEN.pack(len(head)), head] + [a.tobytes() for a in sections.values()])
+
+
+def unpack_index(data: bytes) -> Tuple[dict, Dict[str, array]]:
+    """Inverse of pack_index; raises ValueError on anything malformed"""
+    if not data.startswith(INDEX_MAGIC):
+        raise ValueError("not a vector index file")
+    view = memoryview(data)
+    pos = len(INDEX_MAGIC)
+    (length,) = _HEADER_LEN.unpack_from(data, pos)
+    pos += _HEADER_LEN.size
+    header = json.loads(bytes(view[pos:pos + length]))
+    pos += length
+    sections = {}
+    for name, typecode, count in header["sections"]:
+        if typecode not in _TYPECODES:
+            raise ValueError(f"unexpected array type {typecode!r}")
+        a = array(typecode)
+        end = pos + count * a.itemsize
+        if end > len(data):
+            raise ValueError("vector index file is truncated")
+        a.frombytes(view[pos:end])
+        if header["byteorder"] != sys.byteorder:
+            a.byteswap()
+        sections[name] = a
+        pos = end
+    if pos != len(data):
+        raise ValueError("trailing bytes in vector index file")
+    return header, sections
+
+
+def _prefixed(sections: Dict[str, array], prefix: str) -> Dict[str, array]:
+    return {name[len(prefix):]: a for name, a in sections.items() if name.startswith(prefix)}
+
+
+class MemoryVectors:
+    """
+    Vector indexes for every agent's memories, kept in step by the database
+    layer and saved under `directory` (one file per agent).
+
+    `rows(agent_id)` yields (key, value, embedding blob or None) from the
+    database, and `fingerprint(agent_id)` summarises those rows; a saved index
+    whose fingerprint no longer matches is rebuilt from the stored blobs.
+    `backfill(agent_id, [(key, blob)])` stores embeddings computed on rebuild.
+    Changed indexes are saved by a background thread every SAVE_INTERVAL
+    seconds or after SAVE_AFTER writes, and by close().
+    """
+
+    def __init__(self, directory: str, rows: Callable, fingerprint: Callable,
+                 backfill: Callable = None, embedder=None):
+        self.directory = directory
+        self.embedder = embedder or load_embedder()
+        self._rows = rows
+        self._fingerprint = fingerprint
+        self._backfill = backfill
+        self._agents: Dict[str, AgentVectors] = {}
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._writes = 0
+        self._wake = threading.Event()
+        self._closed = False
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._save_loop, name="vector-saver", daemon=True).start()
+
+    def embed(self, key: str, value: str) -> bytes:
+        text = f"{key} {value or ''}"
+        if hasattr(self.embedder, "embed_sparse"):
+            return quantize_sparse(self.embedder.embed_sparse(text), self.embedder.dim)
+        return quantize(self.embedder.embed(text))
+
+    def _path(self, agent_id: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", agent_id) + ".vec")
+
+    def _agent(self, agent_id: str) -> AgentVectors:
+        """Load (or rebuild) an agent's index on first use"""
+        with self._lock:
+            agent = self._agents.get(agent_id)
+            if agent is not None:
+                return agent
+            fingerprint = self._fingerprint(agent_id)
+            agent = self._load(agent_id, fingerprint)
+            if agent is None:
+                agent = self._rebuild(agent_id, fingerprint)
+            self._agents[agent_id] = agent
+            return agent
+
+    def _load(self, agent_id: str, fingerprint) -> Optional[AgentVectors]:
+        """The saved index, if it exists and still matches the database"""
+        try:
+            with open(self._path(agent_id), "rb") as f:
+                header, sections = unpack_index(f.read())
+            if (header["embedder"] == self.embedder.name and header["dim"] == self.embedder.dim
+                    and header["fingerprint"] == _fingerprint_json(fingerprint)):
+                return AgentVectors.load(header, sections, fingerprint)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError, IndexError, struct.error) as e:
+            print(f"Vector index for {agent_id} unreadable ({e}), rebuilding")
+        return None
+
+    def _rebuild(self, agent_id: str, fingerprint) -> AgentVectors:
+        agent = AgentVectors(self.embedder.dim, fingerprint)
+        backfill = []
+        expected = 4 + self.embedder.dim
+        for key, value, blob in self._rows(agent_id):
+            if blob is None or len(blob) != expected:
+                blob = self.embed(key, value)
+                backfill.append((key, blob))
+            agent.add(key, bytes(blob))
+        if backfill and self._backfill:
+            self._backfill(agent_id, backfill)
+        agent.dirty = True
+        return agent
+
+    def prepare(self, agent_ids: Iterable[str]):
+        """Load indexes before a write so the write is applied incrementally
+        rather than invalidating the saved fingerprint"""
+        for agent_id in set(agent_ids):
+            self._agent(agent_id)
+
+    def upsert(self, agent_id: str, items: Iterable[Tuple[str, bytes]]):
+        agent = self._agent(agent_id)
+        with agent._lock:
+            count = 0
+            for key, blob in items:
+                agent.add(key, blob)
+                count += 1
+            agent.fingerprint = None  # re-read on save
+        self._wrote(count)
+
+    def remove(self, agent_id: str, keys: Iterable[str]):
+        agent = self._agent(agent_id)
+        with agent._lock:
+            count = 0
+            for key in keys:
+                agent.remove(key)
+                count += 1
+            agent.fingerprint = None
+        self._wrote(count)
+
+    def _wrote(self, count: int):
+        with self._lock:
+            self._writes += count
+            if self._writes >= SAVE_AFTER:
+                self._wake.set()
+
+    def search(self, agent_id: str, query: str, k: int) -> List[Tuple[str, float]]:
+        agent = self._agent(agent_id)
+        if not len(agent):
+            return []
+        return agent.search(self.embedder.embed(query), k, getattr(self.embedder, "uses_idf", False))
+
+    def save(self):
+        """Write changed indexes to disk (atomically, one file per agent)"""
+        with self._lock:
+            agents = list(self._agents.items())
+            self._writes = 0
+        with self._save_lock:
+            for agent_id, agent in agents:
+                with agent._lock:
+                    if not agent.dirty:
+                        continue
+                    if agent.fingerprint is None:
+                        agent.fingerprint = self._fingerprint(agent_id)
+                    header, sections = agent.dump()
+                    header.update(embedder=self.embedder.name, fingerprint=_fingerprint_json(agent.fingerprint))
+                    agent.dirty = False
+                path = self._path(agent_id)
+                try:
+                    with open(path + ".tmp", "wb") as f:
+                        f.write(pack_index(header, sections))
+                    os.replace(path + ".tmp", path)
+                except OSError as e:
+                    agent.dirty = True
+                    print(f"Vector index save failed for {agent_id}: {e}")
+
+    def _save_loop(self):
+        while True:
+            self._wake.wait(SAVE_INTERVAL or None)
+            self._wake.clear()
+            if self._closed:
+                return
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Vector index save failed: {e}")
+
+    def close(self):
+        """Stop the background saver and write whatever changed"""
+        self._closed = True
+        self._wake.set()
+        self.save()
+
+
+def _fingerprint_json(fingerprint) -> str:
+    """Fingerprints hold database values (e.g. datetimes); compare them as JSON text"""
+    return json.dumps(fingerprint, default=str)
@@ -2,747 +2,238 @@
 """
 BotCloud Worker with Full Capabilities
 Tools: shell, file, memory, cron, git, pushover, browser, http, screenshot, composio, delegate, hardware
+(in tools/, each imported the first time one of its commands runs)
 """
 
-import sys
+import importlib.util
 import os
-import subprocess
-import shutil
 import json
-import re
-import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
-try:
-    from apscheduler.schedulers.background import BackgroundScheduler
-    _HAS_APSCHEDULER = True
-except ImportError:
-    _HAS_APSCHEDULER = False
-    BackgroundScheduler = None
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Dict
 
-API_URL = os.environ.get("BOTCLOUD_API", "http://localhost:8000")
-AGENT_ID = os.environ.get("BOTCLOUD_AGENT_ID", "")
-API_KEY = os.environ.get("BOTCLOUD_API_KEY", "")
-POLL_INTERVAL = int(os.environ.get("BOTCLOUD_POLL_INTERVAL", "2"))
-WORKSPACE = os.environ.get("BOTCLOUD_WORKSPACE", "/home/openryanclaw/botcloud/workspace")
-COMPOSIO_API_KEY = os.environ.get("COMPOSIO_API_KEY", "")
-
-os.makedirs(WORKSPACE, exist_ok=True)
-
-# In-memory scheduler for cron tasks
-_scheduler = BackgroundScheduler() if _HAS_APSCHEDULER else None
-if _scheduler:
-    _scheduler.start()
-
-
-# ============ SHELL ============
-
-def exec_shell(cmd: str) -> str:
-    """Execute a shell command"""
-    try:
-        result = subprocess.run(
-            cmd, shell=True, capture_output=True, text=True, timeout=60
-        )
-        if result.returncode == 0:
-            return result.stdout if result.stdout else "OK"
-        return f"Error: {result.stderr}"
-    except subprocess.TimeoutExpired:
-        return "Error: Command timed out"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-
-# ============ FILE ============
-
-def read_file(filepath: str) -> str:
-    try:
-        full_path = os.path.join(WORKSPACE, filepath)
-        if not os.path.exists(full_path):
-            if os.path.exists(filepath):
-                with open(filepath) as f:
-                    return f.read()
-            return f"File not found: {filepath}"
-        with open(full_path) as f:
-            return f.read()
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-
-def write_file(filepath: str, content: str) -> str:
-    try:
-        full_path = os.path.join(WORKSPACE, filepath)
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        with open(full_path, 'w') as f:
-            f.write(content)
-        return f"Wrote to {filepath} ({len(content)} bytes)"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-
-def list_files(dirpath: str = "") -> str:
-    try:
-        full_path = os.path.join(WORKSPACE, dirpath) if dirpath else WORKSPACE
-        if not os.path.exists(full_path):
-            return f"Directory not found: {dirpath}"
-        items = []
-        for item in os.listdir(full_path):
-            full_item = os.path.join(full_path, item)
-            items.append(item + "/" if os.path.isdir(full_item) else item)
-        return "\n".join(items) if items else "Empty"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-
-def delete_file(filepath: str) -> str:
-    try:
-        full_path = os.path.join(WORKSPACE, filepath)
-        if not os.path.exists(full_path):
-            return f"Not found: {filepath}"
-        if os.path.isdir(full_path):
-            shutil.rmtree(full_path)
-        else:
-            os.remove(full_path)
-        return f"Deleted: {filepath}"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-
-def make_directory(dirpath: str) -> str:
-    try:
-        full_path = os.path.join(WORKSPACE, dirpath)
-        os.makedirs(full_path, exist_ok=True)
-        return f"Created: {dirpath}/"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-
-# ============ MEMORY ============
-
-_memory_store = {}
-
-
-def memory_set(key: str, value: str) -> str:
-    """Store a memory"""
-    _memory_store[key] = {"value": value, "timestamp": datetime.now().isoformat()}
-    return f"Memory set: {key}"
-
-
-def memory_get(key: str) -> str:
-    """Get a memory"""
-    if key in _memory_store:
-        mem = _memory_store[key]
-        return f"{key}: {mem['value']} (at {mem['timestamp']})"
-    return f"No memory: {key}"
-
-
-def memory_list() -> str:
-    """List all memories"""
-    if not _memory_store:
-        return "No memories stored"
-    return "\n".join(f"- {k}: {v['value'][:50]}" for k, v in _memory_store.items())
-
-
-def memory_delete(key: str) -> str:
-    """Delete a memory"""
-    if key in _memory_store:
-        del _memory_store[key]
-        return f"Deleted: {key}"
-    return f"Not found: {key}"
-
-
-# ============ SHARED MEMORY (Global) ============
-
-def shared_set(key: str, value: str) -> str:
-    """Set a shared value (accessible by all workers)"""
-    try:
-        import requests
-        resp = requests.put(f"{API_URL}/shared/{key}", json=value, timeout=5)
-        if resp.status_code == 200:
-            return f"Shared set: {key} = {value}"
-        return f"Error: {resp.status_code}"
-    except Exception as e:
-        return f"Shared memory error: {str(e)}"
-
-
-def shared_get(key: str) -> str:
-    """Get a shared value"""
-    try:
-        import requests
-        resp = requests.get(f"{API_URL}/shared/{key}", timeout=5)
-        if resp.status_code == 404:
-            return f"Not found: {key}"
-        if resp.status_code == 200:
-            data = resp.json()
-            return f"{key} = {data.get('value', data.get('counter', 'N/A'))}"
-        return f"Error: {resp.status_code}"
-    except Exception as e:
-        return f"Shared memory error: {str(e)}"
-
-
-def shared_incr(key: str, delta: int = 1) -> str:
-    """Atomically increment a shared counter"""
-    try:
-        import requests
-        resp = requests.post(f"{API_URL}/shared/{key}/incr", json=delta, timeout=5)
-        if resp.status_code == 200:
-            new_val = resp.json().get("counter", 0)
-            return f"{key} incremented: {new_val}"
-        return f"Error: {resp.status_code}"
-    except Exception as e:
-        return f"Shared memory error: {str(e)}"
-
-
-def shared_list() -> str:
-    """List all shared keys"""
-    try:
-        import requests
-        resp = requests.get(f"{API_URL}/shared", timeout=5)
-        if resp.status_code == 200:
-            data = resp.json().get("shared", [])
-            if not data:
-                return "No shared keys"
-            return "\n".join(f"- {k['key']}: {k.get('value', k.get('counter', ''))}" for k in data)
-        return f"Error: {resp.status_code}"
-    except Exception as e:
-        return f"Shared memory error: {str(e)}"
-
-
-# ============ CRON/SCHEDULE ============
-
-_scheduled_tasks = {}
-
-
-def schedule_task(cron_expr: str, task: str) -> str:
-    """Schedule a task (simple interval: every N seconds/minutes/hours)"""
-    # Simple format: "every 30s", "every 5m", "every 1h"
-    match = re.match(r"every\s+(\d+)\s*([smh])", cron_expr.lower())
-    if not match:
-        return "Usage: every <number><s|m|h> (e.g., every 30s, every 5m)"
-    
-    value, unit = int(match.group(1)), match.group(2)
-    
-    if unit == "s":
-        interval = value
-    elif unit == "m":
-        interval = value * 60
-    else:
-        interval = value * 3600
-    
-    job_id = f"job_{len(_scheduled_tasks)}"
-    
-    def run_task():
-        # Execute and optionally report back
-        result = process_single_task(task)
-        print(f"[Scheduled] {task} -> {result[:50]}")
-    
-    _scheduler.add_job(run_task, 'interval', seconds=interval, id=job_id)
-    _scheduled_tasks[job_id] = {"task": task, "interval": interval}
-    
-    return f"Scheduled: {task} every {value}{unit} (job_id: {job_id})"
-
-
-def list_scheduled() -> str:
-    """List scheduled tasks"""
-    if not _scheduled_tasks:
-        return "No scheduled tasks"
-    lines = []
-    for job_id, info in _scheduled_tasks.items():
-        interval = info["interval"]
-        if interval < 60:
-            unit = "s"
-        elif interval < 3600:
-            unit = "m"
-            interval //= 60
-        else:
-            unit = "h"
-            interval //= 3600
-        lines.append(f"- {job_id}: {info['task']} every {interval}{unit}")
-    return "\n".join(lines)
-
-
-def unschedule_task(job_id: str) -> str:
-    """Remove a scheduled task"""
-    if job_id in _scheduled_tasks:
-        _scheduler.remove_job(job_id)
-        del _scheduled_tasks[job_id]
-        return f"Removed: {job_id}"
-    return f"Not found: {job_id}"
-
-
-# ============ GIT ============
-
-def git_command(args: str) -> str:
-    """Run git commands"""
-    # Security: only allow safe git commands
-    allowed = {"status", "log", "diff", "branch", "checkout", "add", "commit", "push", "pull", "clone", "init"}
-    
-    parts = args.split()
-    if not parts:
-        return "Usage: git <command> [args]"
-    
-    cmd = parts[0]
-    if cmd not in allowed:
-        return f"Git command not allowed: {cmd}. Allowed: {allowed}"
-    
-    try:
-        result = subprocess.run(
-            ["git"] + parts,
-            capture_output=True, text=True, timeout=30, cwd=WORKSPACE
-        )
-        if result.returncode == 0:
-            return result.stdout[:2000] if result.stdout else "OK"
-        return f"Error: {result.stderr}"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-
-# ============ PUSHOVER ============
-
-def send_pushover(message: str, title: str = "BotCloud") -> str:
-    """Send Pushover notification"""
-    token = os.environ.get("PUSHOVER_TOKEN", "")
-    user = os.environ.get("PUSHOVER_USER", "")
-    
-    if not token or not user:
-        return "Pushover not configured. Set PUSHOVER_TOKEN and PUSHOVER_USER"
-    
-    try:
-        import requests
-        resp = requests.post(
-            "https://api.pushover.net/1/messages.json",
-            data={"token": token, "user": user, "message": message, "title": title},
-            timeout=10
-        )
-        if resp.status_code == 200:
-            return f"Notification sent: {message[:50]}"
-        return f"Failed: {resp.status_code}"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-
-# ============ BROWSER ============
-
-def browser_open(url: str) -> str:
-    """Open a URL in browser"""
-    if not url.startswith(("http://", "https://")):
-        url = "https://" + url
-    
-    try:
-        import webbrowser
-        webbrowser.open(url)
-        return f"Opened: {url}"
-    except Exception as e:
-        return f"Error: {str(e)}"
+from tools import process_single_task
+from tools.common import API_URL, AGENT_ID, API_KEY, WORKSPACE, _current, api_session
 
+_HAS_WEBSOCKET = importlib.util.find_spec("websocket") is not None  # websocket-client, imported on first connect
 
-def browser_screenshot(name: str = "screenshot.png") -> str:
-    """Take a screenshot"""
-    try:
-        # Try different methods
+POLL_INTERVAL = int(os.environ.get("BOTCLOUD_POLL_INTERVAL", "2"))
+CLAIM_WAIT = int(os.environ.get("BOTCLOUD_CLAIM_WAIT", "30"))  # long-poll seconds
+CONCURRENCY = int(os.environ.get("BOTCLOUD_CONCURRENCY", "4"))  # tasks executing at once
+PROCESS_WORKERS = int(os.environ.get("BOTCLOUD_PROCESS_WORKERS", "0"))  # 0 = CPU tools run on threads too
+CLAIM_MAX = int(os.environ.get("BOTCLOUD_CLAIM_MAX", str(CONCURRENCY)))
+LEASE_SECONDS = int(os.environ.get("BOTCLOUD_LEASE_SECONDS", "300"))
+USE_WEBSOCKET = os.environ.get("BOTCLOUD_WEBSOCKET", "1") != "0"  # push delivery when available
+HEARTBEAT_INTERVAL = int(os.environ.get("BOTCLOUD_HEARTBEAT_INTERVAL", "30"))
+WS_RETRY_INTERVAL = int(os.environ.get("BOTCLOUD_WS_RETRY_INTERVAL", "60"))
+
+
+# ============ EXECUTION POOL ============
+
+# Tools that keep this process's CPU busy; sent to the process pool when
+# BOTCLOUD_PROCESS_WORKERS > 0
+CPU_COMMANDS = {"math", "calc"}
+
+# Tools that are unsafe to overlap: command -> lock name. Commands sharing a
+# lock name run one at a time. Add more with
+# BOTCLOUD_SERIAL_COMMANDS="write,rm=files" (a bare command gets its own lock).
+SERIAL_COMMANDS = {
+    "git": "git",
+    "cron": "scheduler", "schedule": "scheduler",
+    "open": "display", "browse": "display", "screenshot": "display", "screen": "display",
+}
+for _item in filter(None, os.environ.get("BOTCLOUD_SERIAL_COMMANDS", "").split(",")):
+    _cmd, _, _lock = _item.strip().partition("=")
+    SERIAL_COMMANDS[_cmd.lower()] = _lock or _cmd.lower()
+
+
+def command_name(task_input: str) -> str:
+    parts = task_input.strip().split(None, 1)
+    return parts[0].lower() if parts else ""
+
+
+class TaskPool:
+    """Runs claimed tasks concurrently; each reports through its own callback
+    as soon as it finishes, so a slow task never holds back the others"""
+    
+    def __init__(self, size: int = CONCURRENCY, processes: int = PROCESS_WORKERS):
+        self.size = max(size, 1)
+        self._threads = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="task")
+        self._processes = None
+        if processes > 0:
+            from concurrent.futures import ProcessPoolExecutor
+            self._processes = ProcessPoolExecutor(max_workers=processes)
+        self._serial = {name: threading.Lock() for name in set(SERIAL_COMMANDS.values())}
+        self._inflight: Dict[str, dict] = {}
+        self._changed = threading.Condition()
+    
+    def free(self) -> int:
+        with self._changed:
+            return self.size - len(self._inflight)
+    
+    def inflight(self) -> list:
+        with self._changed:
+            return list(self._inflight)
+    
+    def wait_for_slot(self):
+        with self._changed:
+            self._changed.wait_for(lambda: len(self._inflight) < self.size)
+    
+    def submit(self, task: dict, on_done):
+        """Run task in the background, then call on_done(task, result)"""
+        with self._changed:
+            self._inflight[task["id"]] = task
+        self._threads.submit(self._run, task, on_done)
+    
+    def _run(self, task: dict, on_done):
+        task_id = task["id"]
+        task_input = task.get("input", "")
+        cmd = command_name(task_input)
+        print(f"→ Task {task_id}: {task_input[:50]}...")
+        _current.task_id = task_id
         try:
-            import pyscreenshot
-            img = pyscreenshot.grab()
-            path = os.path.join(WORKSPACE, name)
-            img.save(path)
-            return f"Screenshot saved: {name}"
-        except:
-            pass
-        
-        # Try gnome-screenshot
-        result = subprocess.run(["gnome-screenshot", "-f", name], capture_output=True, text=True)
-        if result.returncode == 0:
-            return f"Screenshot: {name}"
-        
-        return "Screenshot tool not available"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-
-# ============ HTTP REQUEST ============
-
-def http_request(request_def: str) -> str:
-    """Make HTTP request"""
-    parts = request_def.split(None, 2)
-    if len(parts) < 2:
-        return "Usage: http <METHOD> <URL> [body]"
-    
-    method, url = parts[0].upper(), parts[1]
-    body = parts[2] if len(parts) > 2 else None
-    
-    try:
-        import requests
-        kwargs = {"url": url, "timeout": 15, "headers": {"User-Agent": "BotCloud/1.0"}}
-        
-        if method == "GET":
-            pass
-        elif method in ("POST", "PUT"):
-            kwargs["json"] = {"body": body} if body else {}
-        elif method == "DELETE":
-            pass
-        else:
-            return f"Unsupported: {method}"
-        
-        resp = requests.request(method, **kwargs)
-        return f"HTTP {resp.status_code}\n\n{resp.text[:1500]}"
-    except Exception as e:
-        return f"HTTP error: {str(e)}"
-
-
-# ============ SCREENSHOT (standalone) ============
-
-def take_screenshot(name: str = None) -> str:
-    """Take screenshot - alias for browser_screenshot"""
-    if not name:
-        name = f"screenshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-    return browser_screenshot(name)
-
-
-# ============ COMPOSIO (opt-in) ============
-
-def composio_action(action: str, params: str = "") -> str:
-    """Execute Composio action (opt-in)"""
-    if not COMPOSIO_API_KEY:
-        return "Composio not enabled. Set COMPOSIO_API_KEY to enable."
-    
-    try:
-        import requests
-        
-        # Parse action and params
-        # Format: "action_name param1=value1 param2=value2"
-        parts = params.split() if params else []
-        param_dict = {}
-        for p in parts:
-            if "=" in p:
-                k, v = p.split("=", 1)
-                param_dict[k] = v
-        
-        resp = requests.post(
-            "https://api.composio.dev/v1/actions/execute",
-            headers={"x-api-key": COMPOSIO_API_KEY, "Content-Type": "application/json"},
-            json={"action": action, "params": param_dict},
-            timeout=30
-        )
-        
-        if resp.status_code == 200:
-            return f"Action executed: {action}\n{resp.json()}"
-        return f"Failed: {resp.status_code} - {resp.text}"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-
-# ============ DELEGATE ============
-
-def delegate_to_openclaw(task: str) -> str:
-    """Delegate task to OpenClaw"""
-    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+            with self._serial.get(SERIAL_COMMANDS.get(cmd)) or nullcontext():
+                if self._processes and cmd in CPU_COMMANDS:
+                    output = self._processes.submit(process_single_task, task_input).result()
+                else:
+                    output = process_single_task(task_input)
+            result = {"task_id": task_id, "output": output, "status": "completed"}
+        except Exception as e:
+            result = {"task_id": task_id, "output": f"Error: {e}", "status": "failed"}
+        finally:
+            _current.task_id = None
+        try:
+            on_done(task, result)
+        except Exception as e:
+            print(f"Completion error for {task_id}: {e}")
+        finally:
+            with self._changed:
+                self._inflight.pop(task_id, None)
+                self._changed.notify_all()
+
+def send_callback(task: dict, result: dict):
+    """POST the result to the task's callback URL (Feature 4)"""
+    import requests
     
-    try:
-        from botcloud.openclaw_connector import OpenClawConnector
-        
-        openclaw_url = os.environ.get("OPENCLAW_URL", "http://localhost:8080")
-        connector = OpenClawConnector(openclaw_url=openclaw_url)
-        
-        health = connector.health_check()
-        if health["status"] != "healthy":
-            return f"OpenClaw unreachable: {health.get('error', 'unknown')}"
-        
-        result = connector.delegate_task(task, timeout=120)
-        
-        if result["status"] == "completed":
-            res = result.get("result", {})
-            if isinstance(res, dict):
-                return f"OpenClaw: {res.get('content', res)}"
-            return f"OpenClaw: {res}"
-        return f"OpenClaw error: {result.get('error', result.get('status'))}"
-    except ImportError:
-        return "OpenClaw connector not available"
-    except Exception as e:
-        return f"Delegate error: {str(e)}"
-
-
-# ============ HARDWARE ============
-
-def hardware_status() -> str:
-    """Get hardware status"""
-    try:
-        import psutil
-        
-        cpu = psutil.cpu_percent(interval=1)
-        mem = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        
-        return f"""Hardware Status:
-CPU: {cpu}%
-Memory: {mem.percent}% ({mem.used // (1024**2)}MB / {mem.total // (1024**2)}MB)
-Disk: {disk.percent}% ({disk.used // (1024**3)}GB / {disk.total // (1024**3)}GB)"""
-    except ImportError:
-        return "psutil not installed. Install: pip install psutil"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-
-def hardware_reboot() -> str:
-    """Reboot system (requires root)"""
-    return "Reboot disabled for safety. Use exec sudo reboot manually."
-
-
-def hardware_shutdown() -> str:
-    """Shutdown system (requires root)"""
-    return "Shutdown disabled for safety. Use exec sudo shutdown manually."
-
-
-def hardware_processes() -> str:
-    """List top processes"""
-    try:
-        import psutil
-        procs = sorted(psutil.process_iter(['pid', 'name', 'cpu_percent']), 
-                      key=lambda x: x.info['cpu_percent'] or 0, reverse=True)[:10]
-        
-        lines = ["Top Processes:"]
-        for p in procs:
-            lines.append(f"  {p.info['pid']}: {p.info['name']} ({p.info['cpu_percent']}%)")
-        return "\n".join(lines)
-    except:
-        return "Could not get processes"
-
-
-# ============ NETWORK ============
-
-def web_search(query: str) -> str:
-    """Web search - delegates to OpenClaw"""
-    if not query:
-        return "Usage: search <query>"
-    return delegate_to_openclaw(f"search: {query}")
-
-
-def fetch_url(url: str) -> str:
-    """Fetch web page"""
-    if not url:
-        return "Usage: fetch <url>"
-    if not url.startswith(("http://", "https://")):
-        url = "https://" + url
+    callback_url = task.get("callback_url")
+    if callback_url:
+        try:
+            requests.post(callback_url, json=result, timeout=10)
+            print(f"✓ Callback sent to {callback_url}")
+        except Exception as cb_err:
+            print(f"Callback error: {cb_err}")
     
-    try:
-        import requests
-        resp = requests.get(url, timeout=15)
-        if resp.status_code == 200:
-            return f"=== {url} ===\n\n{resp.text[:2000]}"
-        return f"Fetch failed: HTTP {resp.status_code}"
-    except Exception as e:
-        return f"Error: {str(e)}"
+    print(f"✓ Task {task['id']} completed")
 
 
-# ============ MATH ============
+def complete_http(task: dict, result: dict):
+    """Report one task's result over HTTP"""
+    resp = api_session().post(
+        f"{API_URL}/tasks/{task['id']}/complete",
+        json={"output": result["output"], "status": result["status"]},
+        timeout=30
+    )
+    if resp.status_code != 200:
+        print(f"Complete error for {task['id']}: HTTP {resp.status_code}")
+    send_callback(task, result)
 
-def calculate(expr: str) -> str:
-    """Math calculation"""
-    if not expr:
-        return "Usage: math <expression>"
-    allowed = set("0123456789+-*/.() ")
-    if not all(c in allowed for c in expr):
-        return "Error: Only basic math allowed"
-    try:
-        result = eval(expr, {"__builtins__": {}}, {})
-        return f"{expr} = {result}"
-    except Exception as e:
-        return f"Math error: {str(e)}"
 
+def lease_loop(pool: TaskPool):
+    """Keep renewing the lease of every task still executing"""
+    while True:
+        time.sleep(LEASE_SECONDS / 3)
+        for task_id in pool.inflight():
+            try:
+                api_session().post(f"{API_URL}/tasks/{task_id}/lease", json={"lease": LEASE_SECONDS}, timeout=10)
+            except Exception as e:
+                print(f"Lease renewal error for {task_id}: {e}")
 
-# ============ MAIN PROCESSOR ============
 
-def process_single_task(task_input: str) -> str:
-    """Process a single task"""
-    task = task_input.strip()
-    parts = task.split(None, 1)
-    cmd = parts[0].lower() if parts else ""
-    arg = parts[1] if len(parts) > 1 else ""
-    
-    # Shell
-    if cmd in ("exec", "run", "sh"):
-        return exec_shell(arg)
-    
-    # File ops
-    if cmd == "read":
-        return read_file(arg)
-    if cmd == "write":
-        if " " in arg:
-            idx = arg.index(" ")
-            return write_file(arg[:idx], arg[idx+1:])
-        return "Usage: write <filename> <content>"
-    if cmd in ("ls", "list"):
-        return list_files(arg)
-    if cmd in ("rm", "delete"):
-        return delete_file(arg)
-    if cmd == "mkdir":
-        return make_directory(arg)
+def ws_loop(pool: TaskPool):
+    """Receive pushed tasks over a persistent WebSocket until it drops"""
+    import websocket
     
-    # Memory
-    if cmd == "memory" or cmd == "mem":
-        sub = arg.split(None, 1)
-        if not sub:
-            return memory_list()
-        if sub[0] == "set" and len(sub) > 1:
-            parts2 = sub[1].split(None, 1)
-            if len(parts2) == 2:
-                return memory_set(parts2[0], parts2[1])
-        if sub[0] == "get":
-            return memory_get(sub[1] if len(sub) > 1 else "")
-        if sub[0] == "del":
-            return memory_delete(sub[1] if len(sub) > 1 else "")
-        return "Usage: memory [set <key> <val>|get <key>|del <key>|list]"
+    url = API_URL.replace("http", "ws", 1) + f"/ws/worker/{AGENT_ID}?max_inflight={pool.size}&lease={LEASE_SECONDS}"
+    ws = websocket.create_connection(url, header=[f"X-API-Key: {API_KEY}"], timeout=HEARTBEAT_INTERVAL)
+    send_lock = threading.Lock()
+    print("Connected for push delivery")
     
-    # Shared memory (global across workers)
-    if cmd == "shared":
-        sub = arg.split(None, 1)
-        if not sub:
-            return shared_list()
-        if sub[0] == "set" and len(sub) > 1:
-            parts2 = sub[1].split(None, 1)
-            if len(parts2) == 2:
-                return shared_set(parts2[0], parts2[1])
-        if sub[0] == "get":
-            return shared_get(sub[1] if len(sub) > 1 else "")
-        if sub[0] == "incr":
-            parts2 = sub[1].split()
-            key = parts2[0] if parts2 else ""
-            delta = int(parts2[1]) if len(parts2) > 1 else 1
-            return shared_incr(key, delta)
-        return "Usage: shared [set <key> <val>|get <key>|incr <key> [delta]|list]"
+    def send(message: dict):
+        with send_lock:
+            ws.send(json.dumps(message))
     
-    # Cron
-    if cmd == "cron" or cmd == "schedule":
-        sub = arg.split(None, 1)
-        if sub[0] == "add":
-            parts2 = sub[1].split(None, 1)
-            if len(parts2) == 2:
-                return schedule_task(parts2[0], parts2[1])
-        if sub[0] == "list":
-            return list_scheduled()
-        if sub[0] == "remove":
-            return unschedule_task(sub[1] if len(sub) > 1 else "")
-        return "Usage: cron [add <interval> <task>|list|remove <job_id>]"
-    
-    # Git
-    if cmd == "git":
-        return git_command(arg)
-    
-    # Pushover
-    if cmd == "push":
-        sub = arg.split(None, 1)
-        if len(sub) == 2:
-            return send_pushover(sub[1], sub[0] if sub[0] else "BotCloud")
-        return send_pushover(arg)
-    
-    # Browser
-    if cmd == "open" or cmd == "browse":
-        return browser_open(arg)
-    if cmd == "screenshot" or cmd == "screen":
-        return take_screenshot(arg if arg else None)
-    
-    # HTTP
-    if cmd == "http":
-        return http_request(arg)
-    if cmd in ("curl", "fetch", "wget"):
-        return fetch_url(arg)
-    
-    # Composio
-    if cmd == "composio" or cmd == "action":
-        sub = arg.split(None, 1)
-        return composio_action(sub[0], sub[1] if len(sub) > 1 else "")
-    
-    # Delegate
-    if cmd == "delegate":
-        return delegate_to_openclaw(arg)
-    
-    # Hardware
-    if cmd == "hardware" or cmd == "sys":
-        sub = arg.split(None, 1) if arg else []
-        if not sub or sub[0] == "status":
-            return hardware_status()
-        if sub[0] == "processes":
-            return hardware_processes()
-        return "Usage: hardware [status|processes]"
-    
-    # Network
-    if cmd == "search":
-        return web_search(arg)
-    if cmd == "math" or cmd == "calc":
-        return calculate(arg)
-    
-    # Info
-    if cmd == "info":
-        return f"Worker: {AGENT_ID}\nWorkspace: {WORKSPACE}\nAPI: {API_URL}"
-    
-    if cmd == "help":
-        return """BotCloud Worker Commands:
-
-FILE: read, write, ls, mkdir, rm
-SHELL: exec <cmd>, run <cmd>
-MEMORY: memory [set|get|del|list]
-CRON: cron [add|list|remove]
-GIT: git <command>
-PUSHOVER: push <message>
-BROWSER: open <url>, screenshot [name]
-HTTP: http <METHOD> <URL>
-SEARCH: search <query>
-MATH: math <expr>
-COMPOSIO: composio <action> [params]
-DELEGATE: delegate <task>
-HARDWARE: hardware [status|processes]
-INFO: info"""
-    
-    # Default: shell
-    return exec_shell(task)
+    def complete(task: dict, result: dict):
+        try:
+            send({"type": "complete", "results": [result]})
+        except Exception:
+            complete_http(task, result)  # the socket dropped while the task ran
+            return
+        send_callback(task, result)
+    
+    try:
+        while True:
+            try:
+                msg = json.loads(ws.recv())
+            except websocket.WebSocketTimeoutException:
+                # Idle: keep the connection and our leases alive
+                send({"type": "heartbeat"})
+                continue
+            
+            if msg.get("type") != "tasks":
+                continue
+            for task in msg.get("tasks", []):
+                pool.submit(task, complete)
+    finally:
+        ws.close()
+
+
+def poll_once(pool: TaskPool) -> bool:
+    """One long-poll round for the pool's free slots; returns False on a server error"""
+    pool.wait_for_slot()
+    # The API holds the request until work arrives and hands back only
+    # tasks claimed for us
+    resp = api_session().get(
+        f"{API_URL}/agents/{AGENT_ID}/tasks/next",
+        params={"wait": CLAIM_WAIT, "max": min(CLAIM_MAX, pool.free()), "lease": LEASE_SECONDS},
+        timeout=CLAIM_WAIT + 10
+    )
+    if resp.status_code != 200:
+        print(f"Claim error: HTTP {resp.status_code}")
+        return False
+    
+    # Each task is completed on its own as soon as it finishes
+    for task in resp.json().get("tasks", []):
+        pool.submit(task, complete_http)
+    return True
 
 
 def main():
-    """Main worker loop"""
-    import requests
-    
+    """Main worker loop: WebSocket push, falling back to HTTP long-poll"""
     print(f"Worker {AGENT_ID} starting...")
     print(f"Workspace: {WORKSPACE}")
+    print(f"Concurrency: {CONCURRENCY} threads, {PROCESS_WORKERS} processes for CPU tools")
+    os.makedirs(WORKSPACE, exist_ok=True)
+    
+    pool = TaskPool()
+    threading.Thread(target=lease_loop, args=(pool,), name="lease-renewer", daemon=True).start()
+    next_ws_attempt = 0.0
     
     while True:
-        try:
-            resp = requests.get(f"{API_URL}/agents/{AGENT_ID}/tasks", timeout=5)
-            if resp.status_code == 200:
-                tasks = resp.json().get("tasks", [])
-                
-                for task in tasks:
-                    if task.get("status") == "pending":
-                        task_id = task["id"]
-                        task_input = task.get("input", "")
-                        callback_url = task.get("callback_url")  # Feature 4: callback
-                        print(f"→ Task {task_id}: {task_input[:50]}...")
-                        
-                        result = process_single_task(task_input)
-                        
-                        # Complete in API
-                        requests.post(
-                            f"{API_URL}/tasks/{task_id}/complete",
-                            headers={"X-API-Key": API_KEY},
-                            json={"output": result}
-                        )
-                        
-                        # Feature 4: Callback URL
-                        if callback_url:
-                            try:
-                                requests.post(
-                                    callback_url,
-                                    json={"task_id": task_id, "output": result, "status": "completed"},
-                                    timeout=10
-                                )
-                                print(f"✓ Callback sent to {callback_url}")
-                            except Exception as cb_err:
-                                print(f"Callback error: {cb_err}")
-                        
-                        print(f"✓ Task {task_id} completed")
+        if USE_WEBSOCKET and _HAS_WEBSOCKET and time.time() >= next_ws_attempt:
+            try:
+                ws_loop(pool)
+            except Exception as e:
+                print(f"WebSocket unavailable ({e}), using long-poll")
+            next_ws_attempt = time.time() + WS_RETRY_INTERVAL
         
+        try:
+            if not poll_once(pool):
+                time.sleep(POLL_INTERVAL)
         except Exception as e:
             print(f"Error: {e}")
-        
-        import time
-        time.sleep(POLL_INTERVAL)
+            time.sleep(POLL_INTERVAL)
 
 
 if __name__ == "__main__":
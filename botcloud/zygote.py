@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+BotCloud worker fork server
+Imports the worker runtime once, then forks a ready worker per request, so a
+new worker starts in milliseconds instead of paying interpreter start and
+imports every time. Driven by BotCloudManager (BOTCLOUD_FORK_SERVER=1).
+
+Protocol: one JSON object per line on stdin, one reply per line on stdout.
+  -> {"script": "/path/to/worker.py", "env": {...}}
+  <- {"pid": 1234}            or  {"error": "..."}
+  -> {"poll": 1234}
+  <- {"pid": 1234, "returncode": null}   (still running; else the exit status,
+                                          negative for a signal, as with Popen)
+"""
+
+import importlib
+import json
+import os
+import runpy
+import signal
+import sys
+import traceback
+from collections import OrderedDict
+
+# Imported once here and shared copy-on-write by every child
+PRELOAD = ("worker", "async_worker", "requests", "websocket", "psutil")
+
+# Modules that read BOTCLOUD_* settings at import time; each child imports
+# them again under its own environment. Importing them above still loads
+# everything they pull in (requests, httpx, ...), which is the slow part; the
+# re-import is only their own bytecode (a few ms per fork). Reading settings
+# lazily instead would touch every tool module for little gain.
+PER_WORKER = ("worker", "async_worker", "tools")
+
+# Exit statuses of reaped workers, each reported once through {"poll": pid}.
+# Bounded: the oldest unclaimed statuses are dropped (their pids report null).
+EXITED_MAX = 1024
+exited: "OrderedDict[int, int]" = OrderedDict()
+
+
+def preload():
+    for name in PRELOAD:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    for name in list(sys.modules):
+        if name.split(".")[0] in PER_WORKER:
+            del sys.modules[name]
+
+
+def run_child(script: str, env: dict):
+    """In the forked child: become the worker described by the request"""
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)  # the worker waits on its own subprocesses
+    os.setpgid(0, 0)  # its own process group, so the manager can stop it with killpg
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.close(devnull)
+    os.environ.clear()
+    os.environ.update(env)
+    sys.argv = [script]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    status = 0
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else int(e.code is not None)
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def reap(signum=None, frame=None):
+    """SIGCHLD: collect the status of every worker that has exited"""
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        exited[pid] = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        while len(exited) > EXITED_MAX:
+            exited.popitem(last=False)
+
+
+def serve():
+    signal.signal(signal.SIGCHLD, reap)
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+            if "poll" in request:
+                pid = request["poll"]
+                reply = {"pid": pid, "returncode": exited.pop(pid, None)}
+                sys.stdout.write(json.dumps(reply) + "\n")
+                sys.stdout.flush()
+                continue
+            script, env = request["script"], request["env"]
+            sys.stdout.flush()
+            pid = os.fork()
+            if pid == 0:
+                run_child(script, env)
+            try:
+                os.setpgid(pid, pid)  # also set here: the pid may be killed before the child runs
+            except OSError:
+                pass  # already exited
+            reply = {"pid": pid}
+        except Exception as e:
+            reply = {"error": str(e)}
+        sys.stdout.write(json.dumps(reply) + "\n")
+        sys.stdout.flush()
+    # stdin closed: the manager is gone; workers keep running on their own
+
+
+if __name__ == "__main__":
+    preload()
+    print(json.dumps({"ready": os.getpid()}), flush=True)
+    serve()